@@ -13,4 +13,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'GUESS.settings')
 
-application = get_asgi_application()
+# اپلیکیشن HTTP باید قبل از import کردن consumerها ساخته شود تا اپ‌های جنگو بارگذاری شده باشند
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+
+from game.middleware import TokenAuthMiddleware  # noqa: E402
+from game.routing import websocket_urlpatterns  # noqa: E402
+
+application = ProtocolTypeRouter({
+    'http': django_asgi_app,
+    'websocket': TokenAuthMiddleware(URLRouter(websocket_urlpatterns)),
+})
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -31,6 +34,7 @@ ALLOWED_HOSTS = ['f630-62-141-32-145.ngrok-free.app','localhost','127.0.0.1']
 # Application definition
 
 INSTALLED_APPS = [
+    'daphne',  # باید اول باشد تا runserver اپلیکیشن ASGI (HTTP و WebSocket) را اجرا کند
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -49,6 +53,8 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = 'game.User'
 
 MIDDLEWARE = [
+    'game.metrics.MetricsMiddleware',  # زمان، وضعیت و تعداد کوئری هر درخواست برای /metrics
+    'game.log.LogContextMiddleware',  # game_id و user_id در همه لاگ‌های درخواست
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -83,12 +89,39 @@ WSGI_APPLICATION = 'GUESS.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# پروفایل هم‌زمانی SQLite (SQLITE_PROFILE=concurrent، پیش‌فرض): WAL تا خواندن‌ها پشت نوشتن نمانند،
+# synchronous=NORMAL (در WAL امن است و هر commit یک fsync کمتر دارد)، انتظار تا ۵ ثانیه به جای خطای
+# «database is locked»، mmap و کش بزرگ‌تر. تراکنش‌ها IMMEDIATE شروع می‌شوند تا قفل نوشتن از ابتدا
+# گرفته شود و وسط تراکنش به SQLITE_BUSY نخورند. CONN_MAX_AGE تنظیم نمی‌شود: زیر daphne/ASGI هر درخواست
+# در thread خودش (ThreadSensitiveContext) اجرا می‌شود و اتصال ماندگار هیچ وقت دوباره استفاده نمی‌شد و فقط
+# با جمع شدن thread بسته می‌شد. تنها اتصال ماندگار مال thread نویسنده (DB_WRITER_QUEUE) است که در این
+# پروفایل پیش‌فرض روشن است. با SQLITE_PROFILE=default همان تنظیمات پیش‌فرض Django استفاده می‌شود.
+SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', 'concurrent')
+SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA mmap_size=134217728',  # 128MB
+    'PRAGMA cache_size=-32000',  # 32MB
+    'PRAGMA temp_store=MEMORY',
+)
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
     }
 }
+if SQLITE_PROFILE == 'concurrent':
+    DATABASES['default'].update({
+        'OPTIONS': {
+            'init_command': ';'.join(SQLITE_PRAGMAS),
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 5,
+        },
+    })
+# همه نوشتن‌های consumer، flush جلسه‌ها و matchmaking در یک thread اختصاصی با یک اتصال ثابت (game/writer.py)
+DB_WRITER_QUEUE = os.environ.get('DB_WRITER_QUEUE', '1' if SQLITE_PROFILE == 'concurrent' else '0') == '1'
 
 
 # Password validation
@@ -110,19 +143,63 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 ASGI_APPLICATION = 'GUESS.asgi.application' # این خط معمولا برای Channels نیاز است
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels_redis.core.RedisChannelLayer",
-        "CONFIG": {
-            "hosts": [("localhost", 6379)], # آدرس سرور Redis خود را وارد کنید
+# CHANNEL_LAYER یکی از این‌هاست:
+#   memory: لایه درون پروسس برای اجرای تک‌نود و CI (بدون Redis)
+#   redis:  گروه‌ها با hash سازگار روی سرورهای CHANNEL_REDIS_HOSTS (جدا شده با کاما) پخش می‌شوند
+#   local:  همان لایه شارد شده روی یک Redis محلی موقت برای تست (مثلاً redis-server --port 6390)
+# در حالت‌های Redis پیام‌های بین کانال‌های همین پروسس بدون رفت و برگشت به Redis تحویل داده می‌شوند.
+CHANNEL_LAYER = os.environ.get('CHANNEL_LAYER', 'redis')
+CHANNEL_REDIS_HOSTS = os.environ.get('CHANNEL_REDIS_HOSTS', 'redis://localhost:6379').split(',')
+CHANNEL_REDIS_LOCAL_URL = os.environ.get('CHANNEL_REDIS_LOCAL_URL', 'redis://127.0.0.1:6390/15')
+if CHANNEL_LAYER == 'memory':
+    CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+elif CHANNEL_LAYER == 'local':
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "game.layers.ShardedRedisChannelLayer",
+            "CONFIG": {"hosts": [CHANNEL_REDIS_LOCAL_URL], "prefix": "guess-test"},
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "game.layers.ShardedRedisChannelLayer",
+            "CONFIG": {"hosts": CHANNEL_REDIS_HOSTS},
         },
+    }
+# متریک‌های Prometheus روی /metrics؛ با False نه چیزی ثبت می‌شود و نه middleware اجرا می‌شود
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+
+# لاگ‌های ساخت‌یافته (game/log.py) به صورت یک خط JSON روی stdout؛ نوشتن در thread جدا انجام می‌شود.
+# با LOG_LEVEL=DEBUG رویدادهای debug هم ثبت می‌شوند و در غیر این صورت هزینه‌ای ندارند.
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+# رویدادهای پرتکرار فقط با این احتمال ثبت می‌شوند؛ هر رکورد sample_rate خودش را دارد
+LOG_SAMPLE_RATES = {
+    'ws.message': 0.01,
+}
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'structured': {'()': 'game.log.StructuredFormatter'},
+    },
+    'handlers': {
+        'background': {
+            'class': 'game.log.BackgroundHandler',
+            'formatter': 'structured',
+            'stream': 'ext://sys.stdout',
+        },
+    },
+    'loggers': {
+        'game': {'handlers': ['background'], 'level': LOG_LEVEL, 'propagate': False},
     },
 }
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        # همان TokenAuthentication با کش LRU+TTL از توکن به کاربر (game/authentication.py)
+        'game.authentication.CachedTokenAuthentication',
         # 'rest_framework.authentication.SessionAuthentication', # اگر برای browseable API لازم دارید
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -164,3 +241,6 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 CORS_ALLOWED_ALL_ORIGINS = True
 
 CORS_ALLOWED_METHODS = ['GET', 'POST', 'OPTIONS','DELETE','PATCH','HEAD','PUT','TRACE']
+# کلاینت‌هایی که poll می‌کنند ETag را می‌خوانند و با If-None-Match برمی‌گردانند (game.conditional)
+CORS_ALLOW_HEADERS = (*default_headers, 'if-none-match')
+CORS_EXPOSE_HEADERS = ['ETag']
@@ -2,6 +2,7 @@
 
 from django.contrib import admin
 from django.urls import path, include
+from game.metrics import metrics_view
 # ------------- BEGIN NEW/MODIFIED SECTION (Imports for drf-spectacular) -------------
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
 # ------------- END NEW/MODIFIED SECTION -------------
@@ -9,6 +10,7 @@ from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, Spec
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('game.urls')), # URLهای اپلیکیشن game شما
+    path('metrics', metrics_view, name='metrics'),  # خروجی متنی Prometheus
 
     # ------------- BEGIN NEW/MODIFIED SECTION (URLs for drf-spectacular) -------------
     # مسیر برای فایل schema ی OpenAPI 3 (معمولاً یک فایل YAML یا JSON)
@@ -0,0 +1,105 @@
+from django.conf import settings
+from django.utils import timezone
+
+from . import engine
+from .leaderboard import leaderboard
+from .log import get_logger
+from .models import LedgerEntry
+from .protocol import broadcast_game_update
+from .sessions import game_sessions
+
+log = get_logger(__name__)
+
+# اکشن‌هایی که روی session درون حافظه اجرا می‌شوند و هم GameConsumer و هم تایمر سرور از آن‌ها استفاده می‌کنند
+
+def turn_timeout_seconds():
+    return getattr(settings, 'GAME_TURN_TIMEOUT', 30)
+
+
+def commit_turn(session, engine_state, now=None):
+    # حرکتی که GameEngine نوبتش را عوض کرده: زمان مصرف‌شده بازیکن قبلی تسویه و بعد وضعیت اعمال می‌شود
+    game, state = session.game, session.state
+    now = now or timezone.now()
+    session.mark_state(*state.settle_clock(game, now))
+    session.apply_engine(engine_state)
+    state.last_turn_time = now
+    session.mark_state('last_turn_time')
+    game_sessions.request_flush()
+
+
+def switch_turn(session, now=None):
+    engine_state = session.engine_state()
+    engine.switch_turn(engine_state)
+    commit_turn(session, engine_state, now)
+
+
+def apply_turn_timeout(session, now=None):
+    # اگر وقت نوبت بازیکن فعلی تمام شده باشد نوبت عوض می‌شود؛ خروجی True یعنی نوبت عوض شد
+    game, state = session.game, session.state
+    if game.status != 'active' or not state.current_player or not state.last_turn_time:
+        return False
+    now = now or timezone.now()
+    if (now - state.last_turn_time).total_seconds() < turn_timeout_seconds():
+        return False
+    switch_turn(session, now)
+    return True
+
+
+def time_up_player(session, now=None):
+    return session.state.time_up_player(session.game, now)
+
+
+async def check_timeouts(session, channel_layer=None):
+    now = timezone.now()
+    loser = time_up_player(session, now)
+    if loser:
+        outcome = engine.time_up(session.engine_state(), loser.id)
+        await end_game(session, outcome, reason="player_time_up", channel_layer=channel_layer)
+        return
+    if apply_turn_timeout(session, now):
+        await broadcast_game_update(session, "turn_timeout_occurred", channel_layer=channel_layer)
+
+
+async def flush_move(session, channel_layer=None):
+    # حرکتی که باید همین حالا ثبت شود (پیوستن، توقف، پایان بازی). خروجی False یعنی مسیر دیگری هم‌زمان حرکت
+    # کرده بود و این حرکت رد شد؛ session با دیتابیس یکی شده و همه بازیکنان snapshot تازه را گرفته‌اند
+    if session.game.pk not in await game_sessions.flush(session):
+        return True
+    await broadcast_game_update(session, "snapshot", channel_layer=channel_layer, full=True)
+    return False
+
+
+async def end_game(session, outcome, reason="unknown", channel_layer=None):
+    # outcome نتیجه GameEngine است؛ امتیازهای نهایی باید قبل از این با session.apply_engine اعمال شده باشند.
+    # خروجی True یعنی نتیجه ذخیره و اعلام شد؛ False یعنی بازی از قبل تمام شده بود یا نتیجه این session
+    # به خاطر حرکت هم‌زمان مسیر دیگری ذخیره نشد
+    game, state = session.game, session.state
+    if game.status == 'finished':
+        return False
+
+    # ساعت بازیکن فعلی متوقف و زمان مصرف‌شده‌اش تسویه می‌شود
+    session.mark_state(*state.settle_clock(game, running=False))
+    game.status = 'finished'
+    game.winner = game.player(outcome.winner)
+
+    if game.winner:
+        session.add_xp(game.winner, outcome.xp, LedgerEntry.REASON_WIN)
+    # اطمینان از وجود هر دو بازیکن قبل از ایجاد تاریخچه
+    if game.player1 and game.player2:
+        session.add_history(game.player1, game.player2, outcome.result1, state.player1_score)
+        session.add_history(game.player2, game.player1, outcome.result2, state.player2_score)
+
+    session.mark_game('status', 'winner')
+    # نتیجه بازی قبل از اعلام به بازیکنان حتماً در دیتابیس نوشته می‌شود
+    if not await flush_move(session, channel_layer):
+        # مسیر دیگری (مثلاً REST) هم‌زمان حرکت کرده یا بازی را تمام کرده و این نتیجه نوشته نشد؛ نه جایزه‌ای
+        # داده می‌شود و نه game_ended
+        log.warning('game.end_conflict', game_id=str(game.game_id), reason=reason)
+        return False
+    if game.winner:
+        leaderboard.award(game.winner.id, game.winner.username, outcome.xp, game.level)
+
+    await broadcast_game_update(session, "game_ended", {'reason': reason,
+                                                        'winner_id': game.winner.id if game.winner else None},
+                                channel_layer=channel_layer)
+    return True
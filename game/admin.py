@@ -4,5 +4,7 @@ from .models import *
 admin.site.register(Game)
 admin.site.register(GameHistory)
 admin.site.register(GameState)
+admin.site.register(GameEvent)
 admin.site.register(Word)
-admin.site.register(User)
\ No newline at end of file
+admin.site.register(User)
+admin.site.register(LedgerEntry)
\ No newline at end of file
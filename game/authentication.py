@@ -0,0 +1,147 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.authentication import TokenAuthentication
+
+from .log import bind_fields
+from .models import SharedVersion
+
+# نام شمارنده نسخه در SharedVersion؛ با حذف توکن، حذف یا غیرفعال شدن کاربر و تغییر رمز زیاد می‌شود
+VERSION_NAME = 'auth'
+
+
+# کش LRU با TTL از توکن به (کاربر، توکن) تا هر درخواست API یا اتصال WebSocket کوئری Token+User نزند.
+# با حذف توکن و هر ذخیره کاربر (غیرفعال شدن، تغییر رمز، تغییر سکه و XP) از طریق signalها پاک می‌شود.
+# تغییرات امنیتی پروسس‌های دیگر از راه نسخه SharedVersion می‌رسند که حداکثر هر
+# AUTH_TOKEN_CACHE_VERSION_CHECK_INTERVAL ثانیه یک بار خوانده می‌شود و با تغییرش کل کش خالی می‌شود.
+# سکه و XP کاربر کش‌شده ممکن است تا TTL کهنه باشد؛ پاسخ‌هایی که آن‌ها را نشان می‌دهند (پروفایل) کاربر را از
+# دیتابیس می‌خوانند.
+class TokenUserCache:
+    def __init__(self, maxsize=None, ttl=None, version_check_interval=None):
+        if maxsize is None:
+            maxsize = getattr(settings, 'AUTH_TOKEN_CACHE_SIZE', 10000)
+        if ttl is None:
+            ttl = getattr(settings, 'AUTH_TOKEN_CACHE_TTL', 60)
+        if version_check_interval is None:
+            version_check_interval = getattr(settings, 'AUTH_TOKEN_CACHE_VERSION_CHECK_INTERVAL', 5)
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version_check_interval = version_check_interval
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (زمان انقضا، کاربر، توکن)
+        self._keys_by_user = {}  # user_id -> مجموعه توکن‌ها
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        # هر فراخواننده یک کپی از کاربر می‌گیرد تا تغییر request.user روی بقیه درخواست‌ها اثر نگذارد
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    self._pop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            _, user, token = entry
+        return copy.copy(user), token
+
+    def set(self, key, user, token):
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, copy.copy(user), token)
+            self._keys_by_user.setdefault(user.pk, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._pop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._keys_by_user.get(entry[1].pk)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_user[entry[1].pk]
+        return entry
+
+    def invalidate_token(self, key):
+        with self._lock:
+            if self._pop(key) is not None:
+                self.invalidations += 1
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._pop(key)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def version_due(self):
+        return time.monotonic() - self._checked_at >= self.version_check_interval
+
+    def check_version(self):
+        # کوئری دیتابیس دارد؛ کد async آن را فقط از thread دیتابیس صدا می‌زند
+        version = SharedVersion.current(VERSION_NAME)
+        with self._lock:
+            self._checked_at = time.monotonic()
+            changed = self._version is not None and version != self._version
+            self._version = version
+        if changed:
+            self.clear()
+
+    def bump_version(self):
+        SharedVersion.bump(VERSION_NAME)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+token_cache = TokenUserCache()
+
+
+def authenticate_token(key):
+    # مسیر مشترک REST و WebSocket؛ در صورت نبودن در کش یک کوئری Token+User زده می‌شود.
+    # اگر توکن نامعتبر یا کاربر غیرفعال باشد AuthenticationFailed بالا می‌رود.
+    if token_cache.version_due():
+        token_cache.check_version()
+    cached = token_cache.get(key)
+    if cached is not None:
+        return cached
+    user, token = TokenAuthentication().authenticate_credentials(key)
+    token_cache.set(key, user, token)
+    return user, token
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        user, token = authenticate_token(key)
+        bind_fields(user_id=user.pk)
+        return user, token
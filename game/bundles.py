@@ -0,0 +1,39 @@
+from typing import NamedTuple
+
+from .models import Game, GameState, Word
+
+
+class GameBundle(NamedTuple):
+    # بازی، وضعیت و کلمه‌اش که با یک کوئری خوانده شده‌اند؛ خود tuple تغییرناپذیر است ولی مدل‌ها
+    # همان اشیای قابل ذخیره‌اند و view یا session روی آن‌ها تغییر می‌دهد و save/update می‌کند
+    game: Game
+    state: GameState
+    word: Word
+
+
+def load_game_bundle(game_id, status=None):
+    # یک SELECT با join روی Game، هر دو بازیکن و Word؛ برنده و بازیکن نوبت همیشه یکی از دو بازیکن‌اند
+    # پس به جای join جدا همان اشیا به آن‌ها داده می‌شوند. بعد از این هیچ دسترسی lazy کوئری نمی‌زند.
+    states = GameState.objects.select_related('game', 'game__player1', 'game__player2', 'word')
+    filters = {'game__game_id': game_id}
+    if status is not None:
+        filters['game__status'] = status
+    try:
+        state = states.get(**filters)
+    except GameState.DoesNotExist:
+        raise Game.DoesNotExist(f'Game {game_id} not found')
+    game = state.game
+    players = {player.pk: player for player in (game.player1, game.player2) if player is not None}
+    share_player(game, 'winner', players)
+    share_player(state, 'current_player', players)
+    return GameBundle(game, state, state.word)
+
+
+def share_player(obj, field, players):
+    user_id = getattr(obj, f'{field}_id')
+    if user_id in players:
+        obj._meta.get_field(field).set_cached_value(obj, players[user_id])
+    elif user_id is None:
+        obj._meta.get_field(field).set_cached_value(obj, None)
+    # در غیر این صورت (داده ناسازگار) همان بارگذاری lazy معمول Django انجام می‌شود
+
@@ -0,0 +1,88 @@
+import hashlib
+
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import GameState
+
+# GET شرطی برای کلاینت‌هایی که به جای WebSocket مرتب poll می‌کنند. ETag از نسخه ذخیره‌شده یا از idهای
+# صفحه ساخته می‌شود که با یک lookup روی ایندکس به دست می‌آید؛ اگر If-None-Match هنوز معتبر باشد پاسخ 304
+# بدون بارگذاری کامل و بدون سریالایزر برمی‌گردد.
+
+
+def make_etag(*parts, weak=False):
+    etag = quote_etag(hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest())
+    return f'W/{etag}' if weak else etag
+
+
+def is_conditional(request):
+    return 'If-None-Match' in request.headers
+
+
+def matches(request, etag):
+    # If-None-Match با مقایسه ضعیف بررسی می‌شود (RFC 9110)، پس W/ در هیچ طرف مهم نیست
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    etags = parse_etags(header)
+    etag = etag.removeprefix('W/')
+    return '*' in etags or any(tag.removeprefix('W/') == etag for tag in etags)
+
+
+def with_etag(response, etag):
+    # پاسخ خصوصی هر کاربر است و قبل از هر استفاده دوباره باید با سرور تأیید شود
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def not_modified(etag):
+    return with_etag(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+
+
+def load_state_version(game_id):
+    # فقط ستون‌هایی که ETag وضعیت لازم دارد؛ یک SELECT روی ایندکس یکتای game_id
+    fields = ('version', 'player1_time', 'player2_time', 'clock_started_at', 'current_player', 'game__status',
+              'game__winner', 'game__player1', 'game__player2')
+    return GameState.objects.select_related('game').only(*fields).get(game__game_id=game_id)
+
+
+def game_state_etag(state):
+    # از وضعیت ذخیره‌شده ساخته می‌شود: version با هر نوشتن روی GameState زیاد می‌شود و لنگرهای ساعت
+    # (زمان تسویه‌شده و clock_started_at) هم جزو آن‌اند؛ وضعیت و برنده روی Game است.
+    # وقتی ساعت بازیکن فعلی جاری است، ثانیه‌های باقیمانده پاسخ از همین لنگرها و ساعت فعلی محاسبه می‌شوند و
+    # بدنه با گذشت زمان عوض می‌شود در حالی که ETag تا حرکت بعدی ثابت است. ETag قوی یعنی بدنه بایت به بایت
+    # یکسان (RFC 9110 بخش 8.8.1) و کش‌ها و درخواست‌های Range به آن تکیه می‌کنند، پس در این حالت ETag ضعیف است.
+    # بازی متوقف، شروع‌نشده یا تمام‌شده ساعت جاری ندارد و بدنه‌اش فقط به همین مقادیر ذخیره‌شده بستگی دارد،
+    # پس ETag قوی می‌گیرد.
+    game = state.game
+    ticking = bool(state.clock_started_at and state.current_player_id)
+    return make_etag('game_state', state.version, game.status, game.winner_id, state.current_player_id,
+                     state.player1_time, state.player2_time, state.clock_started_at, weak=ticking)
+
+
+def profile_etag(user, stats, user_fields, stats_fields):
+    # user ردیف تازه دیتابیس است، نه نسخه کش توکن؛ آمار همان ردیف‌هایی است که پاسخ برمی‌گرداند
+    return make_etag('profile', user.pk, [getattr(user, field) for field in user_fields],
+                     [[getattr(row, field) for field in stats_fields] for row in stats])
+
+
+def page_etag(request, name, keys):
+    # ردیف‌های این لیست‌ها بعد از ساخته شدن تغییر نمی‌کنند، فقط اضافه یا حذف می‌شوند؛ پس idهای همین صفحه
+    # (به علاوه ردیف اول صفحه بعد که لینک next را تعیین می‌کند) برای ETag کافی است
+    return make_etag(name, request.user.pk, request.get_full_path(), tuple(keys))
+
+
+def page_response(request, name, paginator, queryset, serializer_class, detail=None):
+    # با If-None-Match فقط idهای صفحه از ایندکس خوانده می‌شوند؛ در غیر این صورت ردیف‌های صفحه یک بار
+    # خوانده می‌شوند و ETag از همان‌ها ساخته می‌شود، پس GET معمولی کوئری اضافه ندارد.
+    # detail همان queryset را با select_related/only برای سریالایزر آماده می‌کند.
+    if is_conditional(request):
+        etag = page_etag(request, name, paginator.page_keys(request, queryset))
+        if matches(request, etag):
+            return not_modified(etag)
+    rows = paginator.fetch(request, detail(queryset) if detail else queryset)
+    etag = page_etag(request, name, [row.pk for row in rows])
+    return with_etag(paginator.response(request, queryset, serializer_class, rows=rows), etag)
@@ -0,0 +1,67 @@
+from django.db import transaction
+from django.db.models import F
+
+from .authentication import token_cache
+from .models import LedgerEntry, User
+
+
+# تغییر سکه و XP فقط با یک UPDATE تک‌دستوری روی همان ستون انجام می‌شود، نه خواندن-تغییر-save؛
+# پس درخواست‌های هم‌زمان از تب‌ها یا سوکت‌های دیگر تغییرات هم را گم نمی‌کنند. مقدار روی شیء user
+# در حافظه فقط برای پاسخ همین درخواست به‌روز می‌شود و مقدار معتبر همان ستون دیتابیس است.
+
+def spend_coins(user, amount=1):
+    # UPDATE ... SET coins = coins - amount WHERE id = ? AND coins >= amount؛
+    # اگر موجودی کافی نباشد هیچ سطری تغییر نمی‌کند و False برمی‌گردد
+    if not User.objects.filter(pk=user.pk, coins__gte=amount).update(coins=F('coins') - amount):
+        return False
+    user.coins = max(user.coins - amount, 0)
+    invalidate_cached_user(user.pk)
+    return True
+
+
+def add_coins(user, amount):
+    User.objects.filter(pk=user.pk).update(coins=F('coins') + amount)
+    user.coins += amount
+    invalidate_cached_user(user.pk)
+
+
+def add_xp(user, amount):
+    User.objects.filter(pk=user.pk).update(xp=F('xp') + amount)
+    user.xp += amount
+    invalidate_cached_user(user.pk)
+
+
+def invalidate_cached_user(user_id):
+    # update() سیگنال post_save ندارد؛ کاربر کش‌شده بعد از commit باطل می‌شود
+    transaction.on_commit(lambda: token_cache.invalidate_user(user_id))
+
+
+def ledger_entry(user, currency, delta, reason, game=None):
+    return LedgerEntry(user_id=user.pk, game_id=game.pk if game else None, currency=currency, delta=delta,
+                       reason=reason)
+
+
+class Ledger:
+    # تغییرات یک درخواست API؛ ردیف‌های دفتر حساب در پایان با یک bulk_create و در همان تراکنش نوشته می‌شوند
+    def __init__(self, game=None):
+        self.game = game
+        self.entries = []
+
+    def spend_coins(self, user, amount, reason):
+        if not spend_coins(user, amount):
+            return False
+        self.entries.append(ledger_entry(user, LedgerEntry.CURRENCY_COINS, -amount, reason, self.game))
+        return True
+
+    def add_coins(self, user, amount, reason):
+        add_coins(user, amount)
+        self.entries.append(ledger_entry(user, LedgerEntry.CURRENCY_COINS, amount, reason, self.game))
+
+    def add_xp(self, user, amount, reason):
+        add_xp(user, amount)
+        self.entries.append(ledger_entry(user, LedgerEntry.CURRENCY_XP, amount, reason, self.game))
+
+    def write(self):
+        if self.entries:
+            LedgerEntry.objects.bulk_create(self.entries)
+            self.entries = []
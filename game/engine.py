@@ -0,0 +1,222 @@
+import random
+import re
+from typing import NamedTuple, Optional
+
+# قواعد بازی، بدون ORM، Channels یا ساعت. viewهای REST و GameConsumer فقط وضعیت را از مدل یا session
+# به EngineState می‌برند، حرکت را اینجا اجرا می‌کنند و نتیجه را ذخیره و پخش می‌کنند؛ پس امتیاز، نوبت،
+# شماره راهنمایی و نتیجه پایان بازی در هر دو مسیر یکی است و می‌شود قواعد را جدا تست و بنچمارک کرد.
+# بازیکن‌ها با id شناخته می‌شوند و کلیدهای hints و revealed مثل ستون‌های JSON رشته id هستند.
+
+MASK_CHAR = '_'
+LETTER_SCORE = 20  # حدس حرف درست +۲۰ و غلط −۲۰
+WORD_SCORE = 100  # حدس درست کلمه برای حدس‌زننده
+WRONG_WORD_SCORE = 50  # حدس غلط کلمه برای حریف، که برنده هم می‌شود
+CORRECT_LETTER_COINS = 1
+HINT_COST = 1
+REVEAL_COST = 1
+MAX_HINTS = 3  # Word.hint1 تا hint3
+WIN_XP = 50
+
+WON, LOST, DRAW = 'won', 'lost', 'draw'
+
+LETTER_RE = re.compile(r'[A-Zآ-ی]')
+
+
+class MoveError(Exception):
+    FINISHED = 'finished'
+    NOT_PLAYER = 'not_player'
+    NOT_YOUR_TURN = 'not_your_turn'
+    MISSING_MOVE = 'missing_move'
+    BAD_POSITION = 'bad_position'
+    INVALID_POSITION = 'invalid_position'
+    INVALID_LETTER = 'invalid_letter'
+    NO_HINTS = 'no_hints'
+    NOTHING_TO_REVEAL = 'nothing_to_reveal'
+
+    MESSAGES = {
+        FINISHED: 'بازی تمام شده است.',
+        NOT_PLAYER: 'شما اجازه دسترسی به این بازی را ندارید.',
+        NOT_YOUR_TURN: 'الان نوبت شما نیست.',
+        MISSING_MOVE: 'لطفاً یک حرف و موقعیت آن را وارد کنید.',
+        BAD_POSITION: 'موقعیت باید یک عدد صحیح باشد.',
+        INVALID_POSITION: 'موقعیت واردشده معتبر نیست.',
+        INVALID_LETTER: 'حرف نامعتبر است. (فقط حروف الفبا)',
+        NO_HINTS: 'شما از تمام راهنمایی‌ها استفاده کرده‌اید.',
+        NOTHING_TO_REVEAL: 'هیچ حرفی برای نمایش باقی نمانده است.',
+    }
+
+    def __init__(self, code):
+        super().__init__(self.MESSAGES[code])
+        self.code = code
+        self.message = self.MESSAGES[code]
+
+
+class EngineState:
+    # کپی فشرده وضعیت یک بازی؛ hints و revealed هنگام تغییر جایگزین می‌شوند (نه ویرایش درجا)
+    # تا اگر پرداخت سکه بعد از حرکت رد شد، dictهای مدل دست‌نخورده بمانند
+    __slots__ = ('word', 'masked', 'solved_count', 'player1', 'player2', 'current', 'score1', 'score2',
+                 'hints', 'revealed', 'finished', 'winner')
+
+    def __init__(self, word, player1, player2=None, current=None, masked=None, solved_count=None, score1=0,
+                 score2=0, hints=None, revealed=None, finished=False, winner=None):
+        self.word = word
+        self.masked = masked or MASK_CHAR * len(word)
+        self.solved_count = len(self.masked) - self.masked.count(MASK_CHAR) if solved_count is None else solved_count
+        self.player1 = player1
+        self.player2 = player2
+        self.current = current
+        self.score1 = score1
+        self.score2 = score2
+        self.hints = hints if isinstance(hints, dict) else {}
+        self.revealed = revealed if isinstance(revealed, dict) else {}
+        self.finished = finished
+        self.winner = winner
+
+    @property
+    def is_solved(self):
+        return self.solved_count >= len(self.masked)
+
+    def opponent(self, player):
+        return self.player2 if player == self.player1 else self.player1
+
+    def score(self, player):
+        return self.score1 if player == self.player1 else self.score2
+
+    def add_score(self, player, delta):
+        if player == self.player1:
+            self.score1 += delta
+        else:
+            self.score2 += delta
+
+
+class Outcome(NamedTuple):
+    winner: Optional[int]  # None یعنی تساوی
+    result1: str
+    result2: str
+    xp: int
+
+
+class LetterResult(NamedTuple):
+    correct: bool
+    position: int
+    letter: str
+    score_delta: int
+    coins: int
+    outcome: Optional[Outcome]  # فقط وقتی این حدس آخرین خانه را حل کرده باشد
+
+
+class WordResult(NamedTuple):
+    correct: bool
+    outcome: Outcome
+
+
+class HintResult(NamedTuple):
+    number: int
+    cost: int
+
+
+class RevealResult(NamedTuple):
+    position: int
+    letter: str
+    cost: int
+
+
+def check_player(state, player):
+    if state.finished:
+        raise MoveError(MoveError.FINISHED)
+    if player is None or player not in (state.player1, state.player2):
+        raise MoveError(MoveError.NOT_PLAYER)
+
+
+def check_turn(state, player):
+    check_player(state, player)
+    if state.current != player:
+        raise MoveError(MoveError.NOT_YOUR_TURN)
+
+
+def switch_turn(state):
+    state.current = state.opponent(state.current)
+    return state.current
+
+
+def guess_letter(state, player, letter, position):
+    check_turn(state, player)
+    letter = (letter or '').upper()
+    if not letter or position is None:
+        raise MoveError(MoveError.MISSING_MOVE)
+    try:
+        position = int(position)
+    except (TypeError, ValueError):
+        raise MoveError(MoveError.BAD_POSITION)
+    if not 0 <= position < len(state.word):
+        raise MoveError(MoveError.INVALID_POSITION)
+    if not LETTER_RE.fullmatch(letter):
+        raise MoveError(MoveError.INVALID_LETTER)
+
+    # تکرار حدس برای خانه‌ای که حل شده مجاز است و امتیاز طبق روال کم یا زیاد می‌شود
+    correct = state.word[position] == letter
+    if correct and state.masked[position] == MASK_CHAR:
+        state.masked = f'{state.masked[:position]}{letter}{state.masked[position + 1:]}'
+        state.solved_count += 1
+    delta = LETTER_SCORE if correct else -LETTER_SCORE
+    state.add_score(player, delta)
+    switch_turn(state)
+    outcome = finish(state) if state.is_solved else None
+    return LetterResult(correct, position, letter, delta, CORRECT_LETTER_COINS if correct else 0, outcome)
+
+
+def guess_word(state, player, guess):
+    check_turn(state, player)
+    if (guess or '').upper() == state.word:
+        state.add_score(player, WORD_SCORE)
+        return WordResult(True, finish(state, player))
+    winner = state.opponent(player)
+    state.add_score(winner, WRONG_WORD_SCORE)
+    return WordResult(False, finish(state, winner))
+
+
+def take_hint(state, player):
+    # شماره راهنمایی بعدی = تعداد راهنمایی‌های گرفته‌شده + ۱؛ گرفتن راهنمایی نوبت را عوض نمی‌کند
+    check_player(state, player)
+    key = str(player)
+    used = state.hints.get(key) or []
+    number = len(used) + 1
+    if number > MAX_HINTS:
+        raise MoveError(MoveError.NO_HINTS)
+    state.hints = {**state.hints, key: [*used, number]}
+    return HintResult(number, HINT_COST)
+
+
+def reveal_candidates(state, player):
+    # خانه‌های حل‌نشده‌ای که هنوز به این بازیکن نشان داده نشده‌اند
+    shown = set(state.revealed.get(str(player)) or ())
+    return [i for i, char in enumerate(state.masked) if char == MASK_CHAR and i not in shown]
+
+
+def reveal_letter(state, player, choose=random.choice):
+    check_player(state, player)
+    candidates = reveal_candidates(state, player)
+    if not candidates:
+        raise MoveError(MoveError.NOTHING_TO_REVEAL)
+    position = choose(candidates)
+    key = str(player)
+    state.revealed = {**state.revealed, key: [*(state.revealed.get(key) or ()), position]}
+    return RevealResult(position, state.word[position], REVEAL_COST)
+
+
+def finish(state, winner=None):
+    # بدون برنده از پیش تعیین‌شده (حل شدن همه خانه‌ها) برنده با امتیاز مشخص می‌شود و برابری یعنی تساوی
+    if winner is None and state.score1 != state.score2:
+        winner = state.player1 if state.score1 > state.score2 else state.player2
+    state.finished = True
+    state.winner = winner
+    if winner is None:
+        return Outcome(None, DRAW, DRAW, 0)
+    if winner == state.player1:
+        return Outcome(winner, WON, LOST, WIN_XP)
+    return Outcome(winner, LOST, WON, WIN_XP)
+
+
+def time_up(state, loser):
+    # بازیکنی که کل زمانش تمام شده می‌بازد، امتیازها هرچه باشد
+    return finish(state, state.opponent(loser))
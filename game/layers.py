@@ -0,0 +1,147 @@
+import bisect
+import hashlib
+import time
+from collections import defaultdict
+
+from channels_redis.core import RedisChannelLayer
+
+
+class HashRing:
+    # hash سازگار با نودهای مجازی؛ با اضافه یا کم شدن یک سرور Redis فقط گروه‌های همان بازه جابه‌جا می‌شوند
+    def __init__(self, nodes, replicas=64):
+        points = sorted((self.hash(f'{node}#{replica}'), index)
+                        for index, node in enumerate(nodes) for replica in range(replicas))
+        self._points = [point for point, _ in points]
+        self._nodes = [index for _, index in points]
+        self.size = len(nodes)
+
+    @staticmethod
+    def hash(value):
+        if isinstance(value, str):
+            value = value.encode('utf8')
+        return int.from_bytes(hashlib.md5(value).digest()[:8], 'big')
+
+    def node(self, value):
+        if self.size == 1:
+            return 0
+        index = bisect.bisect(self._points, self.hash(value)) % len(self._points)
+        return self._nodes[index]
+
+
+def host_label(host):
+    return host.get('address') or f"{host.get('host', 'localhost')}:{host.get('port', 6379)}"
+
+
+class ShardedRedisChannelLayer(RedisChannelLayer):
+    # گروه‌های game_<id> با hash سازگار روی چند سرور Redis پخش می‌شوند و کانال‌های همین پروسس
+    # (معمولاً هر دو بازیکن یک بازی) پیام را بدون رفت و برگشت به Redis مستقیم در صف دریافت می‌گیرند
+    def __init__(self, hosts=None, replicas=64, **kwargs):
+        super().__init__(hosts=hosts, **kwargs)
+        self.ring = HashRing([host_label(host) for host in self.hosts], replicas)
+        self.local_groups = defaultdict(dict)  # گروه -> {کانال محلی: زمان group_add}
+        self.receivers = {}  # کانال محلی -> آخرین زمان شروع یا پایان receive
+        self.inflight = defaultdict(int)  # کانال محلی -> تعداد receiveهای در جریان
+        self.local_deliveries = 0
+        self._last_prune = time.monotonic()
+
+    def consistent_hash(self, value):
+        # کانال‌های محلی همیشه با بخش non-local خود hash می‌شوند تا send و receive به یک سرور برسند
+        if isinstance(value, str) and '!' in value:
+            value = self.non_local_name(value)
+        return self.ring.node(value)
+
+    def is_local(self, channel):
+        return '!' in channel and self.non_local_name(channel).endswith(self.client_prefix + '!')
+
+    def is_receiving(self, channel):
+        # receive در جریان، هر قدر هم طول کشیده باشد، یعنی consumer زنده است
+        if self.inflight.get(channel):
+            return True
+        seen = self.receivers.get(channel)
+        return seen is not None and time.monotonic() - seen < self.expiry
+
+    def deliver_local(self, channel, message):
+        self.receive_buffer[channel].put_nowait(dict(message))
+        self.local_deliveries += 1
+
+    def prune_receivers(self):
+        # کانال consumerهایی که بسته شده‌اند بعد از expiry (همان عمر پیام در Redis) دور ریخته می‌شوند؛
+        # کانالی که receive در جریان دارد هرگز حذف نمی‌شود
+        now = time.monotonic()
+        if now - self._last_prune < self.expiry:
+            return
+        self._last_prune = now
+        dead = set()
+        for channel, seen in list(self.receivers.items()):
+            if not self.inflight.get(channel) and now - seen >= self.expiry:
+                del self.receivers[channel]
+                self.receive_buffer.pop(channel, None)
+                dead.add(channel)
+        # عضویت گروهِ consumerهای مرده (بدون group_discard) هم حذف می‌شود و بقیه مثل عضویت Redis
+        # بعد از group_expiry منقضی می‌شوند
+        for group, members in list(self.local_groups.items()):
+            for channel, added in list(members.items()):
+                if channel in dead or now - added >= self.group_expiry:
+                    del members[channel]
+            if not members:
+                del self.local_groups[group]
+
+    async def new_channel(self, prefix='specific'):
+        self.prune_receivers()
+        return await super().new_channel(prefix)
+
+    async def receive(self, channel):
+        if not self.is_local(channel):
+            return await super().receive(channel)
+        self.receivers[channel] = time.monotonic()
+        self.inflight[channel] += 1
+        try:
+            return await super().receive(channel)
+        finally:
+            self.receivers[channel] = time.monotonic()
+            self.inflight[channel] -= 1
+            if not self.inflight[channel]:
+                del self.inflight[channel]
+
+    async def send(self, channel, message):
+        if self.is_local(channel) and self.is_receiving(channel):
+            self.deliver_local(channel, message)
+            return
+        await super().send(channel, message)
+
+    async def group_add(self, group, channel):
+        await super().group_add(group, channel)
+        if self.is_local(channel):
+            self.local_groups[group][channel] = time.monotonic()
+
+    async def group_discard(self, group, channel):
+        members = self.local_groups.get(group)
+        if members is not None:
+            members.pop(channel, None)
+            if not members:
+                del self.local_groups[group]
+        await super().group_discard(group, channel)
+
+    async def group_send(self, group, message):
+        # اعضای محلی قبل از هر تماس با Redis پیام را می‌گیرند؛ عضویت گروه فقط برای پیدا کردن
+        # کانال‌های پروسس‌های دیگر خوانده می‌شود و کانال‌های محلی از ارسال Redis حذف می‌شوند
+        members = self.local_groups.get(group, {})
+        now = time.monotonic()
+        for channel, added in list(members.items()):
+            if now - added < self.group_expiry:
+                self.deliver_local(channel, message)
+            else:
+                del members[channel]
+        if group in self.local_groups and not members:
+            del self.local_groups[group]
+        await super().group_send(group, message)
+
+    def _map_channel_keys_to_connection(self, channel_names, message):
+        remote = [channel for channel in channel_names if not self.is_local(channel)]
+        return super()._map_channel_keys_to_connection(remote, message)
+
+    async def flush(self):
+        self.local_groups.clear()
+        self.receivers.clear()
+        self.inflight.clear()
+        await super().flush()
@@ -0,0 +1,346 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count
+from django.utils import timezone
+
+from .engine import WIN_XP
+from .log import get_logger
+from .models import Game, GameHistory, SharedVersion, User
+
+log = get_logger(__name__)
+
+# نام شمارنده نسخه در SharedVersion؛ بعد از ساختن دوباره snapshot زیاد می‌شود تا پروسس‌ها آن را بخوانند
+VERSION_NAME = 'leaderboard'
+GLOBAL = 'global'
+
+
+def band_board(band):
+    return f'band:{band}'
+
+
+def level_board(level):
+    return f'level:{level}'
+
+
+# مجموعه‌ای مرتب از (امتیاز نزولی، شناسه کاربر).
+# top-N با یک برش O(N)، رتبه با جستجوی دودویی O(log n) و تغییر امتیاز با حذف و درج در لیست مرتب انجام می‌شود.
+class RankedSet:
+    def __init__(self, scores=None):
+        self._scores = dict(scores or {})
+        self._keys = sorted((-score, user_id) for user_id, score in self._scores.items())
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, user_id):
+        return user_id in self._scores
+
+    def score(self, user_id):
+        return self._scores.get(user_id)
+
+    def scores(self):
+        return dict(self._scores)
+
+    def set(self, user_id, score):
+        self.discard(user_id)
+        self._scores[user_id] = score
+        insort(self._keys, (-score, user_id))
+
+    def add(self, user_id, delta):
+        self.set(user_id, self._scores.get(user_id, 0) + delta)
+
+    def discard(self, user_id):
+        score = self._scores.pop(user_id, None)
+        if score is not None:
+            del self._keys[bisect_left(self._keys, (-score, user_id))]
+
+    def rank(self, user_id):
+        score = self._scores.get(user_id)
+        if score is None:
+            return None
+        return bisect_left(self._keys, (-score, user_id)) + 1
+
+    def top(self, n, offset=0):
+        # خروجی لیست (رتبه، شناسه کاربر، امتیاز)
+        return [(offset + i + 1, user_id, -score) for i, (score, user_id) in enumerate(self._keys[offset:offset + n])]
+
+    def around(self, user_id, radius):
+        rank = self.rank(user_id)
+        if rank is None:
+            return []
+        start = max(0, rank - 1 - radius)
+        return self.top(rank - start + radius, offset=start)
+
+
+class LeaderboardLoading(Exception):
+    # جدول هنوز بار نشده و خواندن بیشتر از LEADERBOARD_LOAD_TIMEOUT منتظر ماند
+    pass
+
+
+def add_user(boards, names, user_id, username, xp):
+    if user_id in boards[GLOBAL]:
+        return False
+    names[user_id] = username
+    boards[GLOBAL].set(user_id, xp)
+    boards.setdefault(band_board(User.level_for_xp(xp)), RankedSet()).set(user_id, xp)
+    return True
+
+
+def add_win(boards, names, user_id, username, delta, game_level):
+    board = boards[GLOBAL]
+    old_xp = board.score(user_id)
+    new_xp = old_xp + delta
+    board.set(user_id, new_xp)
+    boards.get(band_board(User.level_for_xp(old_xp)), RankedSet()).discard(user_id)
+    boards.setdefault(band_board(User.level_for_xp(new_xp)), RankedSet()).set(user_id, new_xp)
+    boards.setdefault(level_board(game_level), RankedSet()).add(user_id, delta)
+    names[user_id] = username
+
+
+# جدول رده‌بندی درون حافظه: یک جدول کلی بر اساس XP، یک جدول برای هر سطح کاربر (User.level)
+# و یک جدول برای هر سطح بازی بر اساس XP به‌دست‌آمده از بردهای همان سطح.
+# هر پروسس فقط بردهای خودش را می‌بیند، پس snapshot فقط از دیتابیس و با دستور rebuild_leaderboard (تنها
+# نویسنده) ساخته می‌شود؛ پروسس‌ها آن را می‌خوانند، بردهای بعد از آن را از دیتابیس اعمال می‌کنند و با هر برد خود
+# به‌روز می‌شوند.
+class Leaderboard:
+    def __init__(self, snapshot_path=None, version_check_interval=None, load_timeout=None):
+        if snapshot_path is None:
+            snapshot_path = getattr(settings, 'LEADERBOARD_SNAPSHOT_PATH',
+                                    os.path.join(settings.BASE_DIR, 'leaderboard_snapshot.json'))
+        if version_check_interval is None:
+            version_check_interval = getattr(settings, 'LEADERBOARD_VERSION_CHECK_INTERVAL', 5)
+        if load_timeout is None:
+            load_timeout = getattr(settings, 'LEADERBOARD_LOAD_TIMEOUT', 5)
+        self.snapshot_path = snapshot_path
+        self.version_check_interval = version_check_interval
+        self.load_timeout = load_timeout
+        self._lock = threading.RLock()
+        self._boards = None
+        self._names = {}
+        self._version = None
+        self._checked_at = 0.0
+        self._stale = False
+        self._loading = False
+        self._loaded = threading.Event()
+        self._generation = 0
+        self._pending_users = set()  # برنده‌هایی که روی جدول نبودند؛ XP آن‌ها در خواندن بعدی از دیتابیس می‌آید
+
+    # ---------- ساختن و بارگذاری ----------
+
+    @staticmethod
+    def build(users, level_wins):
+        # users: (شناسه، نام کاربری، XP) و level_wins: (شناسه، سطح بازی، تعداد برد)؛ هر دو یک بار پیمایش می‌شوند
+        names = {}
+        xp = {}
+        bands = {}
+        for user_id, username, user_xp in users:
+            names[user_id] = username
+            xp[user_id] = user_xp
+            bands.setdefault(band_board(User.level_for_xp(user_xp)), {})[user_id] = user_xp
+        levels = {level_board(level): {} for level, _ in Game.LEVEL_CHOICES}
+        for user_id, level, wins in level_wins:
+            if user_id in names:
+                levels.setdefault(level_board(level), {})[user_id] = wins * WIN_XP
+        boards = {GLOBAL: RankedSet(xp)}
+        for name, scores in list(bands.items()) + list(levels.items()):
+            boards[name] = RankedSet(scores)
+        return boards, names
+
+    @staticmethod
+    def query_rows():
+        users = User.objects.order_by().values_list('id', 'username', 'xp').iterator(chunk_size=10000)
+        level_wins = GameHistory.objects.filter(result='won').order_by().values('player_id', 'level').annotate(
+            wins=Count('id')).values_list('player_id', 'level', 'wins').iterator(chunk_size=10000)
+        return users, level_wins
+
+    def rebuild(self):
+        # ساختن کامل از دیتابیس؛ فقط دستور rebuild_leaderboard (یا بار اول بدون snapshot) آن را صدا می‌زند
+        taken_at = timezone.now()
+        boards, names = self.build(*self.query_rows())
+        with self._lock:
+            self._boards, self._names = boards, names
+            self._generation += 1
+            self._loading = False
+            self._loaded.set()
+        return taken_at
+
+    def _load(self):
+        # بیرون از قفل ساخته می‌شود تا award و خواندن‌های دیگر پشت آن نمانند
+        snapshot = self.read_snapshot()
+        if snapshot is None:
+            return self.build(*self.query_rows())
+        boards = {name: RankedSet({int(user_id): score for user_id, score in scores.items()})
+                  for name, scores in snapshot['boards'].items()}
+        names = {int(user_id): username for user_id, username in snapshot['names'].items()}
+        # بردهایی که بعد از گرفتن snapshot ثبت شده‌اند دوباره اعمال می‌شوند
+        taken_at = datetime.fromisoformat(snapshot['taken_at'])
+        wins = GameHistory.objects.filter(result='won', date__gt=taken_at).values_list(
+            'player_id', 'player__username', 'player__xp', 'level')
+        for user_id, username, user_xp, level in wins.iterator():
+            if user_id in names:
+                add_win(boards, names, user_id, username, WIN_XP, level)
+            else:
+                # کاربری که بعد از snapshot ساخته شده؛ XP فعلی‌اش همه این بردها را شامل می‌شود
+                add_user(boards, names, user_id, username, user_xp)
+                boards.setdefault(level_board(level), RankedSet()).add(user_id, WIN_XP)
+        return boards, names
+
+    def _start_load(self):
+        with self._lock:
+            if self._loading:
+                return
+            self._loading = True
+            self._stale = False
+            generation = self._generation
+        if getattr(settings, 'LEADERBOARD_BACKGROUND_LOAD', True):
+            threading.Thread(target=self._run_load, args=(generation, True), name='leaderboard-load',
+                             daemon=True).start()
+        else:
+            self._run_load(generation, False)
+
+    def _run_load(self, generation, background):
+        # تا بار شدن جدول تازه، خواندن‌ها از جدول قبلی (اگر باشد) جواب می‌گیرند
+        try:
+            boards, names = self._load()
+            with self._lock:
+                if generation == self._generation:
+                    self._boards, self._names = boards, names
+                    self._loaded.set()
+        except Exception:
+            log.exception('leaderboard.load_failed')
+            if not background:
+                raise
+        finally:
+            with self._lock:
+                if generation == self._generation:
+                    self._loading = False
+            if background:
+                connections.close_all()
+
+    def invalidate(self):
+        # نسخه حافظه کنار گذاشته می‌شود و در خواندن بعدی دوباره بارگذاری می‌شود
+        with self._lock:
+            self._boards = None
+            self._names = {}
+            self._pending_users = set()
+            self._loading = False
+            self._generation += 1
+            self._loaded.clear()
+
+    def _shared_version(self):
+        return SharedVersion.current(VERSION_NAME)
+
+    def bump_version(self):
+        SharedVersion.bump(VERSION_NAME)
+
+    def _ensure_loaded(self):
+        now = time.monotonic()
+        if now - self._checked_at >= self.version_check_interval:
+            version = self._shared_version()
+            with self._lock:
+                self._checked_at = now
+                if version != self._version:
+                    self._stale = self._version is not None
+                    self._version = version
+        if self._boards is None or self._stale:
+            self._start_load()
+        if self._boards is None and not self._loaded.wait(self.load_timeout):
+            raise LeaderboardLoading()
+        self._add_pending_users()
+
+    def _add_pending_users(self):
+        with self._lock:
+            pending, self._pending_users = self._pending_users, set()
+        if not pending:
+            return
+        for user_id, username, xp in User.objects.filter(pk__in=pending).values_list('id', 'username', 'xp'):
+            self.ensure_user(user_id, username, xp)
+
+    # ---------- snapshot ----------
+
+    def snapshot(self, taken_at=None):
+        with self._lock:
+            return {
+                'taken_at': (taken_at or timezone.now()).isoformat(),
+                'names': dict(self._names),
+                'boards': {name: board.scores() for name, board in self._boards.items()},
+            }
+
+    def write_snapshot(self, taken_at=None):
+        data = self.snapshot(taken_at)
+        temp_path = f'{self.snapshot_path}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(temp_path, self.snapshot_path)
+
+    def read_snapshot(self):
+        try:
+            with open(self.snapshot_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    # ---------- به‌روزرسانی ----------
+
+    def ensure_user(self, user_id, username, xp):
+        with self._lock:
+            if self._boards is not None:
+                add_user(self._boards, self._names, user_id, username, xp)
+
+    def award(self, user_id, username, delta, game_level):
+        # بعد از ثبت XP برنده در دیتابیس صدا زده می‌شود
+        with self._lock:
+            if self._boards is None:
+                return  # در اولین خواندن از دیتابیس ساخته می‌شود
+            if user_id in self._boards[GLOBAL]:
+                add_win(self._boards, self._names, user_id, username, delta, game_level)
+                return
+            # XP کل این کاربر روی جدول نیست و از delta ساخته نمی‌شود؛ خواندن بعدی آن را از User.xp (که همین برد
+            # را هم شامل است) می‌گیرد. award ممکن است از کد async صدا زده شود، پس اینجا کوئری زده نمی‌شود.
+            self._boards.setdefault(level_board(game_level), RankedSet()).add(user_id, delta)
+            self._names[user_id] = username
+            self._pending_users.add(user_id)
+
+    def remove(self, user_id):
+        with self._lock:
+            if self._boards is None:
+                return
+            for board in self._boards.values():
+                board.discard(user_id)
+            self._names.pop(user_id, None)
+            self._pending_users.discard(user_id)
+
+    # ---------- خواندن ----------
+
+    def _rows(self, entries):
+        return [{'rank': rank, 'username': self._names.get(user_id), 'xp': score} for rank, user_id, score in entries]
+
+    def top(self, name, n):
+        self._ensure_loaded()
+        with self._lock:
+            board = self._boards.get(name, RankedSet())
+            return self._rows(board.top(n))
+
+    def rank(self, name, user):
+        self._ensure_loaded()
+        self.ensure_user(user.id, user.username, user.xp)
+        with self._lock:
+            board = self._boards.get(name, RankedSet())
+            return board.rank(user.id), len(board)
+
+    def around(self, name, user, radius):
+        self._ensure_loaded()
+        self.ensure_user(user.id, user.username, user.xp)
+        with self._lock:
+            board = self._boards.get(name, RankedSet())
+            return self._rows(board.around(user.id, radius))
+
+
+leaderboard = Leaderboard()
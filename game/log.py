@@ -0,0 +1,164 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+
+from django.conf import settings
+from django.core.signals import setting_changed
+
+# لاگ ساخت‌یافته: هر رویداد یک نام ثابت (مثل 'game.created') و چند فیلد است و یک خط JSON می‌شود.
+# فراخواننده فقط رکورد را در صف می‌گذارد؛ قالب‌بندی و نوشتن در thread جدای QueueListener انجام
+# می‌شود تا نه event loop و نه thread درخواست پشت stdout منتظر بماند.
+
+# فیلدهای context (game_id، user_id) که به همه رویدادهای این درخواست یا پیام اضافه می‌شوند
+log_context = contextvars.ContextVar('log_context', default=None)
+
+
+class bind:
+    # یک scope تازه از context؛ scope بیرونی دست نمی‌خورد و با خروج برمی‌گردد
+    __slots__ = ('fields', 'token')
+
+    def __init__(self, **fields):
+        self.fields = fields
+
+    def __enter__(self):
+        self.token = log_context.set({**(log_context.get() or {}), **self.fields})
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        log_context.reset(self.token)
+        return False
+
+
+def bind_fields(**fields):
+    # افزودن به scope جاری، مثلاً user_id بعد از احراز هویت توکن داخل view؛ بیرون از scope کاری نمی‌کند
+    context = log_context.get()
+    if context is not None:
+        context.update(fields)
+
+
+class EventLogger:
+    def __init__(self, name):
+        self.logger = logging.getLogger(name)
+
+    def is_enabled(self, level):
+        # isEnabledFor نتیجه را کش می‌کند؛ رویداد debug خاموش فقط همین یک lookup هزینه دارد
+        return self.logger.isEnabledFor(level)
+
+    def log(self, level, event, fields, exc_info=False):
+        if not self.logger.isEnabledFor(level):
+            return
+        rate = sample_rates().get(event)
+        if rate is not None:
+            if random.random() >= rate:
+                return
+            fields['sample_rate'] = rate
+        context = log_context.get()
+        self.logger.log(level, event, exc_info=exc_info, stacklevel=3,
+                        extra={'event_fields': fields, 'event_context': dict(context) if context else None})
+
+    def debug(self, event, **fields):
+        self.log(logging.DEBUG, event, fields)
+
+    def info(self, event, **fields):
+        self.log(logging.INFO, event, fields)
+
+    def warning(self, event, **fields):
+        self.log(logging.WARNING, event, fields)
+
+    def error(self, event, **fields):
+        self.log(logging.ERROR, event, fields)
+
+    def exception(self, event, **fields):
+        self.log(logging.ERROR, event, fields, exc_info=True)
+
+
+def get_logger(name):
+    return EventLogger(name)
+
+
+_sample_rates = None
+
+
+def sample_rates():
+    # نرخ نمونه‌برداری هر رویداد پرتکرار از LOG_SAMPLE_RATES؛ رویدادهای دیگر همیشه ثبت می‌شوند
+    global _sample_rates
+    if _sample_rates is None:
+        _sample_rates = dict(getattr(settings, 'LOG_SAMPLE_RATES', {}))
+    return _sample_rates
+
+
+def reset_sample_rates(setting, **kwargs):
+    global _sample_rates
+    if setting == 'LOG_SAMPLE_RATES':
+        _sample_rates = None
+
+
+setting_changed.connect(reset_sample_rates, dispatch_uid='game.log.reset_sample_rates')
+
+
+class StructuredFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f'.{int(record.msecs):03d}',
+            'severity': record.levelname.lower(),
+            'logger': record.name,
+            'event': record.getMessage(),
+        }
+        context = getattr(record, 'event_context', None)
+        if context:
+            payload.update(context)
+        payload.update(getattr(record, 'event_fields', None) or {})
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class BackgroundHandler(logging.handlers.QueueHandler):
+    # از LOGGING در settings ساخته می‌شود؛ formatter تنظیم‌شده به handler مقصد داده می‌شود تا
+    # قالب‌بندی هم در thread پس‌زمینه انجام شود
+    def __init__(self, stream=None, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        self.target = logging.StreamHandler(stream or sys.stdout)
+        self.dropped = 0
+        self.listener = logging.handlers.QueueListener(self.queue, self.target, respect_handler_level=False)
+        self.listener.start()
+        atexit.register(self.close)
+
+    def setFormatter(self, fmt):
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # برخلاف QueueHandler پیش‌فرض پیام قالب‌بندی نمی‌شود؛ فقط یک کپی سطحی در صف می‌رود
+        return copy.copy(record)
+
+    def enqueue(self, record):
+        # صف پر یعنی خروجی عقب افتاده؛ رکورد دور ریخته می‌شود تا درخواست بلاک نشود
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        if self.listener._thread is not None:
+            self.listener.stop()
+        super().close()
+
+
+class LogContextMiddleware:
+    # هر درخواست scope خودش را دارد؛ game_id از آدرس و user_id بعد از احراز هویت DRF اضافه می‌شوند
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with bind():
+            return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if 'game_id' in view_kwargs:
+            bind_fields(game_id=str(view_kwargs['game_id']))
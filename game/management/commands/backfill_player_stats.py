@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from game.models import GameHistory, GameState, PlayerStats
+
+
+class Command(BaseCommand):
+    help = 'ساختن دوباره جدول PlayerStats از روی GameHistory به صورت دسته‌ای.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        start = time.perf_counter()
+        stats = {}  # (user_id, level) -> PlayerStats؛ حافظه به تعداد بازیکنان بستگی دارد نه تعداد بازی‌ها
+        rows = 0
+        last_id = 0
+        # تاریخچه به ترتیب ثبت (id) خوانده می‌شود تا streakها درست حساب شوند؛ صفحه‌بندی keyset روی کلید اصلی
+        while True:
+            batch = list(GameHistory.objects.filter(id__gt=last_id).order_by('id').values_list(
+                'id', 'game_id', 'game__player1_id', 'player_id', 'level', 'result')[:batch_size])
+            if not batch:
+                break
+            scores = {game_id: (player1_score, player2_score) for game_id, player1_score, player2_score in
+                      GameState.objects.filter(game_id__in={row[1] for row in batch}).values_list(
+                          'game_id', 'player1_score', 'player2_score')}
+            for history_id, game_id, player1_id, player_id, level, result in batch:
+                item = stats.get((player_id, level))
+                if item is None:
+                    item = stats[(player_id, level)] = PlayerStats(user_id=player_id, level=level)
+                self.apply(item, result, self.score(scores.get(game_id), player_id == player1_id))
+            rows += len(batch)
+            last_id = batch[-1][0]
+            self.stdout.write(f'{rows} history rows read')
+
+        with transaction.atomic():
+            PlayerStats.objects.all().delete()
+            PlayerStats.objects.bulk_create(stats.values(), batch_size=batch_size)
+        self.stdout.write(f'{len(stats)} stats rows written from {rows} history rows '
+                          f'in {time.perf_counter() - start:.2f}s')
+
+    @staticmethod
+    def score(game_scores, is_player1):
+        if game_scores is None:
+            return 0
+        return game_scores[0] if is_player1 else game_scores[1]
+
+    @staticmethod
+    def apply(item, result, score):
+        # همان قواعد PlayerStats.record_results، روی آبجکت درون حافظه
+        counter = PlayerStats.RESULT_COUNTERS[result]
+        setattr(item, counter, getattr(item, counter) + 1)
+        item.total_score += score
+        item.best_score = score if item.best_score is None else max(item.best_score, score)
+        if result == 'won':
+            item.current_streak += 1
+            item.best_streak = max(item.best_streak, item.current_streak)
+        else:
+            item.current_streak = 0
@@ -0,0 +1,313 @@
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import django
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from game import engine
+from game.actions import end_game
+from game.consumers import GameConsumer
+from game.leaderboard import leaderboard
+from game.models import Game, GameState, User, Word
+from game.protocol import snapshot_payload
+from game.serializers import GameSerializer, GameStateSerializer
+from game.sessions import GameSession, load_session_state
+
+LETTERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+
+def fake_guesses(count, players):
+    return [{'letter': LETTERS[index % 26], 'position': index % 8, 'correct': index % 3 == 0,
+             'player_id': players[index % 2].id} for index in range(count)]
+
+
+class Case:
+    # یک بنچمارک با یک پارامتر؛ setup برای هر فراخوانی جداگانه اجرا می‌شود و در زمان‌گیری حساب نمی‌شود
+    def __init__(self, group, param, target, setup=None, is_async=False, max_loops=1 << 16):
+        self.group = group
+        self.param = param
+        self.target = target
+        self.setup = setup
+        self.is_async = is_async
+        self.max_loops = max_loops
+
+    @property
+    def fullname(self):
+        return f'{self.group}[{self.param}]'
+
+
+class Command(BaseCommand):
+    help = ('میکروبنچمارک مسیرهای داغ بازی (سریالایزرها، امتیازدهی حدس، قواعد GameEngine، end_game، انتخاب حرف برای نمایش و '
+            'json پیام‌ها) در چند اندازه ورودی روی دیتابیس تست SQLite؛ نتیجه به صورت JSON ذخیره می‌شود.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=5)
+        parser.add_argument('--min-time', type=float, default=0.05,
+                            help='حداقل زمان هر دور به ثانیه؛ تعداد تکرار بر این اساس تنظیم می‌شود')
+        parser.add_argument('-k', '--filter', default='', help='فقط بنچمارک‌هایی که نامشان شامل این متن است')
+        parser.add_argument('--output', help='مسیر فایل JSON (پیش‌فرض: .benchmarks/<زمان>_<commit>.json)')
+        parser.add_argument('--compare', help='فایل JSON یک اجرای قبلی برای مقایسه میانه‌ها')
+
+    def handle(self, *args, **options):
+        self.options = options
+        # روی دیتابیس تست جداگانه و snapshot موقت رده‌بندی اجرا می‌شود تا داده واقعی دست نخورد
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        snapshot_dir = tempfile.TemporaryDirectory()
+        old_snapshot_path = leaderboard.snapshot_path
+        leaderboard.snapshot_path = os.path.join(snapshot_dir.name, 'leaderboard.json')
+        leaderboard.invalidate()
+        try:
+            with override_settings(DEBUG=False,
+                                   CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}):
+                self.seed()
+                results = [self.measure(case) for case in self.cases()
+                           if options['filter'] in case.fullname]
+        finally:
+            leaderboard.snapshot_path = old_snapshot_path
+            leaderboard.invalidate()
+            snapshot_dir.cleanup()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        previous = self.load(options['compare']) if options['compare'] else {}
+        self.print_table(results, previous)
+        self.save(results)
+
+    # ------------------------------------------------------------------ داده
+
+    def seed(self):
+        self.player1 = User.objects.create_user(username='bench1', password='x', coins=1000)
+        self.player2 = User.objects.create_user(username='bench2', password='x', coins=1000)
+        self.words = {length: Word.objects.create(text=(LETTERS * 4)[:length], level='easy',
+                                                  hint1='h1', hint2='h2', hint3='h3')
+                      for length in (8, 32, 100)}
+
+    def make_state(self, guesses=0, word_length=8, **state_fields):
+        now = timezone.now()
+        game = Game.objects.create(player1=self.player1, player2=self.player2, level='easy', status='active')
+        word = self.words[word_length]
+        GameState.objects.create(game=game, word=word, current_player=self.player1, player1_time=300,
+                                 player2_time=300, last_turn_time=now, clock_started_at=now,
+                                 revealed_letters={str(self.player1.id): [], str(self.player2.id): []},
+                                 hints_used={str(self.player1.id): [], str(self.player2.id): []},
+                                 **state_fields)
+        state = load_session_state(game.game_id)
+        # تاریخچه حدس‌ها فقط در حافظه ساخته می‌شود؛ سریالایزر و payload همین لیست را می‌خوانند
+        state.__dict__['_guesses'] = fake_guesses(guesses, (self.player1, self.player2))
+        return state
+
+    # ------------------------------------------------------------------ بنچمارک‌ها
+
+    def cases(self):
+        for guesses in (0, 100, 1000):
+            state = self.make_state(guesses)
+            yield Case('GameStateSerializer.data', f'guesses={guesses}',
+                       lambda state=state: GameStateSerializer(state).data)
+            yield Case('GameStateSerializer.get_word', f'guesses={guesses}',
+                       lambda state=state, serializer=GameStateSerializer(): serializer.get_word(state))
+            yield Case('broadcast_json', f'guesses={guesses}',
+                       lambda state=state: json.dumps(snapshot_payload(state.game, state, 'letter_guessed', 1)))
+
+        for count in (10, 100, 1000):
+            Game.objects.bulk_create(
+                Game(player1=self.player1, player2=self.player2, level='easy', status='finished', winner=self.player1)
+                for _ in range(count - Game.objects.count())
+            )
+            games = list(Game.objects.select_related('player1', 'player2', 'winner')[:count])
+            yield Case('GameSerializer.many', f'games={count}',
+                       lambda games=games: GameSerializer(games, many=True).data)
+
+        for guesses in (0, 100, 1000):
+            yield self.guess_letter_case(guesses)
+
+        for length in (8, 32, 100):
+            word = self.words[length].text.upper()
+            # نیمی از خانه‌ها حل شده و یک‌چهارم خانه‌ها قبلاً به بازیکن نشان داده شده‌اند
+            masked = ''.join(char if position % 2 == 0 else engine.MASK_CHAR for position, char in enumerate(word))
+            board = engine.EngineState(word, self.player1.id, self.player2.id, self.player1.id, masked,
+                                       revealed={str(self.player1.id): list(range(1, length, 4))})
+            yield Case('engine.reveal_candidates', f'word_length={length}',
+                       lambda board=board: engine.reveal_candidates(board, self.player1.id))
+            yield self.engine_guess_case(word)
+
+        for path in ('score_win', 'draw', 'time_up'):
+            for guesses in (0, 1000):
+                yield self.end_game_case(path, guesses)
+
+    def guess_letter_case(self, guesses):
+        # بلوک امتیازدهی handle_guess_letter روی session درون حافظه؛ ارسال به گروه حذف شده است
+        state = self.make_state(guesses)
+        session = GameSession(state)
+        consumer = GameConsumer()
+        consumer.session = session
+
+        async def skip(*args, **kwargs):
+            pass
+        consumer.send_game_update_to_group = consumer.send_error_message = consumer.end_game = skip
+
+        calls = itertools.count()
+
+        def setup():
+            # حدس‌های درست و غلط یکی در میان؛ بازیکن فعلی هر بار همان کسی است که نوبتش است
+            session.pending_events.clear()
+            consumer.user = state.current_player
+            letter = session.word_text[1] if next(calls) % 2 else 'Z'
+            return state.game, state, {'letter': letter, 'position': 1}
+
+        return Case('GameConsumer.handle_guess_letter', f'guesses={guesses}', consumer.handle_guess_letter,
+                    setup=setup, is_async=True, max_loops=4096)
+
+    def engine_guess_case(self, word):
+        # فقط قاعده حدس حرف روی EngineState، بدون ORM و session؛ حدس درست و غلط یکی در میان
+        wrong = 'Z' if word[1] != 'Z' else 'Y'
+        calls = itertools.count()
+
+        def setup():
+            board = engine.EngineState(word, self.player1.id, self.player2.id, self.player1.id)
+            return board, self.player1.id, word[1] if next(calls) % 2 else wrong, 1
+
+        return Case('engine.guess_letter', f'word_length={len(word)}', engine.guess_letter, setup=setup)
+
+    def end_game_case(self, path, guesses):
+        # هر فراخوانی یک بازی تازه می‌خواهد؛ نوشتن نتیجه در دیتابیس و broadcast جزو زمان است
+        def setup():
+            fields = {'player1_score': 40, 'player2_score': 20}
+            if path == 'draw':
+                fields = {'player1_score': 20, 'player2_score': 20}
+            state = self.make_state(guesses, **fields)
+            if path == 'time_up':
+                state.player1_time = 0
+                state.clock_started_at = timezone.now() - timedelta(seconds=1)
+            session = GameSession(state)
+            if path == 'time_up':
+                return session, engine.time_up(session.engine_state(), self.player1.id), 'player_time_up'
+            return session, engine.finish(session.engine_state()), 'all_letters_guessed'
+
+        async def target(session, outcome, reason):
+            await end_game(session, outcome, reason=reason)
+
+        return Case('actions.end_game', f'path={path},guesses={guesses}', target, setup=setup, is_async=True,
+                    max_loops=64)
+
+    # ------------------------------------------------------------------ اندازه‌گیری
+
+    def run_round(self, case, loops):
+        arguments = [case.setup() if case.setup else () for _ in range(loops)]
+        if case.is_async:
+            async def run():
+                elapsed = 0.0
+                for args in arguments:
+                    start = time.perf_counter()
+                    await case.target(*args)
+                    elapsed += time.perf_counter() - start
+                return elapsed
+            return async_to_sync(run)()
+        target = case.target
+        if case.setup is None:
+            start = time.perf_counter()
+            for _ in arguments:
+                target()
+            return time.perf_counter() - start
+        elapsed = 0.0
+        for args in arguments:
+            start = time.perf_counter()
+            target(*args)
+            elapsed += time.perf_counter() - start
+        return elapsed
+
+    def measure(self, case):
+        # مثل pytest-benchmark: تعداد تکرار هر دور طوری انتخاب می‌شود که دور حداقل --min-time طول بکشد
+        loops = 1
+        self.run_round(case, 1)  # گرم کردن
+        while loops < case.max_loops:
+            if self.run_round(case, loops) >= self.options['min_time']:
+                break
+            loops *= 2
+        loops = min(loops, case.max_loops)
+        timings = [self.run_round(case, loops) / loops for _ in range(self.options['rounds'])]
+        mean = statistics.mean(timings)
+        return {
+            'group': case.group,
+            'name': case.fullname,
+            'fullname': case.fullname,
+            'param': case.param,
+            'stats': {
+                'min': min(timings),
+                'max': max(timings),
+                'mean': mean,
+                'median': statistics.median(timings),
+                'stddev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+                'rounds': len(timings),
+                'iterations': loops,
+                'ops': 1 / mean if mean else None,
+            },
+        }
+
+    # ------------------------------------------------------------------ گزارش
+
+    @staticmethod
+    def load(path):
+        with open(path) as source:
+            return {item['fullname']: item for item in json.load(source)['benchmarks']}
+
+    def print_table(self, results, previous):
+        header = f"{'benchmark':<62} | {'median us':>11} | {'min us':>10} | {'stddev':>8} | {'ops/s':>10}"
+        if previous:
+            header += f" | {'vs prev':>8}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for result in results:
+            stats = result['stats']
+            line = (f"{result['fullname']:<62} | {stats['median'] * 1e6:>11.2f} | {stats['min'] * 1e6:>10.2f} | "
+                    f"{stats['stddev'] * 1e6:>8.2f} | {stats['ops']:>10.0f}")
+            old = previous.get(result['fullname'])
+            if previous:
+                change = f"{(stats['median'] / old['stats']['median'] - 1) * 100:>+7.1f}%" if old else f"{'new':>8}"
+                line += f' | {change}'
+            self.stdout.write(line)
+
+    def commit_info(self):
+        try:
+            commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True,
+                                    text=True, check=True).stdout.strip()
+            dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                        cwd=settings.BASE_DIR, capture_output=True, text=True).stdout.strip())
+        except (OSError, subprocess.CalledProcessError):
+            return {'id': None, 'dirty': None}
+        return {'id': commit, 'dirty': dirty}
+
+    def save(self, results):
+        now = datetime.now(dt_timezone.utc)
+        commit = self.commit_info()
+        path = self.options['output']
+        if not path:
+            directory = os.path.join(settings.BASE_DIR, '.benchmarks')
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"{now:%Y%m%dT%H%M%S}_{(commit['id'] or 'nogit')[:8]}.json")
+        data = {
+            'datetime': now.isoformat(),
+            'commit_info': commit,
+            'machine_info': {
+                'python_version': platform.python_version(),
+                'platform': platform.platform(),
+                'processor': platform.processor(),
+                'django_version': django.get_version(),
+                'database': connection.vendor,
+            },
+            'options': {key: self.options[key] for key in ('rounds', 'min_time', 'filter')},
+            'benchmarks': results,
+        }
+        with open(path, 'w') as output:
+            json.dump(data, output, indent=2)
+        self.stdout.write(f'results written to {path}')
@@ -0,0 +1,73 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from game.models import Word
+from game.word_pool import WordPool, word_pool
+
+
+class Command(BaseCommand):
+    help = 'مقایسه انتخاب کلمه تصادفی با ORDER BY RANDOM() و استخر کلمات در حافظه (روی دیتابیس تست).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 100000, 1000000])
+        parser.add_argument('--random-picks', type=int, default=20,
+                            help='تعداد تکرار کوئری ORDER BY RANDOM() در هر اندازه')
+        parser.add_argument('--pool-picks', type=int, default=2000,
+                            help='تعداد انتخاب از استخر در هر اندازه')
+        parser.add_argument('--level', default='easy')
+
+    def handle(self, *args, **options):
+        # روی یک دیتابیس تست جداگانه اجرا می‌شود تا db.sqlite3 دست نخورد
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run(self, options):
+        level = options['level']
+        inserted = 0
+        header = (f"{'words':>10} | {'order_by(?) ms':>15} | {'pool load ms':>13} | {'version check us':>16} | "
+                  f"{'pool pick us':>13} | {'speedup':>8}")
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+
+        for size in sorted(options['sizes']):
+            while inserted < size:
+                batch = min(10000, size - inserted)
+                Word.objects.bulk_create(
+                    Word(text=f'word{inserted + i}', level=level, hint1='h1', hint2='h2', hint3='h3')
+                    for i in range(batch)
+                )
+                inserted += batch
+            word_pool.bump_version()  # مثل هر import دسته‌ای دیگر
+
+            picks = options['random_picks']
+            start = time.perf_counter()
+            for _ in range(picks):
+                Word.objects.filter(level=level).order_by('?').first()
+            random_ms = (time.perf_counter() - start) * 1000 / picks
+
+            # با همان فاصله بررسی نسخه‌ای که NewGameView دارد؛ هزینه هر بررسی جدا اندازه‌گیری می‌شود
+            pool = WordPool()
+            start = time.perf_counter()
+            pool.ids(level)
+            load_ms = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            for _ in range(100):
+                pool._shared_version()
+            check_us = (time.perf_counter() - start) * 1000000 / 100
+
+            picks = options['pool_picks']
+            start = time.perf_counter()
+            for _ in range(picks):
+                pool.random_word(level)
+            pick_us = (time.perf_counter() - start) * 1000000 / picks
+
+            self.stdout.write(
+                f'{size:>10} | {random_ms:>15.3f} | {load_ms:>13.1f} | {check_us:>16.1f} | {pick_us:>13.1f} | '
+                f'{random_ms * 1000 / pick_us:>7.0f}x'
+            )
@@ -0,0 +1,438 @@
+import asyncio
+import base64
+import concurrent.futures
+import hashlib
+import json
+import os
+import random
+import string
+import struct
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.testing import HttpCommunicator, WebsocketCommunicator
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from game.leaderboard import leaderboard
+from game.models import Game, GameState, Word
+from game.sessions import game_sessions
+from game.word_pool import word_pool
+
+PASSWORD = 'load-test-pass-1'
+WORD_LENGTHS = {'easy': 5, 'medium': 7, 'hard': 9}
+ACTION_TIMEOUT = 10
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+
+def percentile(samples, fraction):
+    # nearest-rank روی نمونه‌های مرتب‌شده
+    if not samples:
+        return None
+    return samples[min(len(samples) - 1, max(0, int(round(fraction * len(samples))) - 1))]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = Counter()
+
+    def add(self, name, elapsed_ms, ok=True):
+        self.samples[name].append(elapsed_ms)
+        if not ok:
+            self.errors[name] += 1
+
+    def error(self, name):
+        self.errors[name] += 1
+
+    def report(self, wall_seconds):
+        rows = []
+        for name in sorted(set(self.samples) | set(self.errors)):
+            samples = sorted(self.samples[name])
+            count = len(samples)
+            rows.append({
+                'action': name,
+                'count': count,
+                'errors': self.errors[name],
+                'error_rate': round(self.errors[name] / count, 4) if count else 1.0,
+                'throughput': round(count / wall_seconds, 2),
+                'p50_ms': percentile(samples, 0.50),
+                'p95_ms': percentile(samples, 0.95),
+                'p99_ms': percentile(samples, 0.99),
+            })
+        return rows
+
+
+class WebSocketClient:
+    # کلاینت حداقلی RFC 6455 برای --url با همان رابط WebsocketCommunicator: فقط پیام متنی، ping/pong و close
+    def __init__(self, url):
+        self.url = urlsplit(url)
+        self.reader = self.writer = None
+
+    async def connect(self, timeout=None):
+        secure = self.url.scheme == 'wss'
+        port = self.url.port or (443 if secure else 80)
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.url.hostname, port, ssl=True if secure else None), timeout)
+        key = base64.b64encode(os.urandom(16)).decode()
+        target = self.url.path + (f'?{self.url.query}' if self.url.query else '')
+        self.writer.write((f'GET {target} HTTP/1.1\r\nHost: {self.url.netloc}\r\nUpgrade: websocket\r\n'
+                           f'Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n')
+                          .encode())
+        head = (await asyncio.wait_for(self.reader.readuntil(b'\r\n\r\n'), timeout)).decode('latin-1')
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+        lines = head.split('\r\n')
+        headers = dict(line.split(':', 1) for line in lines[1:] if ':' in line)
+        headers = {name.strip().lower(): value.strip() for name, value in headers.items()}
+        connected = lines[0].split(' ')[1:2] == ['101'] and headers.get('sec-websocket-accept') == accept
+        return connected, headers.get('sec-websocket-protocol')
+
+    async def send_frame(self, opcode, payload):
+        # فریم‌های کلاینت باید mask شوند
+        mask = os.urandom(4)
+        length = len(payload)
+        if length < 126:
+            header = struct.pack('!BB', 0x80 | opcode, 0x80 | length)
+        elif length < 65536:
+            header = struct.pack('!BBH', 0x80 | opcode, 0x80 | 126, length)
+        else:
+            header = struct.pack('!BBQ', 0x80 | opcode, 0x80 | 127, length)
+        self.writer.write(header + mask + bytes(byte ^ mask[index % 4] for index, byte in enumerate(payload)))
+        await self.writer.drain()
+
+    async def send_json_to(self, data):
+        await self.send_frame(0x1, json.dumps(data).encode())
+
+    async def receive_text(self):
+        message = b''
+        while True:
+            first, second = await self.reader.readexactly(2)
+            opcode, length = first & 0x0F, second & 0x7F
+            if length == 126:
+                length, = struct.unpack('!H', await self.reader.readexactly(2))
+            elif length == 127:
+                length, = struct.unpack('!Q', await self.reader.readexactly(8))
+            payload = await self.reader.readexactly(length)  # فریم‌های سرور mask ندارند
+            if opcode == 0x8:
+                raise ConnectionError('websocket closed by server')
+            if opcode == 0x9:
+                await self.send_frame(0xA, payload)
+            elif opcode in (0x0, 0x1):
+                message += payload
+                if first & 0x80:
+                    return message.decode()
+
+    async def receive_json_from(self, timeout=1):
+        return json.loads(await asyncio.wait_for(self.receive_text(), timeout))
+
+    async def disconnect(self):
+        if self.writer is None:
+            return
+        try:
+            await self.send_frame(0x8, struct.pack('!H', 1000))
+        except ConnectionError:
+            pass
+        self.writer.close()
+
+
+class Bot:
+    def __init__(self, tester, username):
+        self.tester = tester
+        self.username = username
+        self.token = None
+        self.socket = None
+        self.inbox = asyncio.Queue()
+        self.reader = None
+
+    async def signup(self):
+        status, body = await self.tester.http('signup', 'POST', '/api/signup/', data={
+            'username': self.username, 'password': PASSWORD, 'confirm_password': PASSWORD,
+            'first_name': 'Load', 'last_name': 'Bot',
+        }, expected=201)
+        self.token = body['token']
+
+    async def connect(self, game_id):
+        path = f'/ws/game/{game_id}/?token={self.token}'
+        if self.tester.base_url:
+            self.socket = WebSocketClient(self.tester.ws_url + path)
+        else:
+            self.socket = WebsocketCommunicator(self.tester.application, path)
+        start = time.perf_counter()
+        connected, _ = await self.socket.connect(timeout=ACTION_TIMEOUT)
+        first = await self.socket.receive_json_from(timeout=ACTION_TIMEOUT) if connected else None
+        self.tester.recorder.add('ws_connect', (time.perf_counter() - start) * 1000, connected)
+        if not connected:
+            raise RuntimeError(f'{self.username} could not connect to {game_id}')
+        self.reader = asyncio.ensure_future(self.read())
+        return first
+
+    async def read(self):
+        while True:
+            await self.inbox.put(await self.socket.receive_json_from(timeout=3600))
+
+    async def act(self, name, message, after_seq):
+        # اکشن وقتی تمام شده حساب می‌شود که خود بازیکن broadcast بعدی گروه (یا خطا) را دریافت کند
+        start = time.perf_counter()
+        await self.socket.send_json_to(message)
+        deadline = start + ACTION_TIMEOUT
+        while True:
+            try:
+                reply = await asyncio.wait_for(self.inbox.get(), max(0.0, deadline - time.perf_counter()))
+            except asyncio.TimeoutError:
+                self.tester.recorder.add(name, (time.perf_counter() - start) * 1000, ok=False)
+                return None
+            if reply.get('type') == 'error':
+                self.tester.recorder.add(name, (time.perf_counter() - start) * 1000, ok=False)
+                return None
+            if 'state' in reply and reply.get('seq', 0) > after_seq:
+                self.tester.recorder.add(name, (time.perf_counter() - start) * 1000)
+                return reply
+
+    async def close(self):
+        if self.reader is not None:
+            self.reader.cancel()
+        if self.socket is not None:
+            await self.socket.disconnect()
+
+
+class Command(BaseCommand):
+    help = ('شبیه‌سازی بار: ثبت‌نام کاربران مصنوعی، جفت کردن آن‌ها و انجام کامل بازی‌ها از طریق GameConsumer '
+            'روی یک دیتابیس تست و لایه کانال درون حافظه؛ گزارش throughput و p50/p95/p99 هر اکشن. '
+            'با --url همین سناریو با HTTP و WebSocket واقعی روی یک سرور در حال اجرا اجرا می‌شود.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--games', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=50, help='حداکثر تعداد بازی‌های هم‌زمان')
+        parser.add_argument('--level', default='easy', choices=[choice[0] for choice in Game.LEVEL_CHOICES])
+        parser.add_argument('--pairing', choices=['rest', 'ws'], default='rest',
+                            help='بازیکن دوم با JoinGameView یا با اکشن join_game وب‌سوکت وارد بازی می‌شود')
+        parser.add_argument('--think-ms', type=float, default=50, help='میانگین مکث بین اکشن‌های هر بازیکن')
+        parser.add_argument('--accuracy', type=float, default=0.6, help='احتمال درست بودن هر حدس حرف')
+        parser.add_argument('--solve-at', type=int, default=1,
+                            help='وقتی این تعداد خانه یا کمتر مانده باشد کل کلمه حدس زده می‌شود')
+        parser.add_argument('--hint-rate', type=float, default=0.05,
+                            help='احتمال درخواست راهنمایی یا نمایش حرف به جای حدس')
+        parser.add_argument('--words', type=int, default=500, help='تعداد کلمات ساخته‌شده برای سطح')
+        parser.add_argument('--fast-passwords', action='store_true',
+                            help='استفاده از MD5 به جای هش پیش‌فرض تا ثبت‌نام بر نتیجه غالب نشود')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--output', help='ذخیره نتیجه به صورت JSON')
+        parser.add_argument('--url', help='آدرس سرور در حال اجرا (مثلاً http://127.0.0.1:8000). کاربران و بازی‌ها '
+                                          'روی همان سرور ساخته می‌شوند و باقی می‌مانند، کلمه‌ای ساخته نمی‌شود و '
+                                          'بازیکن‌ها کلمه مخفی را از DATABASES همین تنظیمات می‌خوانند، پس سرور باید '
+                                          'همین دیتابیس را داشته باشد.')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.random = random.Random(options['seed'])
+        self.base_url = (options['url'] or '').rstrip('/')
+        self.prefix = 'load'
+        if self.base_url:
+            self.run_remote()
+            return
+        overrides = {
+            'DEBUG': False,
+            'CHANNEL_LAYERS': {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+        }
+        if options['fast_passwords']:
+            overrides['PASSWORD_HASHERS'] = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+        # روی یک دیتابیس تست جداگانه اجرا می‌شود تا db.sqlite3 و snapshot رده‌بندی دست نخورند.
+        # Django هر درخواست ASGI را در thread جداگانه با اتصال خودش اجرا می‌کند، پس دیتابیس تست
+        # باید فایل باشد؛ SQLite درون حافظه اشتراکی به جای انتظار برای قفل فوراً خطا می‌دهد.
+        snapshot_dir = tempfile.TemporaryDirectory()
+        connection.settings_dict['TEST']['NAME'] = os.path.join(snapshot_dir.name, 'loadtest.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        old_snapshot_path = leaderboard.snapshot_path
+        leaderboard.snapshot_path = os.path.join(snapshot_dir.name, 'leaderboard.json')
+        leaderboard.invalidate()
+        try:
+            with override_settings(**overrides):
+                self.seed_words()
+                from GUESS.asgi import application
+                self.application = application
+                self.recorder = Recorder()
+                start = time.perf_counter()
+                outcomes = async_to_sync(self.run)()
+                wall = time.perf_counter() - start
+            self.print_report(outcomes, wall)
+        finally:
+            leaderboard.snapshot_path = old_snapshot_path
+            leaderboard.invalidate()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            snapshot_dir.cleanup()
+
+    def run_remote(self):
+        scheme = 'wss' if self.base_url.startswith('https:') else 'ws'
+        self.ws_url = scheme + self.base_url[self.base_url.index(':'):]
+        # نام کاربران هر اجرا پیشوند جدا دارد تا با اجراهای قبلی روی همان سرور تداخل نکند
+        self.prefix = f'load{os.urandom(3).hex()}'
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.options['concurrency'] * 2)
+        self.recorder = Recorder()
+        try:
+            start = time.perf_counter()
+            outcomes = async_to_sync(self.run)()
+            wall = time.perf_counter() - start
+        finally:
+            self.executor.shutdown(wait=False)
+        self.print_report(outcomes, wall)
+
+    def seed_words(self):
+        level = self.options['level']
+        length = WORD_LENGTHS[level]
+        Word.objects.bulk_create(
+            Word(text=''.join(self.random.choices(string.ascii_uppercase, k=length)), level=level,
+                 hint1='h1', hint2='h2', hint3='h3')
+            for _ in range(self.options['words'])
+        )
+        word_pool.bump_version()  # bulk_create سیگنال ندارد
+
+    async def http(self, name, method, path, token=None, data=None, expected=200):
+        body = json.dumps(data).encode() if data is not None else b''
+        headers = [(b'host', b'localhost'), (b'content-type', b'application/json'),
+                   (b'content-length', str(len(body)).encode())]
+        if token:
+            headers.append((b'authorization', f'Token {token}'.encode()))
+        start = time.perf_counter()
+        if self.base_url:
+            response = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.remote_request, method, path, body, headers)
+        else:
+            communicator = HttpCommunicator(self.application, method, path, body=body, headers=headers)
+            response = await communicator.get_response(timeout=ACTION_TIMEOUT)
+            await communicator.wait(timeout=ACTION_TIMEOUT)
+        ok = response['status'] == expected
+        self.recorder.add(name, (time.perf_counter() - start) * 1000, ok)
+        if not ok:
+            raise RuntimeError(f'{method} {path} -> {response["status"]}: {response["body"][:200]!r}')
+        return response['status'], json.loads(response['body'] or b'null')
+
+    def remote_request(self, method, path, body, headers):
+        # urllib همگام در thread pool اجرا می‌شود؛ خروجی همان شکل پاسخ HttpCommunicator است
+        headers = {name.decode(): value.decode() for name, value in headers if name != b'host'}
+        request = urllib.request.Request(self.base_url + path, data=body or None, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=ACTION_TIMEOUT) as response:
+                return {'status': response.status, 'body': response.read()}
+        except urllib.error.HTTPError as error:
+            return {'status': error.code, 'body': error.read()}
+
+    async def run(self):
+        semaphore = asyncio.Semaphore(self.options['concurrency'])
+
+        async def limited(index):
+            async with semaphore:
+                return await self.play_game(index)
+
+        outcomes = await asyncio.gather(*(limited(index) for index in range(self.options['games'])))
+        if not self.base_url:
+            await game_sessions.flush()
+        return Counter(outcomes)
+
+    async def think(self):
+        mean = self.options['think_ms'] / 1000
+        if mean > 0:
+            await asyncio.sleep(self.random.uniform(0.5, 1.5) * mean)
+
+    async def play_game(self, index):
+        first, second = Bot(self, f'{self.prefix}{index}a'), Bot(self, f'{self.prefix}{index}b')
+        try:
+            await first.signup()
+            await second.signup()
+            _, created = await self.http('new_game', 'POST', '/api/new-game/', first.token,
+                                         {'level': self.options['level']}, expected=201)
+            game_id = created['game_id']
+            if self.options['pairing'] == 'rest':
+                await self.http('join_game', 'POST', f'/api/join-game/{game_id}/', second.token)
+            await first.connect(game_id)
+            reply = await second.connect(game_id)
+            if self.options['pairing'] == 'ws':
+                reply = await second.act('join_game', {'action': 'join_game'}, reply.get('seq', 0))
+                if reply is None:
+                    return 'error'
+            word = await self.word_of(game_id)
+            return await self.play(first, second, word, reply)
+        except Exception as error:  # noqa: BLE001 - هر خطا در گزارش شمرده می‌شود و بقیه بازی‌ها ادامه می‌دهند
+            self.recorder.error('game')
+            self.stderr.write(f'game {index}: {type(error).__name__}: {error}')
+            return 'error'
+        finally:
+            await first.close()
+            await second.close()
+
+    @database_sync_to_async
+    def word_of(self, game_id):
+        # بازیکن مصنوعی کلمه را می‌داند و با احتمال --accuracy درست حدس می‌زند
+        return GameState.objects.filter(game__game_id=game_id).values_list('word__text', flat=True).get().upper()
+
+    async def play(self, first, second, word, reply):
+        bots = {first.username: first, second.username: second}
+        state, seq = reply['state'], reply.get('seq', 0)
+        while state.get('game_status') != 'finished':
+            bot = bots.get(state.get('current_player'))
+            if bot is None:
+                return 'error'
+            await self.think()
+            name, message = self.choose(word, state)
+            reply = await bot.act(name, message, seq)
+            if reply is None:
+                # بعد از خطا وضعیت تازه گرفته می‌شود تا بازی ادامه پیدا کند
+                reply = await bot.act('sync', {'action': 'sync'}, -1)
+                if reply is None:
+                    return 'error'
+            state, seq = reply['state'], max(seq, reply.get('seq', 0))
+        return 'finished'
+
+    def choose(self, word, state):
+        unsolved = [index for index, char in enumerate(state['word'].split(' ')) if char == GameState.MASK_CHAR]
+        if len(unsolved) <= self.options['solve_at']:
+            guess = word if self.random.random() < self.options['accuracy'] else word[::-1] + 'X'
+            return 'guess_word', {'action': 'guess_word', 'word': guess}
+        if self.random.random() < self.options['hint_rate']:
+            action = self.random.choice(['request_hint', 'reveal_letter'])
+            return action, {'action': action}
+        position = self.random.choice(unsolved)
+        letter = word[position]
+        if self.random.random() >= self.options['accuracy']:
+            letter = self.random.choice([char for char in string.ascii_uppercase if char != letter])
+        return 'guess_letter', {'action': 'guess_letter', 'letter': letter, 'position': position}
+
+    def print_report(self, outcomes, wall):
+        rows = self.recorder.report(wall)
+        actions = sum(row['count'] for row in rows)
+        header = (f"{'action':<14} | {'count':>7} | {'errors':>6} | {'err %':>6} | {'ops/s':>8} | "
+                  f"{'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8}")
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+
+        def ms(value):
+            return f'{value:>8.2f}' if value is not None else f"{'-':>8}"
+        for row in rows:
+            self.stdout.write(
+                f"{row['action']:<14} | {row['count']:>7} | {row['errors']:>6} | {row['error_rate'] * 100:>5.1f}% | "
+                f"{row['throughput']:>8.1f} | {ms(row['p50_ms'])} | {ms(row['p95_ms'])} | {ms(row['p99_ms'])}"
+            )
+        self.stdout.write(
+            f"\n{outcomes['finished']} games finished, {outcomes['error']} failed in {wall:.1f}s "
+            f"({outcomes['finished'] / wall:.1f} games/s, {actions / wall:.1f} requests/s)"
+        )
+        if self.options['output']:
+            result = {
+                'options': {key: self.options[key] for key in (
+                    'games', 'concurrency', 'level', 'pairing', 'think_ms', 'accuracy', 'solve_at', 'hint_rate',
+                    'fast_passwords', 'seed', 'url')},
+                'wall_seconds': round(wall, 3),
+                'games_finished': outcomes['finished'],
+                'games_failed': outcomes['error'],
+                'actions': rows,
+            }
+            with open(self.options['output'], 'w') as output:
+                json.dump(result, output, indent=2)
+            self.stdout.write(f"results written to {self.options['output']}")
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from game.leaderboard import GLOBAL, leaderboard
+
+
+class Command(BaseCommand):
+    help = ('ساختن دوباره جدول رده‌بندی از دیتابیس با یک پیمایش و نوشتن snapshot آن. این دستور تنها نویسنده '
+            'snapshot است؛ با --interval به صورت یک پروسس جدا هر چند ثانیه یک بار اجرا می‌شود.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', help='مسیر فایل snapshot (پیش‌فرض LEADERBOARD_SNAPSHOT_PATH)')
+        parser.add_argument('--interval', type=float, default=0,
+                            help='تکرار هر چند ثانیه یک بار؛ بدون آن فقط یک بار اجرا می‌شود')
+
+    def handle(self, *args, **options):
+        if options['path']:
+            leaderboard.snapshot_path = options['path']
+        while True:
+            self.rebuild()
+            if options['interval'] <= 0:
+                return
+            time.sleep(options['interval'])
+
+    def rebuild(self):
+        start = time.perf_counter()
+        taken_at = leaderboard.rebuild()
+        leaderboard.write_snapshot(taken_at)
+        # پروسس‌های در حال اجرا با دیدن نسخه جدید snapshot را دوباره می‌خوانند
+        leaderboard.bump_version()
+        elapsed = time.perf_counter() - start
+        players = len(leaderboard.snapshot()['boards'][GLOBAL])
+        self.stdout.write(f'{players} players written to {leaderboard.snapshot_path} in {elapsed:.2f}s')
@@ -0,0 +1,185 @@
+import asyncio
+import contextvars
+import itertools
+import random
+import time
+from bisect import bisect_left, insort
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Game, GameState
+from .log import get_logger
+from .word_pool import word_pool
+from .writer import run_write
+
+log = get_logger(__name__)
+
+
+class Ticket:
+    def __init__(self, channel_name, user, level, seq):
+        self.channel_name = channel_name
+        self.user_id = user.id
+        self.username = user.username
+        self.xp = user.xp
+        self.level = level
+        self.key = (user.xp, seq, channel_name)  # کلید مرتب‌سازی در صف
+        self.enqueued_at = time.monotonic()
+
+
+def create_matched_game(level, player1_id, player2_id):
+    # بازی و وضعیتش در یک تراکنش ساخته می‌شوند و بازی مستقیم فعال است؛ اگر کلمه‌ای نباشد None برمی‌گردد
+    picked = word_pool.random_word(level)
+    if not picked:
+        return None
+    word_id, word_text = picked
+    players = [str(player1_id), str(player2_id)]
+    time_limit = Game.TIME_LIMITS[level]
+    now = timezone.now()
+    with transaction.atomic():
+        game = Game.objects.create(player1_id=player1_id, player2_id=player2_id, level=level, status='active')
+        GameState.objects.create(
+            game=game,
+            word_id=word_id,
+            current_player_id=random.choice([player1_id, player2_id]),
+            player1_time=time_limit,
+            player2_time=time_limit,
+            revealed_letters={player_id: [] for player_id in players},
+            hints_used={player_id: [] for player_id in players},
+            masked_word=GameState.MASK_CHAR * len(word_text),
+            last_turn_time=now,
+            clock_started_at=now,
+        )
+    return game
+
+
+async def start_match(first, second, channel_layer=None):
+    channel_layer = channel_layer or get_channel_layer()
+    game = await run_write(create_matched_game, first.level, first.user_id, second.user_id)
+    for ticket, opponent in ((first, second), (second, first)):
+        if game is None:
+            message = {'type': 'match_failed', 'message': f'کلمه‌ای برای سطح "{first.level}" یافت نشد.'}
+        else:
+            message = {'type': 'match_found', 'game_id': str(game.game_id), 'level': game.level,
+                       'opponent': opponent.username}
+        await channel_layer.send(ticket.channel_name, message)
+
+
+# صف بازیکنان منتظر برای هر سطح بازی که بر اساس XP مرتب است.
+# پیدا کردن نزدیک‌ترین حریف با جستجوی دودویی انجام می‌شود و پنجره قابل قبول XP
+# هر بازیکن با طولانی‌تر شدن انتظارش بزرگ‌تر می‌شود. این پیاده‌سازی درون یک پروسس است.
+class LocalMatchmaker:
+    def __init__(self, xp_window=None, widen_per_second=None, max_xp_window=None, interval=None):
+        if xp_window is None:
+            xp_window = getattr(settings, 'MATCHMAKING_XP_WINDOW', 100)
+        if widen_per_second is None:
+            widen_per_second = getattr(settings, 'MATCHMAKING_WIDEN_PER_SECOND', 50)
+        if max_xp_window is None:
+            max_xp_window = getattr(settings, 'MATCHMAKING_MAX_XP_WINDOW', 2500)
+        if interval is None:
+            interval = getattr(settings, 'MATCHMAKING_INTERVAL', 1.0)
+        self.xp_window = xp_window
+        self.widen_per_second = widen_per_second
+        self.max_xp_window = max_xp_window
+        self.interval = interval
+        self._queues = {}  # level -> لیست مرتب کلیدها
+        self._tickets = {}  # channel_name -> Ticket به ترتیب ورود به صف
+        self._seq = itertools.count()
+        self._task = None
+
+    def __len__(self):
+        return len(self._tickets)
+
+    def window(self, ticket, now=None):
+        waited = (now or time.monotonic()) - ticket.enqueued_at
+        return min(self.max_xp_window, self.xp_window + self.widen_per_second * waited)
+
+    def add(self, channel_name, user, level):
+        self.remove(channel_name)
+        ticket = Ticket(channel_name, user, level, next(self._seq))
+        insort(self._queues.setdefault(level, []), ticket.key)
+        self._tickets[channel_name] = ticket
+        return ticket
+
+    def remove(self, channel_name):
+        ticket = self._tickets.pop(channel_name, None)
+        if ticket is None:
+            return None
+        queue = self._queues[ticket.level]
+        del queue[bisect_left(queue, ticket.key)]
+        return ticket
+
+    def find_opponent(self, ticket, now=None):
+        # نزدیک‌ترین بازیکن از هر طرف که اختلاف XP در پنجره هر دو نفر باشد
+        now = now or time.monotonic()
+        queue = self._queues[ticket.level]
+        window = self.window(ticket, now)
+        index = bisect_left(queue, ticket.key)
+        best = None
+        for step in (-1, 1):
+            i = index + step
+            while 0 <= i < len(queue):
+                xp, _, channel_name = queue[i]
+                diff = abs(xp - ticket.xp)
+                if diff > window:
+                    break
+                other = self._tickets[channel_name]
+                if other.user_id != ticket.user_id and diff <= self.window(other, now):
+                    if best is None or diff < best[0]:
+                        best = (diff, other)
+                    break
+                i += step
+        return best[1] if best else None
+
+    def match(self, ticket, now=None):
+        other = self.find_opponent(ticket, now)
+        if other is None:
+            return None
+        self.remove(ticket.channel_name)
+        self.remove(other.channel_name)
+        # کسی که زودتر وارد صف شده بازیکن اول بازی است
+        return (other, ticket) if other.enqueued_at <= ticket.enqueued_at else (ticket, other)
+
+    def match_waiting(self, now=None):
+        # بازیکنان به ترتیب زمان انتظار دوباره بررسی می‌شوند چون پنجره‌شان بزرگ‌تر شده
+        now = now or time.monotonic()
+        pairs = []
+        for ticket in list(self._tickets.values()):
+            if ticket.channel_name in self._tickets:
+                pair = self.match(ticket, now)
+                if pair:
+                    pairs.append(pair)
+        return pairs
+
+    async def enqueue(self, channel_name, user, level, channel_layer=None):
+        ticket = self.add(channel_name, user, level)
+        pair = self.match(ticket)
+        if pair:
+            await start_match(*pair, channel_layer=channel_layer)
+        self._ensure_running()
+
+    def dequeue(self, channel_name):
+        return self.remove(channel_name) is not None
+
+    def _ensure_running(self):
+        if not self._tickets:
+            return
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            # context خالی تا لاگ‌های صف فیلدهای اتصالی را که آن را راه انداخته نگیرند
+            self._task = loop.create_task(self._run(), context=contextvars.Context())
+
+    async def _run(self):
+        # تا وقتی کسی در صف است هر interval ثانیه یک بار صف‌ها دوباره بررسی می‌شوند
+        while self._tickets:
+            await asyncio.sleep(self.interval)
+            for pair in self.match_waiting():
+                try:
+                    await start_match(*pair)
+                except Exception:
+                    log.exception('matchmaking.start_failed')
+
+
+matchmaker = LocalMatchmaker()
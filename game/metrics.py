@@ -0,0 +1,309 @@
+import bisect
+import contextvars
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+# هر thread در shard خودش می‌نویسد، پس ثبت یک مقدار قفل و I/O ندارد؛ shardها فقط هنگام خواندن
+# /metrics با هم جمع می‌شوند. Django هر درخواست ASGI را در thread تازه‌ای اجرا می‌کند، پس shard
+# threadهای تمام‌شده در یک shard ثابت ادغام می‌شوند تا حافظه رشد نکند.
+MAX_LIVE_SHARDS = 256
+
+
+class Registry:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.metrics = []
+        self.callbacks = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []  # (thread، dict)
+        self._retired = {}
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._add(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._add(Gauge(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(self, name, documentation, labelnames, buckets))
+
+    def gauge_callback(self, name, documentation, function):
+        # مقدار هنگام خواندن /metrics محاسبه می‌شود، مثل تعداد بازی‌های فعال در حافظه
+        self.callbacks.append((name, documentation, function))
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def shard(self):
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), values))
+                if len(self._shards) > MAX_LIVE_SHARDS:
+                    self._retire_dead()
+            return values
+
+    def _retire_dead(self):
+        live = []
+        for thread, values in self._shards:
+            if thread.is_alive():
+                live.append((thread, values))
+            else:
+                merge(self._retired, values)
+        self._shards = live
+
+    def snapshot(self):
+        with self._lock:
+            self._retire_dead()
+            shards = [values for _, values in self._shards]
+            totals = {}
+            merge(totals, self._retired)
+        for values in shards:
+            # کپی dict در برابر نوشتن هم‌زمان thread دیگر امن است (GIL)؛ خطای اندازه‌گیری حداکثر یک نمونه است
+            merge(totals, dict(values))
+        return totals
+
+    def clear(self):
+        with self._lock:
+            for _, values in self._shards:
+                values.clear()
+            self._retired.clear()
+
+    def render(self):
+        totals = self.snapshot()
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render(totals))
+        for name, documentation, function in self.callbacks:
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {format_value(function())}')
+        return '\n'.join(lines) + '\n'
+
+
+def merge(target, source):
+    for key, value in source.items():
+        if isinstance(value, list):
+            current = target.get(key)
+            if current is None:
+                target[key] = list(value)
+            else:
+                for index, item in enumerate(value):
+                    current[index] += item
+        else:
+            target[key] = target.get(key, 0) + value
+
+
+def format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def label_text(names, values, extra=None):
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, registry, name, documentation, labelnames):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+    def series(self, totals):
+        return sorted((key[1], value) for key, value in totals.items() if key[0] == self.name)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        if not self.registry.enabled:
+            return
+        values = self.registry.shard()
+        key = (self.name, labels)
+        values[key] = values.get(key, 0) + amount
+
+    def render(self, totals):
+        lines = self.header()
+        for labels, value in self.series(totals):
+            lines.append(f'{self.name}{label_text(self.labelnames, labels)} {format_value(value)}')
+        return lines
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames, buckets):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        if not self.registry.enabled:
+            return
+        values = self.registry.shard()
+        key = (self.name, labels)
+        counts = values.get(key)
+        if counts is None:
+            # شمارش هر bucket به صورت جدا، سپس جمع و تعداد؛ تجمعی کردن فقط هنگام خروجی انجام می‌شود
+            counts = values[key] = [0] * (len(self.buckets) + 3)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+    def render(self, totals):
+        lines = self.header()
+        for labels, counts in self.series(totals):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == '+Inf' else f'le="{bound}"'
+                lines.append(f'{self.name}_bucket{label_text(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{label_text(self.labelnames, labels)} {format_value(float(counts[-2]))}')
+            lines.append(f'{self.name}_count{label_text(self.labelnames, labels)} {counts[-1]}')
+        return lines
+
+
+registry = Registry(enabled=getattr(settings, 'METRICS_ENABLED', True))
+
+http_requests = registry.counter('guess_http_requests_total', 'API requests by view, method and status.',
+                                 ('view', 'method', 'status'))
+http_latency = registry.histogram('guess_http_request_duration_seconds', 'API request latency by view.', ('view',))
+ws_messages = registry.counter('guess_ws_messages_total', 'GameConsumer messages by action and outcome.',
+                               ('action', 'outcome'))
+ws_latency = registry.histogram('guess_ws_action_duration_seconds', 'GameConsumer action latency.', ('action',))
+db_queries = registry.histogram('guess_db_queries', 'DB queries per request or consumer message.',
+                                ('source', 'name'), buckets=QUERY_COUNT_BUCKETS)
+db_time = registry.histogram('guess_db_query_duration_seconds', 'Total DB time per request or consumer message.',
+                             ('source', 'name'))
+group_send_latency = registry.histogram('guess_group_send_duration_seconds', 'channel_layer.group_send latency.')
+ws_connections = registry.gauge('guess_ws_connections', 'Open WebSocket connections in this worker.',
+                                ('consumer',))
+
+
+# شمارش کوئری‌ها: هر اتصال دیتابیس یک execute_wrapper دائمی دارد که فقط وقتی درخواست یا پیامی
+# در حال اندازه‌گیری است (contextvar تنظیم شده) چیزی ثبت می‌کند. sync_to_async همین context را
+# به thread دیتابیس می‌برد، پس کوئری‌های consumer هم به پیام خودشان نسبت داده می‌شوند.
+class QueryScope:
+    __slots__ = ('queries', 'db_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+
+current_scope = contextvars.ContextVar('metrics_query_scope', default=None)
+
+
+def observe_query(execute, sql, params, many, context):
+    scope = current_scope.get()
+    if scope is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        scope.queries += 1
+        scope.db_time += time.perf_counter() - start
+
+
+def install_query_observer(sender, connection, **kwargs):
+    # در ابتدای لیست قرار می‌گیرد تا pop() در connection.execute_wrapper() آن را برندارد
+    if observe_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, observe_query)
+
+
+if registry.enabled:
+    connection_created.connect(install_query_observer, dispatch_uid='game.metrics.install_query_observer')
+
+
+def record_queries(source, name, scope):
+    db_queries.observe(scope.queries, source, name)
+    db_time.observe(scope.db_time, source, name)
+
+
+class track_action:
+    # زمان، نتیجه و کوئری‌های یک پیام GameConsumer؛ برای خطاهایی که گرفته می‌شوند outcome دستی 'error' می‌شود
+    __slots__ = ('action', 'outcome', 'scope', 'token', 'start')
+
+    def __init__(self, action):
+        self.action = action
+        self.outcome = 'ok'
+
+    def __enter__(self):
+        self.scope = QueryScope()
+        self.token = current_scope.set(self.scope)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        elapsed = time.perf_counter() - self.start
+        current_scope.reset(self.token)
+        if exc_type is not None:
+            self.outcome = 'error'
+        ws_latency.observe(elapsed, self.action)
+        ws_messages.inc(self.action, self.outcome)
+        record_queries('ws', self.action, self.scope)
+        return False
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        if not registry.enabled:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        scope = QueryScope()
+        token = current_scope.set(scope)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_scope.reset(token)
+        elapsed = time.perf_counter() - start
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        http_requests.inc(view, request.method, str(response.status_code))
+        http_latency.observe(elapsed, view)
+        record_queries('http', view, scope)
+        return response
+
+
+def metrics_view(request):
+    if not registry.enabled:
+        return HttpResponse(status=404)
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,53 @@
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.exceptions import AuthenticationFailed
+
+from .authentication import authenticate_token, token_cache
+
+# کلاینت مرورگر نمی‌تواند هدر Authorization بفرستد، پس توکن با ?token=<key>
+# یا به صورت subprotocol یعنی new WebSocket(url, ['token', key]) فرستاده می‌شود
+TOKEN_SUBPROTOCOL = 'token'
+
+
+def token_from_scope(scope):
+    # خروجی (توکن، subprotocol که consumer باید هنگام accept برگرداند)
+    subprotocols = scope.get('subprotocols') or []
+    if TOKEN_SUBPROTOCOL in subprotocols:
+        index = subprotocols.index(TOKEN_SUBPROTOCOL)
+        if index + 1 < len(subprotocols):
+            return subprotocols[index + 1], TOKEN_SUBPROTOCOL
+    query = parse_qs(scope.get('query_string', b'').decode())
+    token = query.get('token', [None])[0]
+    return token, None
+
+
+def _load_user(key):
+    try:
+        user, _ = authenticate_token(key)
+        return user
+    except AuthenticationFailed:
+        return AnonymousUser()
+
+
+async def get_user(key):
+    # توکن‌های موجود در کش بدون رفتن به thread دیتابیس روی همین event loop حل می‌شوند؛ در غیر این صورت (یا
+    # وقتی نوبت خواندن نسخه کش رسیده) یک کوئری Token+User زده و نتیجه در کش مشترک با REST ذخیره می‌شود
+    if not key:
+        return AnonymousUser()
+    if not token_cache.version_due():
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached[0]
+    return await database_sync_to_async(_load_user)(key)
+
+
+class TokenAuthMiddleware(BaseMiddleware):
+    async def __call__(self, scope, receive, send):
+        key, subprotocol = token_from_scope(scope)
+        scope = dict(scope)
+        scope['user'] = await get_user(key)
+        scope['auth_subprotocol'] = subprotocol
+        return await super().__call__(scope, receive, send)
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:36
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='game',
+            name='game_id',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='gamehistory',
+            name='result',
+            field=models.CharField(choices=[('won', 'Won'), ('lose', 'Lost'), ('draw', 'Draw')], default='draw', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='gamestate',
+            name='guessed_letters',
+            field=models.JSONField(default=list),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:36
+
+from django.db import migrations, models
+
+
+def backfill_masked_word(apps, schema_editor):
+    GameState = apps.get_model('game', 'GameState')
+    states = GameState.objects.select_related('word').only('id', 'guessed_letters', 'word__text').iterator(chunk_size=500)
+    batch = []
+    for state in states:
+        word_text = state.word.text.upper()
+        masked = ['_'] * len(word_text)
+        for guess in state.guessed_letters if isinstance(state.guessed_letters, list) else []:
+            if isinstance(guess, dict) and guess.get('correct') and 'position' in guess and 'letter' in guess:
+                try:
+                    position = int(guess['position'])
+                except (ValueError, TypeError):
+                    continue
+                if 0 <= position < len(masked):
+                    masked[position] = str(guess['letter']).upper()
+        state.masked_word = ''.join(masked)
+        state.solved_count = len(masked) - masked.count('_')
+        batch.append(state)
+        if len(batch) >= 500:
+            GameState.objects.bulk_update(batch, ['masked_word', 'solved_count'])
+            batch = []
+    if batch:
+        GameState.objects.bulk_update(batch, ['masked_word', 'solved_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0002_alter_game_game_id_alter_gamehistory_result_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamestate',
+            name='masked_word',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='gamestate',
+            name='solved_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_masked_word, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copy_guessed_letters_to_events(apps, schema_editor):
+    GameState = apps.get_model('game', 'GameState')
+    GameEvent = apps.get_model('game', 'GameEvent')
+    events = []
+    for state in GameState.objects.only('id', 'game_id', 'guessed_letters').iterator(chunk_size=500):
+        guesses = state.guessed_letters if isinstance(state.guessed_letters, list) else []
+        seq = 0
+        for guess in guesses:
+            if not isinstance(guess, dict):
+                continue
+            try:
+                position = int(guess.get('position'))
+            except (ValueError, TypeError):
+                position = None
+            seq += 1
+            events.append(GameEvent(
+                game_id=state.game_id, seq=seq, player_id=guess.get('player_id'), kind='guess',
+                position=position, letter=str(guess.get('letter', ''))[:1].upper() or None,
+                correct=bool(guess.get('correct')),
+            ))
+        if seq:
+            GameState.objects.filter(pk=state.pk).update(event_seq=seq)
+        if len(events) >= 1000:
+            GameEvent.objects.bulk_create(events)
+            events = []
+    if events:
+        GameEvent.objects.bulk_create(events)
+
+
+def copy_events_to_guessed_letters(apps, schema_editor):
+    # برگشت: لیست حدس‌های هر وضعیت دوباره از رویدادهای guess به ترتیب seq ساخته می‌شود
+    GameState = apps.get_model('game', 'GameState')
+    GameEvent = apps.get_model('game', 'GameEvent')
+    state_ids = dict(GameState.objects.values_list('game_id', 'id'))
+    guesses = {}
+    events = GameEvent.objects.filter(kind='guess').order_by('game_id', 'seq').values_list(
+        'game_id', 'letter', 'position', 'correct', 'player_id')
+    for game_id, letter, position, correct, player_id in events.iterator(chunk_size=1000):
+        guesses.setdefault(game_id, []).append(
+            {'letter': letter, 'position': position, 'correct': correct, 'player_id': player_id})
+    for game_id, rows in guesses.items():
+        if game_id in state_ids:
+            GameState.objects.filter(pk=state_ids[game_id]).update(guessed_letters=rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0003_gamestate_masked_word'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamestate',
+            name='event_seq',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='GameEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.PositiveIntegerField()),
+                ('kind', models.CharField(choices=[('guess', 'Guess'), ('hint', 'Hint'), ('reveal', 'Reveal')], max_length=10)),
+                ('position', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('letter', models.CharField(blank=True, max_length=1, null=True)),
+                ('correct', models.BooleanField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='game.game')),
+                ('player', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='game_events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('game', 'seq'), name='game_event_game_seq_uniq')],
+            },
+        ),
+        migrations.RunPython(copy_guessed_letters_to_events, copy_events_to_guessed_letters),
+        migrations.RemoveField(
+            model_name='gamestate',
+            name='guessed_letters',
+        ),
+    ]
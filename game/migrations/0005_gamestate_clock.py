@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:40
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def start_running_clocks(apps, schema_editor):
+    # ساعت بازی‌های در جریان از آخرین تغییر نوبت شروع می‌شود
+    GameState = apps.get_model('game', 'GameState')
+    GameState.objects.filter(game__status='active').update(clock_started_at=F('last_turn_time'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0004_gameevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamestate',
+            name='clock_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='gamestate',
+            name='player1_time',
+            field=models.FloatField(),
+        ),
+        migrations.AlterField(
+            model_name='gamestate',
+            name='player2_time',
+            field=models.FloatField(),
+        ),
+        migrations.RunPython(start_running_clocks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0005_gamestate_clock'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['status', 'created_at', 'id'], name='game_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gamehistory',
+            index=models.Index(fields=['player', 'date', 'id'], name='history_player_date_idx'),
+        ),
+    ]
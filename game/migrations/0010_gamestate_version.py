@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0009_ledgerentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamestate',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -2,13 +2,17 @@ import uuid
 from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Coalesce, Greatest
 from django.contrib.auth.models import Group, Permission
 
+from . import engine
+
 class User(AbstractUser):
     username = models.CharField(max_length=30, unique=True)
     first_name = models.CharField(max_length=30)
     last_name = models.CharField(max_length=30)
-    xp = models.PositiveIntegerField(default=0)
+    xp = models.PositiveIntegerField(default=0, db_index=True)
     coins = models.PositiveIntegerField(default=0)
 
     # بازنویسی فیلد groups
@@ -31,13 +35,17 @@ class User(AbstractUser):
 
     @property
     def level(self):
-        if self.xp < 400:
+        return self.level_for_xp(self.xp)
+
+    @staticmethod
+    def level_for_xp(xp):
+        if xp < 400:
             return 1
-        elif self.xp < 800:
+        elif xp < 800:
             return 2
-        elif self.xp < 1500:
+        elif xp < 1500:
             return 3
-        elif self.xp < 2500:
+        elif xp < 2500:
             return 4
         else:
             return 5
@@ -75,6 +83,8 @@ class Game(models.Model):
         ('medium', 'Medium'),
         ('hard', 'Hard'),
     )
+    # زمان کل هر بازیکن (ثانیه) در هر سطح
+    TIME_LIMITS = {'easy': 300, 'medium': 240, 'hard': 180}
     player1 = models.ForeignKey(User, on_delete=models.CASCADE, related_name='game_player1')
     player2 = models.ForeignKey(User, on_delete=models.CASCADE, related_name='game_player2', null=True, blank=True)
     game_id = models.UUIDField(default=uuid.uuid4,unique=True, editable=False)
@@ -86,6 +96,17 @@ class Game(models.Model):
     def __str__(self):
         return f"Game {self.game_id} ({self.level})"
 
+    def player(self, user_id):
+        # شیء بازیکن برای idی که از GameEngine برمی‌گردد؛ None برای تساوی
+        if user_id is None:
+            return None
+        return self.player1 if user_id == self.player1_id else self.player2
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at', 'id'], name='game_status_created_idx'),
+        ]
+
 
 class GameHistory(models.Model):
     RESULT_GAME = (
@@ -103,26 +124,293 @@ class GameHistory(models.Model):
     def __str__(self):
         return f"{self.player.username} vs {self.opponent.username} ({self.result})"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['player', 'date', 'id'], name='history_player_date_idx'),
+        ]
+
+
+# آمار تجمیعی هر بازیکن در هر سطح بازی که همراه با ثبت GameHistory با افزایش‌های اتمیک به‌روز می‌شود
+class PlayerStats(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stats')
+    level = models.CharField(max_length=10, choices=Game.LEVEL_CHOICES)
+    wins = models.PositiveIntegerField(default=0)
+    losses = models.PositiveIntegerField(default=0)
+    draws = models.PositiveIntegerField(default=0)
+    total_score = models.IntegerField(default=0)
+    best_score = models.IntegerField(null=True, blank=True)
+    current_streak = models.PositiveIntegerField(default=0)  # بردهای پشت سر هم تا الان
+    best_streak = models.PositiveIntegerField(default=0)
+
+    RESULT_COUNTERS = {'won': 'wins', 'lost': 'losses', 'lose': 'losses', 'draw': 'draws'}
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'level'], name='player_stats_user_level_uniq'),
+        ]
+
+    @classmethod
+    def record_results(cls, results):
+        # results: دیکشنری‌هایی با player_id، level، result و score؛ باید داخل تراکنش ثبت GameHistory صدا زده شود
+        results = list(results)
+        if not results:
+            return
+        cls.objects.bulk_create([cls(user_id=r['player_id'], level=r['level']) for r in results],
+                                ignore_conflicts=True)
+        for r in results:
+            score = r['score']
+            changes = {
+                cls.RESULT_COUNTERS[r['result']]: F(cls.RESULT_COUNTERS[r['result']]) + 1,
+                'total_score': F('total_score') + score,
+                'best_score': Greatest(Coalesce(F('best_score'), score), score),
+            }
+            if r['result'] == 'won':
+                changes['current_streak'] = F('current_streak') + 1
+                changes['best_streak'] = Greatest(F('best_streak'), F('current_streak') + 1)
+            else:
+                changes['current_streak'] = 0
+            cls.objects.filter(user_id=r['player_id'], level=r['level']).update(**changes)
+
+    def __str__(self):
+        return f"{self.user_id} ({self.level}): {self.wins}/{self.losses}/{self.draws}"
+
+
+class StaleGameState(Exception):
+    # GameState از زمان خوانده شدن توسط درخواست یا پیام دیگری تغییر کرده است
+    def __init__(self, pk, version):
+        super().__init__(f'GameState {pk} is no longer at version {version}')
+        self.pk = pk
+        self.version = version
+
 
 class GameState(models.Model):
     game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='game_state')
     current_player = models.ForeignKey(User, on_delete=models.CASCADE, related_name='current_player', null=True,
                                        blank=True)
     word = models.ForeignKey(Word, on_delete=models.CASCADE, related_name='game_word')
-    guessed_letters = models.JSONField(default=list)
+    # شماره آخرین رویداد ثبت‌شده در GameEvent برای این بازی؛ حدس‌ها دیگر در این جدول نگه داشته نمی‌شوند
+    event_seq = models.PositiveIntegerField(default=0)
     player1_score = models.IntegerField(default=0)
     player2_score = models.IntegerField(default=0)
-    player1_time = models.IntegerField()
-    player2_time = models.IntegerField()
+    # زمان باقیمانده (ثانیه) هر بازیکن تا آخرین تسویه؛ زمان جاری از clock_started_at هنگام خواندن کم می‌شود
+    player1_time = models.FloatField()
+    player2_time = models.FloatField()
+    clock_started_at = models.DateTimeField(null=True, blank=True)
     revealed_letters = models.JSONField(default=dict)
     hints_used = models.JSONField(default=dict)
     last_turn_time = models.DateTimeField(null=True, blank=True)
     paused_at = models.DateTimeField(null=True, blank=True)
+    # کلمه با خانه‌های حل‌شده (مثلاً 'A__E') و تعداد خانه‌های حل‌شده؛ با هر حدس درست در O(1) به‌روز می‌شوند
+    masked_word = models.CharField(max_length=100, default='', blank=True)
+    solved_count = models.PositiveSmallIntegerField(default=0)
+    # شماره نسخه برای کنترل هم‌زمانی خوش‌بینانه؛ هر نوشتن روی ردیف آن را یکی زیاد می‌کند
+    version = models.PositiveIntegerField(default=0)
+
+    MASK_CHAR = engine.MASK_CHAR
 
     def __str__(self):
         return f"State for Game {self.game.game_id}"
 
+    def save(self, *args, **kwargs):
+        if not self.masked_word and self.word_id:
+            self.init_mask(self.word.text)
+        if self._state.adding:
+            super().save(*args, **kwargs)
+            return
+        # به‌روزرسانی فقط وقتی انجام می‌شود که ردیف هنوز همان نسخه‌ای باشد که خوانده شده:
+        # UPDATE ... SET ..., version = n + 1 WHERE id = ? AND version = n. در غیر این صورت
+        # StaleGameState بالا می‌رود و تراکنش فراخواننده برمی‌گردد؛ هیچ نوشتنی دیگری را پاک نمی‌کند.
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        self._expected_version = self.version
+        self.version += 1
+        try:
+            super().save(*args, **kwargs)
+        except BaseException:
+            self.version = self._expected_version
+            raise
+        finally:
+            del self._expected_version
 
-from django.db import models
+    def _do_update(self, base_qs, *args, **kwargs):
+        expected = getattr(self, '_expected_version', None)
+        if expected is None:
+            return super()._do_update(base_qs, *args, **kwargs)
+        if not super()._do_update(base_qs.filter(version=expected), *args, **kwargs):
+            raise StaleGameState(self.pk, expected)
+        return True
+
+    @classmethod
+    def compare_and_swap(cls, pk, version, values):
+        # همان شرط نسخه برای مسیرهایی که با update() می‌نویسند (flush جلسه‌های WebSocket)
+        return cls.objects.filter(pk=pk, version=version).update(**values, version=version + 1) == 1
+
+    def guesses(self):
+        # لیست حدس‌ها به همان شکل قبلی guessed_letters؛ یک بار از GameEvent خوانده و بعد در حافظه نگه داشته می‌شود
+        cached = self.__dict__.get('_guesses')
+        if cached is None:
+            events = self.game.events.filter(kind=GameEvent.KIND_GUESS).order_by('seq')
+            cached = self.__dict__['_guesses'] = [event.as_guess() for event in events]
+        return cached
+
+    def add_event(self, kind, player, position=None, letter=None, correct=None):
+        # رویداد ذخیره نمی‌شود؛ ذخیره (یا bulk_create) با فراخواننده است
+        self.event_seq += 1
+        event = GameEvent(game_id=self.game_id, seq=self.event_seq, player=player, kind=kind,
+                          position=position, letter=letter, correct=correct)
+        if kind == GameEvent.KIND_GUESS and '_guesses' in self.__dict__:
+            self.__dict__['_guesses'].append(event.as_guess())
+        return event
+
+    def time_field(self, game, player):
+        player_id = getattr(player, 'id', player)
+        return 'player1_time' if player_id == game.player1_id else 'player2_time'
+
+    def remaining_time(self, game, player, now=None):
+        # ساعت فقط برای بازیکنی که نوبتش است جاری است؛ بدون هیچ نوشتنی در دیتابیس محاسبه می‌شود
+        field = self.time_field(game, player)
+        remaining = getattr(self, field)
+        if self.clock_started_at and self.current_player_id and field == self.time_field(game, self.current_player_id):
+            remaining -= ((now or timezone.now()) - self.clock_started_at).total_seconds()
+        return remaining
+
+    def time_up_player(self, game, now=None):
+        # بازیکنی که کل زمانش تمام شده؛ فقط ساعت بازیکن فعلی جاری است پس یک بازیکن کافی است
+        if game.status != 'active' or not game.player2_id:
+            return None
+        for player in (game.player1, game.player2):
+            if self.remaining_time(game, player, now) <= 0:
+                return player
+        return None
+
+    def settle_clock(self, game, now=None, running=True):
+        # زمان مصرف‌شده بازیکن فعلی از سهمش کم می‌شود؛ فقط در تغییر نوبت، توقف و پایان بازی صدا زده می‌شود
+        now = now or timezone.now()
+        if self.clock_started_at and self.current_player_id:
+            field = self.time_field(game, self.current_player_id)
+            setattr(self, field, getattr(self, field) - (now - self.clock_started_at).total_seconds())
+        self.clock_started_at = now if running else None
+        return ['player1_time', 'player2_time', 'clock_started_at']
+
+    def init_mask(self, word_text):
+        self.masked_word = self.MASK_CHAR * len(word_text)
+        self.solved_count = 0
+
+    def mark_solved(self, position, letter):
+        if self.masked_word[position] != self.MASK_CHAR:
+            return False
+        self.masked_word = f'{self.masked_word[:position]}{letter}{self.masked_word[position + 1:]}'
+        self.solved_count += 1
+        return True
 
-# Create your models here.
+    @property
+    def is_solved(self):
+        return bool(self.masked_word) and self.solved_count >= len(self.masked_word)
+
+    def unsolved_positions(self):
+        return [i for i, char in enumerate(self.masked_word) if char == self.MASK_CHAR]
+
+    def engine_state(self, game, word_text):
+        return engine.EngineState(
+            word_text.upper(), game.player1_id, game.player2_id, self.current_player_id, self.masked_word,
+            self.solved_count, self.player1_score, self.player2_score, self.hints_used, self.revealed_letters,
+            game.status == 'finished', game.winner_id)
+
+    def apply_engine(self, game, state):
+        # نتیجه حرکت GameEngine روی مدل؛ خروجی نام فیلدهای تغییرکرده برای update_fields یا mark_state است.
+        # ساعت باید قبل از این (با بازیکن نوبت قبلی) تسویه شده باشد و پایان بازی روی Game با فراخواننده است.
+        changed = []
+        for field, value in (('masked_word', state.masked), ('solved_count', state.solved_count),
+                             ('player1_score', state.score1), ('player2_score', state.score2),
+                             ('hints_used', state.hints), ('revealed_letters', state.revealed)):
+            if getattr(self, field) != value:
+                setattr(self, field, value)
+                changed.append(field)
+        if self.current_player_id != state.current:
+            self.current_player = game.player(state.current)
+            changed.append('current_player')
+        return changed
+
+
+class GameEvent(models.Model):
+    KIND_GUESS = 'guess'
+    KIND_HINT = 'hint'
+    KIND_REVEAL = 'reveal'
+    KIND_CHOICES = (
+        (KIND_GUESS, 'Guess'),
+        (KIND_HINT, 'Hint'),
+        (KIND_REVEAL, 'Reveal'),
+    )
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='events')
+    seq = models.PositiveIntegerField()
+    player = models.ForeignKey(User, on_delete=models.CASCADE, related_name='game_events', null=True, blank=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    position = models.PositiveSmallIntegerField(null=True, blank=True)
+    letter = models.CharField(max_length=1, null=True, blank=True)
+    correct = models.BooleanField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['game', 'seq'], name='game_event_game_seq_uniq'),
+        ]
+
+    def as_guess(self):
+        return {'letter': self.letter, 'position': self.position, 'correct': self.correct,
+                'player_id': self.player_id}
+
+    def __str__(self):
+        return f"{self.kind} #{self.seq} in game {self.game_id}"
+
+
+class LedgerEntry(models.Model):
+    # دفتر حساب سکه و XP برای حسابرسی؛ فقط اضافه می‌شود و هیچ ردیفی ویرایش یا حذف نمی‌شود
+    CURRENCY_COINS = 'coins'
+    CURRENCY_XP = 'xp'
+    CURRENCY_CHOICES = (
+        (CURRENCY_COINS, 'Coins'),
+        (CURRENCY_XP, 'XP'),
+    )
+    REASON_HINT = 'hint'
+    REASON_REVEAL = 'reveal'
+    REASON_CORRECT_GUESS = 'correct_guess'
+    REASON_WIN = 'win'
+    REASON_CHOICES = (
+        (REASON_HINT, 'Hint'),
+        (REASON_REVEAL, 'Reveal letter'),
+        (REASON_CORRECT_GUESS, 'Correct guess'),
+        (REASON_WIN, 'Win'),
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ledger_entries')
+    game = models.ForeignKey(Game, on_delete=models.SET_NULL, related_name='ledger_entries', null=True, blank=True)
+    currency = models.CharField(max_length=5, choices=CURRENCY_CHOICES)
+    delta = models.IntegerField()
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-id'], name='ledger_user_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.delta:+d} {self.currency} ({self.reason})"
+
+
+class SharedVersion(models.Model):
+    # شمارنده نسخه داده‌ای که هر پروسس در حافظه نگه می‌دارد (مثلاً جدول رده‌بندی)؛ در دیتابیس است چون کش
+    # پیش‌فرض Django در هر پروسس جداست و افزایش نسخه از یک دستور مدیریتی به سرورهای در حال اجرا نمی‌رسید
+    name = models.CharField(max_length=50, primary_key=True)
+    version = models.PositiveIntegerField(default=0)
+
+    @classmethod
+    def current(cls, name):
+        return cls.objects.filter(pk=name).values_list('version', flat=True).first() or 0
+
+    @classmethod
+    def bump(cls, name):
+        cls.objects.get_or_create(pk=name)
+        cls.objects.filter(pk=name).update(version=F('version') + 1)
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
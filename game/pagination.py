@@ -0,0 +1,84 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from django.http import HttpResponse
+from rest_framework import serializers
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import replace_query_param
+
+
+# صفحه‌بندی keyset روی (فیلد زمان، id) به ترتیب نزولی.
+# به جای OFFSET، صفحه بعد با شرط «کوچک‌تر از آخرین ردیف صفحه قبل» خوانده می‌شود
+# پس هزینه هر صفحه به شماره صفحه بستگی ندارد.
+class KeysetPagination:
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+
+    def __init__(self, ordering_field, page_size=None, max_page_size=None):
+        if page_size is None:
+            page_size = getattr(settings, 'GAME_PAGE_SIZE', 50)
+        if max_page_size is None:
+            max_page_size = getattr(settings, 'GAME_MAX_PAGE_SIZE', 200)
+        self.ordering_field = ordering_field
+        self.page_size = page_size
+        self.max_page_size = max_page_size
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            size = self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    @staticmethod
+    def encode_cursor(value, pk):
+        raw = f'{value.isoformat()}|{pk}'.encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+            value, pk = raw.rsplit('|', 1)
+            return datetime.fromisoformat(value), int(pk)
+        except (ValueError, binascii.Error, UnicodeDecodeError):
+            raise serializers.ValidationError({'cursor': 'نشانگر صفحه معتبر نیست.'})
+
+    def page_queryset(self, queryset, request):
+        field = self.ordering_field
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            value, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(Q(**{f'{field}__lt': value}) | Q(**{field: value, 'pk__lt': pk}))
+        # یک ردیف بیشتر خوانده می‌شود تا معلوم شود صفحه بعدی وجود دارد یا نه
+        return queryset.order_by(f'-{field}', '-pk')[:self.get_page_size(request) + 1]
+
+    def page_keys(self, request, queryset):
+        # فقط id ردیف‌های صفحه از روی ایندکس (برای ETag در conditional.page_response)
+        return list(self.page_queryset(queryset, request).values_list('pk', flat=True))
+
+    def fetch(self, request, queryset):
+        # ردیف‌های صفحه (حداکثر max_page_size + 1) یک‌جا خوانده می‌شوند تا ETag پیش از ساختن پاسخ معلوم باشد
+        return list(self.page_queryset(queryset, request))
+
+    def response(self, request, queryset, serializer_class, rows=None):
+        # صفحه محدود است (حداکثر max_page_size ردیف)، پس بدنه یک‌جا ساخته می‌شود: StreamingHttpResponse با
+        # generator همگام زیر ASGI پیش از ارسال کامل در حافظه جمع می‌شد و چیزی stream نمی‌کرد. هر ردیف
+        # جداگانه به JSON تبدیل می‌شود و لیست دیکشنری‌های کل صفحه ساخته نمی‌شود.
+        page_size = self.get_page_size(request)
+        if rows is None:
+            rows = self.fetch(request, queryset)
+        page = rows[:page_size]
+        results = ','.join(json.dumps(serializer_class(obj).data, cls=JSONEncoder, ensure_ascii=False)
+                           for obj in page)
+        next_url = None
+        if len(rows) > page_size:
+            last = page[-1]
+            cursor = self.encode_cursor(getattr(last, self.ordering_field), last.pk)
+            next_url = replace_query_param(request.build_absolute_uri(), self.cursor_query_param, cursor)
+        body = '{"results": [' + results + '], "next": ' + json.dumps(next_url) + '}'
+        return HttpResponse(body, content_type='application/json')
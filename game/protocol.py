@@ -0,0 +1,131 @@
+import time
+
+from channels.layers import get_channel_layer
+
+from . import metrics
+from .serializers import GameSerializer, GameStateSerializer
+from .sessions import game_sessions
+
+PROTOCOL_FULL = 'full'
+PROTOCOL_DELTA = 'delta'
+PROTOCOLS = (PROTOCOL_FULL, PROTOCOL_DELTA)
+
+# فیلدهای سریالایزر که با تغییر هر فیلد مدل Game عوض می‌شوند
+GAME_FIELDS = {
+    'status': ('status',),
+    'player2': ('player2',),
+    'winner': ('winner',),
+}
+STATE_FIELDS_FROM_GAME = {
+    'status': ('game_status',),
+    'player2': ('player2',),
+    'winner': ('winner',),
+}
+# فیلدهای مدل GameState که نام دیگری در سریالایزر دارند یا اصلاً ارسال نمی‌شوند
+STATE_FIELD_ALIASES = {
+    'masked_word': ('word',),
+    'solved_count': (),
+    'event_seq': (),
+    'clock_started_at': (),
+}
+# فیلدهایی که به جای مقدار کامل، فقط بخش تغییر کرده‌شان ارسال می‌شود
+PER_PLAYER_FIELDS = ('revealed_letters', 'hints_used')
+
+_serializer_fields = {}
+
+
+def _fields(serializer_class):
+    fields = _serializer_fields.get(serializer_class)
+    if fields is None:
+        fields = _serializer_fields[serializer_class] = serializer_class().fields
+    return fields
+
+
+def represent(serializer_class, instance, names):
+    # همان تبدیلی که سریالایزر برای هر فیلد انجام می‌دهد، ولی فقط برای فیلدهای خواسته‌شده
+    fields = _fields(serializer_class)
+    data = {}
+    for name in names:
+        field = fields[name]
+        attribute = field.get_attribute(instance)
+        data[name] = None if attribute is None else field.to_representation(attribute)
+    return data
+
+
+def snapshot_payload(game, state, event_type, seq, additional_data=None):
+    payload = {
+        'event': event_type,
+        'seq': seq,
+        'game': GameSerializer(game).data,
+        'state': GameStateSerializer(state).data,
+    }
+    if additional_data:
+        payload.update(additional_data)
+    return payload
+
+
+def delta_payload(session, event_type, seq, additional_data=None):
+    game, state = session.game, session.state
+    game_changes, state_changes = session.take_broadcast_changes()
+
+    game_names = []
+    state_names = []
+    for name in game_changes:
+        game_names.extend(GAME_FIELDS.get(name, ()))
+        state_names.extend(STATE_FIELDS_FROM_GAME.get(name, ()))
+    for name in state_changes:
+        if name not in PER_PLAYER_FIELDS:
+            state_names.extend(STATE_FIELD_ALIASES.get(name, (name,)))
+
+    payload = {'event': event_type, 'seq': seq, 'mode': PROTOCOL_DELTA}
+    if game_names:
+        payload['game'] = represent(GameSerializer, game, game_names)
+    state_data = represent(GameStateSerializer, state, state_names)
+
+    if 'event_seq' in state_changes:
+        guesses = state.guesses()
+        if len(guesses) > session.sent_guess_count:
+            payload['guesses'] = guesses[session.sent_guess_count:]
+            session.sent_guess_count = len(guesses)
+
+    for name in PER_PLAYER_FIELDS:
+        if name in state_changes:
+            sent = session.sent_per_player[name]
+            changed = {key: list(value) for key, value in getattr(state, name).items() if sent.get(key) != value}
+            sent.update(changed)
+            state_data[name] = changed
+
+    if state_data:
+        payload['state'] = state_data
+    if additional_data:
+        payload.update(additional_data)
+    return payload
+
+
+def game_group_name(game_id):
+    return f'game_{game_id}'
+
+
+async def broadcast_game_update(session, event_type, additional_data=None, channel_layer=None, full=False):
+    # full=True یعنی گیرنده‌های delta هم snapshot کامل بگیرند؛ بعد از ادغام session با دیتابیس هم همین‌طور
+    game, state = session.game, session.state
+    full = session.take_resync() or full
+    seq = session.next_seq()
+    message = {
+        'type': 'game_update',  # این type برای فراخوانی متد game_update در GameConsumer است
+        'seq': seq,
+        'event': event_type,
+        'additional_data': additional_data,
+    }
+    if full:
+        session.take_broadcast_changes()
+        message['delta'] = message['payload'] = snapshot_payload(game, state, event_type, seq, additional_data)
+    else:
+        message['delta'] = delta_payload(session, event_type, seq, additional_data)
+    # payload کامل فقط وقتی ساخته می‌شود که گیرنده‌ای با پروتکل پیش‌فرض داشته باشیم
+    if not full and game_sessions.needs_full_payload(game.game_id):
+        message['payload'] = snapshot_payload(game, state, event_type, seq, additional_data)
+    channel_layer = channel_layer or get_channel_layer()
+    start = time.perf_counter()
+    await channel_layer.group_send(game_group_name(game.game_id), message)
+    metrics.group_send_latency.observe(time.perf_counter() - start)
@@ -1,5 +1,6 @@
 from django.urls import re_path
-from .consumers import GameConsumer
+from .consumers import GameConsumer, MatchmakingConsumer
 websocket_urlpatterns = [
          re_path(r'ws/game/(?P<game_id>[^/]+)/$', GameConsumer.as_asgi()),
+         re_path(r'ws/matchmaking/$', MatchmakingConsumer.as_asgi()),
      ]
\ No newline at end of file
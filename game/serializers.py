@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import User, Game, GameState, GameHistory, Word
+from .models import User, Game, GameState, GameHistory, PlayerStats, Word
 import re
 
 class LoginSerializer(serializers.Serializer):
@@ -130,7 +130,10 @@ class GameSerializer(serializers.ModelSerializer):
 
 class GameStateSerializer(serializers.ModelSerializer):
     word = serializers.SerializerMethodField()
+    guessed_letters = serializers.SerializerMethodField()
     current_player = serializers.SerializerMethodField()
+    player1_time = serializers.SerializerMethodField()
+    player2_time = serializers.SerializerMethodField()
     game_status = serializers.CharField(source='game.status', read_only=True) # <--- این خط اضافه شود
     player1 = serializers.CharField(source='game.player1.username', read_only=True, allow_null=True) # اضافه شده برای دسترسی به نام بازیکنان
     player2 = serializers.CharField(source='game.player2.username', read_only=True, allow_null=True) # اضافه شده برای دسترسی به نام بازیکنان
@@ -152,46 +155,22 @@ class GameStateSerializer(serializers.ModelSerializer):
     # ... (بقیه متدهای سریالایزر)
 
     def get_word(self, obj: GameState) -> str:  # obj یک نمونه از GameState است
-        if not obj.word:  # اگر به هر دلیلی کلمه وجود نداشته باشد
-            return ""
-
-        word_text = obj.word.text.upper()  # یا .lower() بسته به استاندارد شما
-        result = ['_'] * len(word_text)
-
-        # نمایش تمام حروفی که 'correct' هستند (شامل حدس‌های صحیح بازیکن و حروف آشکار شده توسط API)
-        # با فرض اینکه guessed_letters شامل دیکشنری‌هایی با کلیدهای 'letter', 'position', 'correct' است
-        # و حروف آشکار شده توسط API هم با 'correct': True و یک فلگ اضافی مانند 'is_revealed_by_api': True در آن ذخیره می‌شوند.
-        if isinstance(obj.guessed_letters, list):  # اطمینان از اینکه guessed_letters یک لیست است
-            for guess in obj.guessed_letters:
-                if isinstance(guess, dict) and guess.get('correct') and 'position' in guess and 'letter' in guess:
-                    try:
-                        position = int(guess['position'])
-                        if 0 <= position < len(result):
-                            result[position] = str(guess['letter']).upper()  # یا .lower()
-                    except (ValueError, TypeError):
-                        # نادیده گرفتن حدس‌های با فرمت اشتباه در لیست
-                        pass
-
-                        # حلقه قبلی که باعث خطا می‌شد حذف شده است، چون منطق آن با ساختار فعلی revealed_letters سازگار نبود.
-        # اگر revealed_letters ساختار خاصی دارد که می‌خواهید جداگانه پردازش کنید، باید اینجا پیاده‌سازی شود.
-        # مثال: اگر revealed_letters یک دیکشنری با user_id به عنوان کلید و لیستی از حروف آشکار شده به عنوان مقدار باشد:
-        # for user_id, revealed_list_for_user in obj.revealed_letters.items():
-        #     if isinstance(revealed_list_for_user, list):
-        #         for item in revealed_list_for_user: # item می‌تواند حرف یا دیکشنری {'letter': 'A', 'position': 0} باشد
-        #             if isinstance(item, dict) and 'letter' in item and 'position' in item:
-        #                 try:
-        #                     pos = int(item['position'])
-        #                     if 0 <= pos < len(result):
-        #                         result[pos] = str(item['letter']).upper()
-        #                 except (ValueError, TypeError):
-        #                     pass
-        #             # اگر item فقط خود حرف است، این منطق کار نخواهد کرد چون position را نداریم.
-
-        return ' '.join(result)
+        # masked_word هنگام هر حدس درست به‌روز می‌شود، پس نیازی به پیمایش guessed_letters نیست
+        return ' '.join(obj.masked_word)
+
+    def get_guessed_letters(self, obj: GameState):
+        return obj.guesses()
 
     def get_current_player(self, obj: GameState):
         return obj.current_player.username if obj.current_player else None
 
+    # زمان باقیمانده هنگام خواندن از روی clock_started_at محاسبه می‌شود
+    def get_player1_time(self, obj: GameState):
+        return max(0, int(obj.remaining_time(obj.game, obj.game.player1_id)))
+
+    def get_player2_time(self, obj: GameState):
+        return max(0, int(obj.remaining_time(obj.game, obj.game.player2_id)))
+
 
     def validate_hints_used(self, value):
         for user_id, hints in value.items():
@@ -199,16 +178,6 @@ class GameStateSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError({'error': 'شماره نکات باید ۱، ۲ یا ۳ باشد.'})
         return value
 
-    def validate_guessed_letters(self, value):
-        if not isinstance(value, list):
-            raise serializers.ValidationError({'error': 'حروف حدس‌زده‌شده باید به‌صورت لیست باشند.'})
-        for guess in value:
-            if not re.match(r'^[A-Z]$', guess['letter']):
-                raise serializers.ValidationError({'error': 'حروف حدس‌زده‌شده باید یک حرف از A تا Z باشند.'})
-            if 'correct' not in guess or 'position' not in guess:
-                raise serializers.ValidationError({'error': 'اطلاعات حدس باید شامل وضعیت و موقعیت باشد.'})
-        return value
-
     def validate_player1_score(self, value):
         if value < 0:
             raise serializers.ValidationError({'error': 'امتیاز بازیکن اول نمی‌تواند منفی باشد.'})
@@ -258,4 +227,10 @@ class GameHistorySerializer(serializers.ModelSerializer):
         ret = super().to_representation(instance)
         if ret['date']:
             ret['date'] = instance.date.strftime('%d-%m-%Y')
-        return ret
\ No newline at end of file
+        return ret
+
+
+class PlayerStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PlayerStats
+        fields = ['level', 'wins', 'losses', 'draws', 'total_score', 'best_score', 'current_streak', 'best_streak']
@@ -0,0 +1,551 @@
+import asyncio
+import contextvars
+import copy
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from . import metrics
+from .authentication import token_cache
+from .bundles import load_game_bundle
+from .currency import ledger_entry
+from .log import get_logger
+from .models import Game, GameState, GameHistory, GameEvent, LedgerEntry, PlayerStats, User
+from .writer import run_write
+
+log = get_logger(__name__)
+
+# فیلدهای GameState که session نگه می‌دارد و در ادغام با دیتابیس (merge_value) شرکت می‌کنند
+SYNCED_STATE_FIELDS = tuple(field.attname for field in GameState._meta.concrete_fields
+                            if field.name not in ('id', 'game', 'word', 'version'))
+PER_PLAYER_LISTS = ('revealed_letters', 'hints_used')
+COUNTERS = ('event_seq', 'player1_score', 'player2_score')
+# نوبت، ساعت و توقف؛ اگر هم session و هم مسیر دیگری آن‌ها را عوض کرده باشند دو حرکت هم‌زمان انجام شده و
+# حرکت session رد می‌شود (reconcile)، نه این‌که یکی روی دیگری نوشته شود
+TURN_FIELDS = ('current_player_id', 'last_turn_time', 'clock_started_at', 'paused_at', 'player1_time', 'player2_time')
+# ردیف‌های دفتر حساب که نتیجه حرکت‌اند و با رد شدن حرکت نوشته نمی‌شوند؛ خرج سکه (راهنمایی و نمایش حرف)
+# از قبل در دیتابیس کم شده و ردیفش همیشه نوشته می‌شود
+MOVE_REASONS = (LedgerEntry.REASON_CORRECT_GUESS, LedgerEntry.REASON_WIN)
+
+
+def merge_value(name, base, mine, theirs):
+    # ادغام سه‌طرفه یک فیلد GameState: base آخرین مقداری است که session از دیتابیس داشت، mine مقدار session و
+    # theirs مقدار فعلی دیتابیس که مسیر دیگری (مثلاً REST) نوشته است
+    if mine == base:
+        return theirs
+    if name in COUNTERS:
+        # هر دو طرف جدا از هم اضافه کرده‌اند، حتی اگر به یک عدد رسیده باشند
+        return theirs + mine - base
+    if theirs == base or theirs == mine:
+        return mine
+    if name in PER_PLAYER_LISTS:
+        merged = {key: list(items) for key, items in (theirs or {}).items()}
+        for key, items in (mine or {}).items():
+            target = merged.setdefault(key, [])
+            target.extend(item for item in items if item not in target)
+        return merged
+    if name == 'masked_word':
+        return ''.join(theirs_char if char == GameState.MASK_CHAR else char
+                       for char, theirs_char in zip(mine, theirs))
+    if name in TURN_FIELDS:
+        # به این‌جا فقط وقتی می‌رسد که reconcile حرکت را رد کرده باشد؛ مقدار دیتابیس می‌ماند
+        return theirs
+    return mine
+
+
+def solved_count(masked_word):
+    return len(masked_word) - masked_word.count(GameState.MASK_CHAR)
+
+
+def is_move(changes):
+    # تغییر نوبت، ساعت، توقف یا وضعیت بازی؛ راهنمایی و نمایش حرف حرکت نیستند و با هر چیزی ادغام می‌شوند
+    return bool(changes['game']) or any(name in TURN_FIELDS for name in changes['state'])
+
+
+# نسخه درون‌حافظه‌ای یک بازی فعال در این پروسس.
+# بازی، وضعیت، کلمه و بازیکنان یک بار بارگذاری می‌شوند، اکشن‌ها مستقیم روی همین آبجکت‌ها
+# اعمال می‌شوند و تغییرات (write-behind) به صورت دسته‌ای در دیتابیس نوشته می‌شوند.
+class GameSession:
+    def __init__(self, state):
+        self.state = state
+        self.game = state.game
+        self.word_text = state.word.text.upper()
+        self.lock = asyncio.Lock()
+        self.dirty_game = set()
+        self.dirty_state = set()
+        self.coin_deltas = {}  # user_id -> تغییر سکه
+        self.xp_deltas = {}  # user_id -> تغییر XP
+        self.pending_histories = []
+        self.pending_events = []
+        self.pending_ledger = []
+        # آخرین مقادیری که در دیتابیس هست (یا با flush در راه است)؛ مبنای ادغام وقتی مسیر دیگری هم نوشته باشد
+        self.synced_state = self._values(state, SYNCED_STATE_FIELDS)
+        self.synced_status = self.game.status
+        # signal ذخیره بازی از مسیر دیگر (REST) این را True می‌کند؛ flush بعدی session را با دیتابیس ادغام می‌کند
+        self.stale = False
+        self.resync = False
+        # وضعیت ارسال برای پروتکل delta: شماره ترتیب و آخرین چیزی که برای بازیکنان فرستاده شده
+        # شماره ترتیب از زمان فعلی (میلی‌ثانیه) شروع می‌شود تا با بارگذاری دوباره session عقب نرود
+        self.seq = int(time.time() * 1000)
+        self.changed_game = set()
+        self.changed_state = set()
+        self.sent_guess_count = len(state.guesses())
+        self.sent_per_player = {
+            'revealed_letters': copy.deepcopy(state.revealed_letters or {}),
+            'hints_used': copy.deepcopy(state.hints_used or {}),
+        }
+
+    @property
+    def is_dirty(self):
+        return bool(self.dirty_game or self.dirty_state or self.coin_deltas or self.xp_deltas
+                    or self.pending_histories or self.pending_events or self.pending_ledger)
+
+    def engine_state(self):
+        return self.state.engine_state(self.game, self.word_text)
+
+    def apply_engine(self, engine_state):
+        self.mark_state(*self.state.apply_engine(self.game, engine_state))
+
+    def mark_game(self, *fields):
+        self.dirty_game.update(fields)
+        self.changed_game.update(fields)
+
+    def mark_state(self, *fields):
+        self.dirty_state.update(fields)
+        self.changed_state.update(fields)
+
+    def next_seq(self):
+        self.seq += 1
+        return self.seq
+
+    def take_resync(self):
+        # بعد از ادغام با دیتابیس، پیام بعدی برای همه snapshot کامل است چون deltaها از نسخه قبلی حساب شده‌اند
+        resync, self.resync = self.resync, False
+        return resync
+
+    def take_broadcast_changes(self):
+        changes = (self.changed_game, self.changed_state)
+        self.changed_game = set()
+        self.changed_state = set()
+        return changes
+
+    def add_coins(self, user, delta, reason):
+        # پاداش‌ها با F() در flush بعدی اضافه می‌شوند؛ خرج سکه چون شرط موجودی دارد فوراً با
+        # currency.spend_coins انجام می‌شود و فقط ردیف دفتر حسابش از اینجا می‌گذرد (add_ledger)
+        self.coin_deltas[user.id] = self.coin_deltas.get(user.id, 0) + delta
+        self.add_ledger(user, LedgerEntry.CURRENCY_COINS, delta, reason)
+
+    def add_xp(self, user, delta, reason):
+        self.xp_deltas[user.id] = self.xp_deltas.get(user.id, 0) + delta
+        self.add_ledger(user, LedgerEntry.CURRENCY_XP, delta, reason)
+
+    def add_ledger(self, user, currency, delta, reason):
+        self.pending_ledger.append(ledger_entry(user, currency, delta, reason, self.game))
+
+    def add_event(self, kind, player, position=None, letter=None, correct=None):
+        self.pending_events.append(self.state.add_event(kind, player, position, letter, correct))
+        self.mark_state('event_seq')
+
+    def add_history(self, player, opponent, result, score):
+        self.pending_histories.append({
+            'game_id': self.game.id,
+            'player_id': player.id,
+            'opponent_id': opponent.id,
+            'level': self.game.level,
+            'result': result,
+            'score': score,  # فقط برای PlayerStats؛ در GameHistory ذخیره نمی‌شود
+        })
+
+    def discard_moves(self):
+        # حرکت‌هایی که هنوز نوشته نشده‌اند کنار گذاشته می‌شوند (بعد از رد شدن حرکت در reconcile)؛ راهنمایی و
+        # نمایش حرف که سکه‌اش خرج شده می‌مانند
+        self.dirty_game = set()
+        self.dirty_state &= {'event_seq', *PER_PLAYER_LISTS}
+        self.coin_deltas = {}
+        self.xp_deltas = {}
+        self.pending_histories = []
+        self.pending_events = [event for event in self.pending_events if event.kind != GameEvent.KIND_GUESS]
+        self.pending_ledger = [entry for entry in self.pending_ledger if entry.reason not in MOVE_REASONS]
+
+    def take_changes(self):
+        # گرفتن یک کپی از تغییرات و پاک کردن علامت‌ها؛ روی event loop اجرا می‌شود
+        # پس در میانه یک اکشن قرار نمی‌گیرد.
+        state_values = self._values(self.state, self.dirty_state)
+        changes = {
+            'game_pk': self.game.pk,
+            'state_pk': self.state.pk,
+            'game': self._values(self.game, self.dirty_game),
+            'state': state_values,
+            'base': {name: self.synced_state[name] for name in (*state_values, *TURN_FIELDS)},
+            'status': self.synced_status,
+            'stale': self.stale,
+            'version': self.state.version,
+            'coins': self.coin_deltas,
+            'xp': self.xp_deltas,
+            'histories': self.pending_histories,
+            'events': self.pending_events,
+            'ledger': self.pending_ledger,
+        }
+        if changes['state']:
+            # نسخه همین‌جا جلو می‌رود تا flush بعدی (که به ترتیب بعد از این اجرا می‌شود) نسخه درست را بفرستد
+            self.state.version += 1
+        self.synced_state.update(copy.deepcopy(state_values))
+        self.synced_status = self.game.status
+        self.stale = False
+        self.dirty_game = set()
+        self.dirty_state = set()
+        self.coin_deltas = {}
+        self.xp_deltas = {}
+        self.pending_histories = []
+        self.pending_events = []
+        self.pending_ledger = []
+        return changes
+
+    def restore_changes(self, changes):
+        # اگر نوشتن شکست خورد تغییرات برمی‌گردند تا در نوبت بعدی دوباره نوشته شوند
+        if changes['state'] and self.state.version == changes['version'] + 1:
+            self.state.version = changes['version']
+        self.synced_state.update(changes['base'])
+        self.synced_status = changes['status']
+        self.stale = self.stale or changes['stale']
+        self.dirty_game.update(changes['game'])
+        self.dirty_state.update(changes['state'])
+        for user_id, delta in changes['coins'].items():
+            self.coin_deltas[user_id] = self.coin_deltas.get(user_id, 0) + delta
+        for user_id, delta in changes['xp'].items():
+            self.xp_deltas[user_id] = self.xp_deltas.get(user_id, 0) + delta
+        self.pending_histories = changes['histories'] + self.pending_histories
+        self.pending_events = changes['events'] + self.pending_events
+        self.pending_ledger = changes['ledger'] + self.pending_ledger
+
+    def refresh(self, fresh):
+        # مقادیر دیتابیس بعد از ادغام در write_changes. فیلدهایی که بعد از take_changes دوباره تغییر کرده‌اند
+        # (و هنوز نوشته نشده‌اند) با همان merge_value روی مقدار تازه سوار می‌شوند و flush بعدی آن‌ها را می‌نویسد.
+        game, state = self.game, self.state
+        if fresh['rejected']:
+            # حرکت‌های بعدی همین session روی وضعیتی بودند که نوشته نشد
+            self.discard_moves()
+        dirty_state = {state._meta.get_field(name).attname for name in self.dirty_state}
+        dirty_game = {game._meta.get_field(name).attname for name in self.dirty_game}
+        for name, value in fresh['state'].items():
+            if name in dirty_state and name != 'event_seq':
+                value = merge_value(name, self.synced_state[name], getattr(state, name), value)
+            self.synced_state[name] = copy.deepcopy(fresh['state'][name])
+            setattr(state, name, value)
+        # رویدادهای در راه بعد از رویدادهای دیتابیس شماره می‌گیرند
+        for seq, event in enumerate(self.pending_events, state.event_seq + 1):
+            event.seq = seq
+        state.event_seq += len(self.pending_events)
+        self.dirty_state.discard('event_seq')
+        if self.pending_events:
+            self.dirty_state.add('event_seq')
+        state.solved_count = solved_count(state.masked_word)
+        if 'masked_word' in dirty_state:
+            self.dirty_state.add('solved_count')
+        state.version = fresh['version']
+
+        if 'player2_id' not in dirty_game and game.player2_id != fresh['game']['player2_id']:
+            game.player2 = fresh['player2']
+        for name, value in fresh['game'].items():
+            if name not in dirty_game:
+                setattr(game, name, value)
+        game.winner = game.player(game.winner_id)
+        state.current_player = game.player(state.current_player_id)
+        self.synced_status = fresh['game']['status']
+
+        guesses = fresh['guesses']
+        state.__dict__['_guesses'] = guesses + [event.as_guess() for event in self.pending_events
+                                                if event.kind == GameEvent.KIND_GUESS]
+        self.sent_guess_count = len(state.guesses())
+        self.sent_per_player = {name: copy.deepcopy(getattr(state, name) or {}) for name in PER_PLAYER_LISTS}
+        self.resync = True
+
+    @staticmethod
+    def _values(obj, fields):
+        values = {}
+        for name in fields:
+            field = obj._meta.get_field(name)
+            values[field.attname] = copy.deepcopy(getattr(obj, field.attname))
+        return values
+
+
+def load_session_state(game_id):
+    try:
+        state = load_game_bundle(game_id).state
+    except Game.DoesNotExist:
+        raise GameState.DoesNotExist(f'Game {game_id} not found')  # consumer همین خطا را به «بازی یافت نشد» تبدیل می‌کند
+    state.guesses()  # لیست حدس‌ها همین‌جا خوانده می‌شود تا روی event loop کوئری زده نشود
+    return state
+
+
+def reconcile(changes):
+    # ردیف تازه خوانده و تغییرات session با merge_value روی آن ادغام می‌شود. اگر هر دو طرف حرکت کرده باشند
+    # (نوبت، ساعت یا توقف) یا بازی در این فاصله از مسیر دیگری تمام شده باشد (superseded)، حرکت session رد
+    # می‌شود: فقط راهنمایی‌ها و نمایش حرف‌ها (که سکه‌شان خرج شده) نوشته می‌شوند و session از دیتابیس به‌روز می‌شود.
+    base = changes['base']
+    while True:
+        state = GameState.objects.select_related('game__player2').get(pk=changes['state_pk'])
+        game = state.game
+        superseded = changes['status'] != 'finished' and game.status == 'finished'
+        moved = game.status != changes['status'] or any(getattr(state, name) != base[name] for name in TURN_FIELDS)
+        rejected = superseded or (moved and is_move(changes))
+        mine, events = changes['state'], changes['events']
+        if rejected:
+            mine = {name: value for name, value in mine.items() if name in PER_PLAYER_LISTS}
+            events = [event for event in events if event.kind != GameEvent.KIND_GUESS]
+        values = {name: merge_value(name, base[name], value, getattr(state, name)) for name, value in mine.items()}
+        if events:
+            # رویدادهای session بعد از رویدادهایی که مسیر دیگر ثبت کرده شماره می‌گیرند
+            values['event_seq'] = state.event_seq + len(events)
+        if 'masked_word' in values:
+            values['solved_count'] = solved_count(values['masked_word'])
+        # اگر بین خواندن و نوشتن باز هم کسی نوشت، دوباره از ردیف تازه شروع می‌شود
+        if not values or GameState.compare_and_swap(state.pk, state.version, values):
+            break
+
+    for seq, event in enumerate(events, state.event_seq + 1):
+        event.seq = seq
+    for name, value in values.items():
+        setattr(state, name, value)
+    game_values = {'status': game.status, 'winner_id': game.winner_id, 'player2_id': game.player2_id}
+    if not rejected:
+        game_values.update(changes['game'])
+    return {
+        'state': {name: getattr(state, name) for name in SYNCED_STATE_FIELDS},
+        'version': state.version + 1 if values else state.version,
+        'game': game_values,
+        'player2': game.player2 if game.player2_id == game_values['player2_id'] else None,
+        'events': events,
+        'superseded': superseded,
+        'rejected': rejected,
+    }
+
+
+def write_changes(batch):
+    # همه تغییرات یک دور flush در یک تراکنش نوشته می‌شوند. وضعیت هر بازی با شرط نسخه نوشته می‌شود؛ اگر
+    # مسیر دیگری (مثلاً REST) زودتر آن را تغییر داده یا session باطل شده باشد، تغییرات با ردیف تازه ادغام
+    # یا حرکت رد می‌شود (reconcile). خروجی برای این بازی‌ها مقادیر تازه دیتابیس است (game_pk -> fresh) تا
+    # session با GameSession.refresh به‌روز شود.
+    refreshed = {}
+    with transaction.atomic():
+        ledger = []
+        for changes in batch:
+            fresh = None
+            if changes['stale'] or (changes['state'] and not GameState.compare_and_swap(
+                    changes['state_pk'], changes['version'], changes['state'])):
+                fresh = refreshed[changes['game_pk']] = reconcile(changes)
+            # از حرکت ردشده هیچ نتیجه‌ای (وضعیت بازی، پاداش سکه و XP، تاریخچه) نوشته نمی‌شود؛
+            # خرج سکه‌ها و رویدادهای راهنمایی و نمایش حرف همیشه نوشته می‌شوند
+            rejected = fresh is not None and fresh['rejected']
+            if rejected:
+                GameEvent.objects.bulk_create(fresh['events'])
+                ledger.extend(entry for entry in changes['ledger'] if entry.reason not in MOVE_REASONS)
+                continue
+            if changes['game']:
+                Game.objects.filter(pk=changes['game_pk']).update(**changes['game'])
+            for user_id, delta in changes['coins'].items():
+                if delta:
+                    User.objects.filter(pk=user_id).update(coins=F('coins') + delta)
+            for user_id, delta in changes['xp'].items():
+                if delta:
+                    User.objects.filter(pk=user_id).update(xp=F('xp') + delta)
+            ledger.extend(changes['ledger'])
+            if changes['events']:
+                GameEvent.objects.bulk_create(changes['events'])
+            if changes['histories']:
+                GameHistory.objects.bulk_create(
+                    GameHistory(**{key: value for key, value in history.items() if key != 'score'})
+                    for history in changes['histories']
+                )
+                PlayerStats.record_results(changes['histories'])
+        # دفتر حساب همه بازی‌های این دور با یک INSERT
+        if ledger:
+            LedgerEntry.objects.bulk_create(ledger)
+        for game_pk, fresh in refreshed.items():
+            fresh['guesses'] = [event.as_guess() for event in
+                                GameEvent.objects.filter(game_id=game_pk, kind=GameEvent.KIND_GUESS).order_by('seq')]
+    # سکه و XP با update() نوشته می‌شوند و signal ندارند، پس کاربر کش‌شده اینجا باطل می‌شود
+    for changes in batch:
+        for user_id in {*changes['coins'], *changes['xp']}:
+            token_cache.invalidate_user(user_id)
+    return refreshed
+
+
+class SessionRegistry:
+    def __init__(self, flush_interval=None):
+        if flush_interval is None:
+            flush_interval = getattr(settings, 'GAME_SESSION_FLUSH_INTERVAL', 1.0)
+        self.flush_interval = flush_interval
+        self._sessions = {}
+        self._keys_by_pk = {}  # Game.pk -> game_id
+        self._refs = {}
+        self._delta_listeners = {}  # game_id -> تعداد اتصال‌های محلی با پروتکل delta
+        self._load_locks = {}
+        self._flusher = None
+        self._wakeup = None
+        self._flush_lock = None
+
+    async def get(self, game_id):
+        game_id = str(game_id)
+        session = self._sessions.get(game_id)
+        if session is not None:
+            return session
+        lock = self._load_locks.setdefault(game_id, asyncio.Lock())
+        async with lock:
+            session = self._sessions.get(game_id)
+            if session is None:
+                state = await sync_to_async(load_session_state)(game_id)
+                session = GameSession(state)
+                self._sessions[game_id] = session
+                self._keys_by_pk[session.game.pk] = game_id
+        self._load_locks.pop(game_id, None)
+        self._ensure_flusher()
+        return session
+
+    def active_count(self):
+        return len(self._sessions)
+
+    def peek(self, game_id):
+        return self._sessions.get(str(game_id))
+
+    def has_connections(self, game_id):
+        return self._refs.get(str(game_id), 0) > 0
+
+    async def acquire(self, game_id):
+        session = await self.get(game_id)
+        game_id = str(game_id)
+        self._refs[game_id] = self._refs.get(game_id, 0) + 1
+        return session
+
+    async def release(self, game_id):
+        game_id = str(game_id)
+        refs = self._refs.get(game_id, 0) - 1
+        if refs > 0:
+            self._refs[game_id] = refs
+            return
+        self._refs.pop(game_id, None)
+        session = self._sessions.get(game_id)
+        if session is not None:
+            await self.flush(session)
+            if self._refs.get(game_id, 0) == 0 and not session.is_dirty:
+                self._drop(game_id)
+
+    def set_delta_listener(self, game_id, enabled):
+        game_id = str(game_id)
+        count = self._delta_listeners.get(game_id, 0) + (1 if enabled else -1)
+        if count > 0:
+            self._delta_listeners[game_id] = count
+        else:
+            self._delta_listeners.pop(game_id, None)
+
+    def needs_full_payload(self, game_id):
+        # اگر یکی از بازیکنان در پروسس دیگری باشد از حالت او خبر نداریم، پس payload کامل هم فرستاده می‌شود
+        game_id = str(game_id)
+        refs = self._refs.get(game_id, 0)
+        return refs < 2 or refs > self._delta_listeners.get(game_id, 0)
+
+    def _drop(self, game_id):
+        session = self._sessions.pop(game_id, None)
+        if session is not None:
+            self._keys_by_pk.pop(session.game.pk, None)
+
+    def invalidate(self, game_pk):
+        # وقتی بازی از مسیر دیگری (مثلاً REST) ذخیره شد نسخه حافظه عقب است. session دور انداخته نمی‌شود چون
+        # ممکن است تغییرات نوشته‌نشده داشته باشد؛ flush بعدی آن را با دیتابیس ادغام و به‌روز می‌کند.
+        # از thread درخواست REST صدا زده می‌شود، نه از event loop.
+        session = self._sessions.get(self._keys_by_pk.get(game_pk))
+        if session is not None:
+            session.stale = True
+            self.request_flush()
+
+    def request_flush(self):
+        if self._wakeup is None:
+            return
+        loop = self._flusher.get_loop()
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._wakeup.set()
+            return
+        try:
+            loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:  # event loop بسته شده است
+            pass
+
+    async def flush(self, *sessions):
+        # خروجی pk بازی‌هایی است که حرکت session در آن‌ها رد شد (reconcile)، مثلاً چون مسیر دیگری هم‌زمان حرکت
+        # کرده یا بازی را تمام کرده بود؛ session این بازی‌ها با دیتابیس یکی شده و بازیکنان باید snapshot بگیرند.
+        # flushها پشت سر هم اجرا می‌شوند، پس وقتی flush برمی‌گردد تغییراتی که flusher زودتر برداشته هم نوشته شده‌اند
+        self._ensure_flusher()
+        async with self._flush_lock:
+            if not sessions:
+                sessions = list(self._sessions.values())
+            pending = [(session, session.take_changes()) for session in sessions
+                       if session.is_dirty or session.stale]
+            if not pending:
+                return []
+            try:
+                refreshed = await run_write(write_changes, [changes for _, changes in pending])
+            except Exception:
+                for session, changes in pending:
+                    session.restore_changes(changes)
+                raise
+            rejected = []
+            for session, changes in pending:
+                fresh = refreshed.get(changes['game_pk'])
+                if fresh is None:
+                    continue
+                # مسیر دیگری هم نوشته بود؛ session با مقادیر ادغام‌شده دیتابیس به‌روز می‌شود
+                session.refresh(fresh)
+                if fresh['rejected']:
+                    log.warning('sessions.move_rejected', game_pk=changes['game_pk'], superseded=fresh['superseded'])
+                    rejected.append(changes['game_pk'])
+                else:
+                    log.info('sessions.reconciled', game_pk=changes['game_pk'])
+            return rejected
+
+    def _ensure_flusher(self):
+        loop = asyncio.get_running_loop()
+        if self._flusher is None or self._flusher.done() or self._flusher.get_loop() is not loop:
+            self._wakeup = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            # context خالی تا لاگ‌های flusher فیلدهای پیامی را که آن را راه انداخته نگیرند
+            self._flusher = loop.create_task(self._run_flusher(), context=contextvars.Context())
+
+    async def _run_flusher(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                rejected = await self.flush()
+            except Exception:
+                log.exception('sessions.flush_failed')
+                continue
+            for game_pk in rejected:
+                await self._resync_players(game_pk)
+
+    async def _resync_players(self, game_pk):
+        # بازیکنان حرکتی را دیده‌اند که نوشته نشد؛ همه snapshot تازه را می‌گیرند.
+        # import اینجاست چون protocol خودش game_sessions را از این ماژول می‌گیرد
+        from .protocol import broadcast_game_update
+        session = self._sessions.get(self._keys_by_pk.get(game_pk))
+        if session is None:
+            return
+        try:
+            async with session.lock:
+                await broadcast_game_update(session, "snapshot", full=True)
+        except Exception:
+            log.exception('sessions.resync_failed', game_pk=game_pk)
+
+
+game_sessions = SessionRegistry()
+metrics.registry.gauge_callback('guess_active_games', 'Games loaded in memory in this worker.',
+                                game_sessions.active_count)
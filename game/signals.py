@@ -0,0 +1,62 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache
+from .leaderboard import leaderboard
+from .models import Game, GameState, User, Word
+from .sessions import game_sessions
+from .word_pool import word_pool
+
+
+@receiver(post_save, sender=Word)
+@receiver(post_delete, sender=Word)
+def invalidate_word_pool(sender, instance, **kwargs):
+    word_pool.bump_version()
+
+
+@receiver(post_save, sender=Game)
+def invalidate_game_session(sender, instance, **kwargs):
+    game_sessions.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=GameState)
+def invalidate_game_state_session(sender, instance, **kwargs):
+    game_sessions.invalidate(instance.game_id)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token(sender, instance, **kwargs):
+    token_cache.invalidate_token(instance.key)
+    token_cache.bump_version()
+
+
+# هر ذخیره کاربر (غیرفعال شدن، تغییر رمز، تغییر سکه یا XP) نسخه کش‌شده‌اش را باطل می‌کند
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    token_cache.invalidate_user(instance.pk)
+
+
+# کش توکن پروسس‌های دیگر فقط برای تغییرهایی که دسترسی را می‌گیرند خالی می‌شود؛ ذخیره last_login در هر ورود
+# یا ساخته شدن کاربر نسخه را عوض نمی‌کند
+@receiver(post_save, sender=User)
+def bump_auth_version(sender, instance, created, update_fields=None, **kwargs):
+    if not created and (update_fields is None or {'is_active', 'password'} & set(update_fields)):
+        token_cache.bump_version()
+
+
+@receiver(post_delete, sender=User)
+def bump_auth_version_on_delete(sender, instance, **kwargs):
+    token_cache.bump_version()
+
+
+@receiver(post_save, sender=User)
+def add_user_to_leaderboard(sender, instance, created, **kwargs):
+    if created:
+        leaderboard.ensure_user(instance.id, instance.username, instance.xp)
+
+
+@receiver(post_delete, sender=User)
+def remove_user_from_leaderboard(sender, instance, **kwargs):
+    leaderboard.remove(instance.id)
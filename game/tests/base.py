@@ -0,0 +1,124 @@
+import os
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from game.models import Game, GameHistory, GameState, User, Word
+
+from .budgets import SEED
+
+PASSWORD = 'secret123'
+
+# تعداد کوئری همیشه assert می‌شود ولی زمان دیواری به بار ماشین بستگی دارد؛ بودجه زمان فقط با
+# API_BUDGET_STRICT=1 (مثلاً روی ماشین اندازه‌گیری) assert و در بقیه اجراها فقط در جدول خلاصه علامت زده می‌شود
+STRICT_TIMING = os.environ.get('API_BUDGET_STRICT', '0') == '1'
+
+# نتایج همه اندازه‌گیری‌ها برای چاپ جدول خلاصه در پایان هر کلاس تست
+results = []
+
+
+def seed_data():
+    # داده‌ای در اندازه واقعی: کلمات هر سطح، کاربران، بازی‌های در انتظار و تاریخچه طولانی یک بازیکن قدیمی
+    rng = random.Random(1234)
+    password = make_password(PASSWORD)
+    Word.objects.bulk_create(
+        Word(text=f'word{i}', level=level, hint1='h1', hint2='h2', hint3='h3')
+        for level, _ in Word.LEVEL_CHOICES for i in range(SEED['words_per_level'])
+    )
+    User.objects.bulk_create(
+        User(username=f'user{i}', password=password, xp=rng.randrange(3000), coins=10)
+        for i in range(SEED['users'])
+    )
+    users = list(User.objects.order_by('id'))
+    veteran = User.objects.create(username='veteran', password=password, xp=5000, coins=100)
+    opponent = User.objects.create(username='opponent', password=password, xp=4800, coins=100)
+
+    Game.objects.bulk_create(
+        Game(player1=rng.choice(users), level=rng.choice(['easy', 'medium', 'hard']), status='pending')
+        for _ in range(SEED['pending_games'])
+    )
+    Game.objects.bulk_create(
+        Game(player1=veteran, player2=opponent, level='easy', status='finished', winner=veteran)
+        for _ in range(SEED['finished_games'])
+    )
+    finished = list(Game.objects.filter(status='finished').values_list('id', flat=True))
+    GameHistory.objects.bulk_create(
+        GameHistory(game_id=rng.choice(finished), player=veteran, opponent=opponent, level='easy',
+                    result=rng.choice(['won', 'lost', 'draw']))
+        for _ in range(SEED['veteran_histories'])
+    )
+    Game.objects.bulk_create(
+        Game(player1=veteran, player2=rng.choice(users), level='easy', status='paused')
+        for _ in range(SEED['paused_games'])
+    )
+    return veteran, opponent
+
+
+def make_game(player1, player2=None, status='active', text='planet', current=None, **state_fields):
+    word = Word.objects.create(text=text, level='easy', hint1='h1', hint2='h2', hint3='h3')
+    game = Game.objects.create(player1=player1, player2=player2, level='easy', status=status)
+    now = timezone.now()
+    players = [str(player.id) for player in (player1, player2) if player]
+    fields = {
+        'current_player': current or player1,
+        'player1_time': Game.TIME_LIMITS['easy'],
+        'player2_time': Game.TIME_LIMITS['easy'],
+        'revealed_letters': {player_id: [] for player_id in players},
+        'hints_used': {player_id: [] for player_id in players},
+        'last_turn_time': now if player2 else None,
+        'clock_started_at': now if status == 'active' and player2 else None,
+    }
+    fields.update(state_fields)
+    state = GameState.objects.create(game=game, word=word, **fields)
+    return game, state
+
+
+def auth_header(user):
+    token, _ = Token.objects.get_or_create(user=user)
+    return {'HTTP_AUTHORIZATION': f'Token {token.key}'}
+
+
+def print_summary(title, budgets):
+    rows = [row for row in results if row[0] == title]
+    if not rows:
+        return
+    width = max(len(row[1]) for row in rows)
+    print(f'\n{title}')
+    print(f"{'name':<{width}} | {'queries':>7} | {'budget':>6} | {'ms':>8} | {'budget':>6}")
+    print('-' * (width + 45))
+    for _, name, queries, elapsed in rows:
+        max_queries, max_ms = budgets[name]
+        over = ' !' if elapsed > max_ms else ''
+        print(f'{name:<{width}} | {queries:>7} | {max_queries:>6} | {elapsed:>8.1f} | {max_ms:>6}{over}')
+
+
+class BudgetAssertionsMixin:
+    budgets = None
+    title = None
+
+    @classmethod
+    def tearDownClass(cls):
+        print_summary(cls.title, cls.budgets)
+        super().tearDownClass()
+
+    def check_budget(self, name, queries, elapsed, captured=()):
+        results.append((self.title, name, queries, elapsed))
+        max_queries, max_ms = self.budgets[name]
+        self.assertLessEqual(
+            queries, max_queries,
+            f'{name}: {queries} queries > budget {max_queries}\n' + '\n'.join(q['sql'] for q in captured))
+        if STRICT_TIMING:
+            self.assertLessEqual(elapsed, max_ms, f'{name}: {elapsed:.1f}ms > budget {max_ms}ms')
+
+    def measure(self, name, func):
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            result = func()
+            elapsed = (time.perf_counter() - start) * 1000
+        self.check_budget(name, len(captured), elapsed, captured.captured_queries)
+        return result
@@ -0,0 +1,53 @@
+# بودجه هر endpoint و اکشن WebSocket: (حداکثر تعداد کوئری، حداکثر زمان به میلی‌ثانیه).
+# هر تغییری که تعداد کوئری‌ها را بالا ببرد باید همین فایل را هم تغییر دهد تا در diff دیده شود.
+# زمان‌ها با هش رمز MD5 (فقط در تست) اندازه‌گیری می‌شوند و فقط با API_BUDGET_STRICT=1 assert می‌شوند؛
+# بدون آن زمان‌های بالای بودجه فقط در جدول خلاصه با ! علامت می‌خورند.
+
+SEED = {
+    'users': 200,
+    'words_per_level': 2000,
+    'pending_games': 1000,
+    'paused_games': 300,
+    'finished_games': 500,
+    'veteran_histories': 20000,
+}
+
+API_BUDGETS = {
+    'login': (3, 150),
+    'signup': (7, 150),
+    'profile': (3, 150),
+    'game_history': (2, 300),
+    'new_game': (7, 150),  # شامل lookup نسخه استخر کلمات، حداکثر یک بار در هر WORD_POOL_VERSION_CHECK_INTERVAL
+    'join_game': (6, 150),
+    'game_state': (3, 150),
+    'game_state_cached_token': (2, 150),
+    # GET شرطی با ETag معتبر: فقط lookup نسخه یا idهای صفحه، بدون سریالایزر
+    'game_state_not_modified': (1, 150),
+    'profile_not_modified': (2, 150),
+    'game_history_not_modified': (1, 150),
+    'pending_games_not_modified': (1, 150),
+    'guess': (9, 150),  # بازی، وضعیت، کلمه و بازیکنان با یک کوئری (load_game_bundle)
+    'guess_solves_word': (14, 150),  # پایان بازی مشترک (finish_game): تاریخچه با یک bulk_create
+    'hint': (8, 150),
+    'reveal_letter': (8, 150),
+    'pause_game': (6, 150),
+    'resume_game': (6, 150),
+    'guess_word': (12, 150),
+    'pending_games': (2, 300),
+    'paused_games': (2, 300),
+    'leaderboard': (1, 150),
+    'leaderboard_me': (1, 150),
+    'auth_cache_stats': (1, 150),
+}
+
+CONSUMER_BUDGETS = {
+    'connect': (2, 150),
+    'join_game': (4, 150),
+    'guess_letter': (6, 150),  # +1: ردیف‌های دفتر حساب در flush
+    'guess_word': (10, 150),
+    'request_hint': (6, 150),
+    'reveal_letter': (6, 150),
+    'pause_game': (4, 150),
+    'resume_game': (4, 150),
+    'check_timeout': (3, 150),
+}
@@ -0,0 +1,135 @@
+import os
+import tempfile
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from game.authentication import token_cache
+from game.leaderboard import GLOBAL, leaderboard
+from game.models import Game
+
+from .base import PASSWORD, BudgetAssertionsMixin, auth_header, make_game, seed_data
+from .budgets import API_BUDGETS
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+                   LEADERBOARD_BACKGROUND_LOAD=False)
+class ApiBudgetTests(BudgetAssertionsMixin, TestCase):
+    budgets = API_BUDGETS
+    title = 'REST API'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.veteran, cls.opponent = seed_data()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(**auth_header(self.veteran))
+        # نسخه کش توکن هر چند ثانیه یک بار خوانده می‌شود و جزو بودجه درخواست‌ها نیست
+        token_cache.check_version()
+
+    def call(self, name, method, url, data=None, expected_status=200):
+        response = self.measure(name, lambda: getattr(self.client, method)(url, data, format='json'))
+        self.assertEqual(response.status_code, expected_status, getattr(response, 'data', None))
+        return response
+
+    def test_login(self):
+        self.client.credentials()
+        self.call('login', 'post', '/api/login/', {'username': 'veteran', 'password': PASSWORD})
+
+    def test_signup(self):
+        self.client.credentials()
+        self.call('signup', 'post', '/api/signup/', {
+            'username': 'newcomer', 'password': PASSWORD, 'confirm_password': PASSWORD,
+            'first_name': 'New', 'last_name': 'Comer',
+        }, expected_status=201)
+
+    def test_profile(self):
+        self.call('profile', 'get', '/api/profile/')
+
+    def test_game_history(self):
+        self.call('game_history', 'get', '/api/game-history/')
+
+    def test_new_game(self):
+        self.call('new_game', 'post', '/api/new-game/', {'level': 'easy'}, expected_status=201)
+
+    def test_join_game(self):
+        game, _ = make_game(self.opponent, status='pending')
+        self.call('join_game', 'post', f'/api/join-game/{game.game_id}/')
+
+    def test_game_state(self):
+        game, _ = make_game(self.veteran, self.opponent)
+        self.call('game_state', 'get', f'/api/game/{game.game_id}/state/')
+        # درخواست دوم توکن را از کش می‌خواند
+        self.call('game_state_cached_token', 'get', f'/api/game/{game.game_id}/state/')
+
+    def revalidate(self, name, url):
+        # همان GET با ETag پاسخ قبلی؛ باید بدون بارگذاری کامل 304 برگردد
+        etag = self.client.get(url)['ETag']
+        self.client.credentials(HTTP_IF_NONE_MATCH=etag, **auth_header(self.veteran))
+        self.call(name, 'get', url, expected_status=304)
+
+    def test_not_modified(self):
+        game, _ = make_game(self.veteran, self.opponent)
+        self.revalidate('game_state_not_modified', f'/api/game/{game.game_id}/state/')
+        self.revalidate('profile_not_modified', '/api/profile/')
+        self.revalidate('game_history_not_modified', '/api/game-history/')
+        self.revalidate('pending_games_not_modified', '/api/pending-games/')
+
+    def test_auth_cache_stats(self):
+        self.veteran.is_staff = True
+        self.veteran.save(update_fields=['is_staff'])
+        self.call('auth_cache_stats', 'get', '/api/auth-cache-stats/')
+
+    def test_guess(self):
+        game, _ = make_game(self.veteran, self.opponent)
+        self.call('guess', 'post', f'/api/game/{game.game_id}/guess/', {'letter': 'P', 'position': 0})
+
+    def test_guess_solves_word(self):
+        game, _ = make_game(self.veteran, self.opponent, text='ab', masked_word='A_', solved_count=1)
+        self.call('guess_solves_word', 'post', f'/api/game/{game.game_id}/guess/', {'letter': 'B', 'position': 1})
+        self.assertEqual(Game.objects.get(pk=game.pk).status, 'finished')
+
+    def test_hint(self):
+        game, _ = make_game(self.veteran, self.opponent)
+        self.call('hint', 'post', f'/api/game/{game.game_id}/hint/')
+
+    def test_reveal_letter(self):
+        game, _ = make_game(self.veteran, self.opponent)
+        self.call('reveal_letter', 'post', f'/api/game/{game.game_id}/reveal-letter/')
+
+    def test_pause_game(self):
+        game, _ = make_game(self.veteran, self.opponent)
+        self.call('pause_game', 'post', f'/api/game/{game.game_id}/pause/')
+
+    def test_resume_game(self):
+        game, _ = make_game(self.veteran, self.opponent, status='paused')
+        self.call('resume_game', 'post', f'/api/game/{game.game_id}/resume/')
+
+    def test_guess_word(self):
+        game, _ = make_game(self.veteran, self.opponent)
+        self.call('guess_word', 'post', f'/api/game/{game.game_id}/guess-word/', {'guess': 'planet'})
+        self.assertEqual(Game.objects.get(pk=game.pk).winner, self.veteran)
+
+    def test_pending_games(self):
+        self.call('pending_games', 'get', '/api/pending-games/')
+
+    def test_paused_games(self):
+        self.call('paused_games', 'get', '/api/paused-games/')
+
+    def warm_leaderboard(self):
+        # بودجه برای حالت پایدار است؛ ساختن اولیه از دیتابیس فقط یک بار در هر پروسس انجام می‌شود
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.addCleanup(leaderboard.invalidate)
+        leaderboard.snapshot_path = os.path.join(temp_dir.name, 'leaderboard.json')
+        leaderboard.invalidate()
+        leaderboard.top(GLOBAL, 1)
+
+    def test_leaderboard(self):
+        self.warm_leaderboard()
+        self.call('leaderboard', 'get', '/api/leaderboard/?limit=100')
+
+    def test_leaderboard_me(self):
+        self.warm_leaderboard()
+        self.call('leaderboard_me', 'get', '/api/leaderboard/me/?scope=band&radius=50')
@@ -0,0 +1,68 @@
+from asgiref.sync import async_to_sync
+from channels.testing import WebsocketCommunicator
+from django.db import connections
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from GUESS.asgi import application
+from game.authentication import token_cache
+from game.middleware import token_from_scope
+from game.models import User
+
+from .base import make_game
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class TokenAuthMiddlewareTests(TestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.alice = User.objects.create_user(username='alice', password='secret123')
+        self.bob = User.objects.create_user(username='bob', password='secret123')
+        self.token = Token.objects.create(user=self.alice)
+        self.game, _ = make_game(self.alice, self.bob)
+        self.db = connections['default']
+        self.db.force_debug_cursor = True
+
+    def tearDown(self):
+        self.db.force_debug_cursor = False
+        token_cache.clear()
+
+    def connect(self, path, subprotocols=None):
+        async def run():
+            communicator = WebsocketCommunicator(application, path, subprotocols=subprotocols)
+            connected, subprotocol = await communicator.connect()
+            if connected:
+                first = await communicator.receive_json_from()
+            else:
+                first = None
+            await communicator.disconnect()
+            return connected, subprotocol, first
+        return async_to_sync(run)()
+
+    def test_token_from_scope(self):
+        self.assertEqual(token_from_scope({'query_string': b'token=abc&protocol=delta'}), ('abc', None))
+        self.assertEqual(token_from_scope({'subprotocols': ['token', 'abc'], 'query_string': b''}), ('abc', 'token'))
+        self.assertEqual(token_from_scope({'query_string': b''}), (None, None))
+
+    def test_query_string_token(self):
+        connected, _, first = self.connect(f'/ws/game/{self.game.game_id}/?token={self.token.key}')
+        self.assertTrue(connected)
+        self.assertEqual(first['event'], 'game_joined_or_reconnected')
+
+    def test_subprotocol_token_is_echoed(self):
+        connected, subprotocol, _ = self.connect(f'/ws/game/{self.game.game_id}/', ['token', self.token.key])
+        self.assertTrue(connected)
+        self.assertEqual(subprotocol, 'token')
+
+    def test_cached_token_needs_no_auth_query(self):
+        path = f'/ws/game/{self.game.game_id}/?token={self.token.key}'
+        self.connect(path)
+        self.db.queries_log.clear()
+        hits = token_cache.hits
+        self.connect(path)
+        self.assertEqual(token_cache.hits, hits + 1)
+        self.assertFalse([query for query in self.db.queries_log if 'authtoken_token' in query['sql']])
+
+    def test_invalid_or_missing_token_is_rejected(self):
+        self.assertFalse(self.connect(f'/ws/game/{self.game.game_id}/?token=nope')[0])
+        self.assertFalse(self.connect(f'/ws/game/{self.game.game_id}/')[0])
@@ -0,0 +1,88 @@
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from game.authentication import VERSION_NAME, TokenUserCache, token_cache
+from game.models import SharedVersion, User
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.user = User.objects.create_user(username='alice', password='secret123')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def tearDown(self):
+        token_cache.clear()
+
+    def test_second_request_is_served_from_cache(self):
+        hits = token_cache.hits
+        self.assertEqual(self.client.get('/api/profile/').status_code, 200)
+        with self.assertNumQueries(2):  # فقط ردیف تازه کاربر و PlayerStats، بدون Token
+            self.assertEqual(self.client.get('/api/profile/').status_code, 200)
+        self.assertEqual(token_cache.hits, hits + 1)
+
+    def test_token_deletion_invalidates(self):
+        self.client.get('/api/profile/')
+        self.token.delete()
+        self.assertEqual(self.client.get('/api/profile/').status_code, 401)
+
+    def test_deactivation_invalidates(self):
+        self.client.get('/api/profile/')
+        self.user.is_active = False
+        self.user.save(update_fields=['is_active'])
+        self.assertEqual(self.client.get('/api/profile/').status_code, 401)
+
+    def test_password_change_invalidates(self):
+        self.client.get('/api/profile/')
+        self.user.set_password('another123')
+        self.user.save()
+        self.assertEqual(len(token_cache), 0)
+
+    def test_deactivation_in_another_process_clears_cache_on_version_check(self):
+        self.client.get('/api/profile/')
+        # update() signal ندارد و کش این پروسس را باطل نمی‌کند؛ مثل ذخیره کاربر در پروسس دیگری که فقط نسخه
+        # مشترک را زیاد کرده است
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        token_cache.bump_version()
+        self.assertEqual(len(token_cache), 1)
+        token_cache._checked_at = 0.0
+        self.assertEqual(self.client.get('/api/profile/').status_code, 401)
+
+    def test_login_does_not_bump_version(self):
+        version = SharedVersion.current(VERSION_NAME)
+        self.assertEqual(self.client.post('/api/login/', {'username': 'alice', 'password': 'secret123'}).status_code,
+                         200)
+        self.assertEqual(SharedVersion.current(VERSION_NAME), version)
+
+    def test_profile_etag_sees_xp_written_elsewhere(self):
+        etag = self.client.get('/api/profile/')['ETag']
+        User.objects.filter(pk=self.user.pk).update(xp=50)  # بدون باطل کردن کش این پروسس
+        response = self.client.get('/api/profile/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response.data['xp']), (200, 50))
+
+    def test_cached_user_is_a_copy(self):
+        self.client.get('/api/profile/')
+        user, _ = token_cache.get(self.token.key)
+        user.coins = 99
+        self.assertEqual(token_cache.get(self.token.key)[0].coins, 0)
+
+
+class TokenUserCacheTests(TestCase):
+    def test_lru_eviction_and_ttl(self):
+        users = [User(pk=i, username=f'user{i}') for i in range(3)]
+        cache = TokenUserCache(maxsize=2, ttl=60)
+        cache.set('a', users[0], None)
+        cache.set('b', users[1], None)
+        cache.get('a')
+        cache.set('c', users[2], None)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a')[0].pk, 0)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+        expired = TokenUserCache(maxsize=2, ttl=0)
+        expired.set('a', users[0], None)
+        self.assertIsNone(expired.get('a'))
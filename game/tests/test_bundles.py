@@ -0,0 +1,30 @@
+from django.test import TestCase
+
+from game.bundles import load_game_bundle
+from game.models import Game, User
+
+from .base import make_game
+
+
+class GameBundleTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='secret123')
+        self.bob = User.objects.create_user(username='bob', password='secret123')
+
+    def test_single_round_trip(self):
+        game, _ = make_game(self.alice, self.bob, current=self.bob)
+        Game.objects.filter(pk=game.pk).update(winner=self.alice)
+
+        with self.assertNumQueries(1):
+            bundle = load_game_bundle(game.game_id)
+            # هیچ‌کدام از این دسترسی‌ها نباید کوئری lazy بزند
+            touched = (bundle.game.player1.username, bundle.game.player2.username, bundle.game.winner.username,
+                       bundle.state.current_player.username, bundle.word.text, bundle.state.game.game_id)
+        self.assertEqual(touched, ('alice', 'bob', 'alice', 'bob', 'planet', game.game_id))
+        self.assertIs(bundle.state.current_player, bundle.game.player2)
+
+    def test_status_filter_and_missing_game(self):
+        game, _ = make_game(self.alice, status='pending')
+        self.assertEqual(load_game_bundle(game.game_id, status='pending').game.pk, game.pk)
+        with self.assertRaises(Game.DoesNotExist):
+            load_game_bundle(game.game_id, status='active')
@@ -0,0 +1,108 @@
+from datetime import timedelta
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from game.actions import time_up_player
+from game.models import Game, GameEvent, GameHistory, GameState, User
+
+from .base import make_game
+
+ALICE, BOB = 1, 2
+
+
+class ChessClockTests(SimpleTestCase):
+    # فقط ساعت بازیکن نوبت‌دار جاری است و زمانش از clock_started_at هنگام خواندن کم می‌شود
+    def setUp(self):
+        self.alice, self.bob = User(id=ALICE, username='alice'), User(id=BOB, username='bob')
+        self.game = Game(player1=self.alice, player2=self.bob, level='easy', status='active')
+        self.t0 = timezone.now()
+        self.state = GameState(game=self.game, current_player=self.alice, player1_time=60, player2_time=60,
+                               clock_started_at=self.t0)
+
+    def at(self, seconds):
+        return self.t0 + timedelta(seconds=seconds)
+
+    def test_only_the_current_players_clock_runs(self):
+        self.assertEqual(self.state.remaining_time(self.game, ALICE, self.at(10)), 50)
+        self.assertEqual(self.state.remaining_time(self.game, BOB, self.at(10)), 60)
+        self.assertEqual(self.state.player1_time, 60)  # خواندن چیزی را تسویه نمی‌کند
+
+    def test_move_settles_the_mover_and_starts_the_opponent(self):
+        self.state.settle_clock(self.game, self.at(10))
+        self.state.current_player = self.bob
+        self.assertEqual((self.state.player1_time, self.state.clock_started_at), (50, self.at(10)))
+        self.assertEqual(self.state.remaining_time(self.game, BOB, self.at(25)), 45)
+        self.assertEqual(self.state.remaining_time(self.game, ALICE, self.at(25)), 50)
+
+    def test_pause_stops_the_clock(self):
+        fields = self.state.settle_clock(self.game, self.at(20), running=False)
+        self.assertEqual(fields, ['player1_time', 'player2_time', 'clock_started_at'])
+        self.assertIsNone(self.state.clock_started_at)
+        self.assertEqual(self.state.remaining_time(self.game, ALICE, self.at(500)), 40)
+        # تسویه دوباره ساعت متوقف چیزی کم نمی‌کند
+        self.state.settle_clock(self.game, self.at(600), running=False)
+        self.assertEqual(self.state.player1_time, 40)
+
+    def test_time_up_detects_only_the_running_clock(self):
+        session = SimpleNamespace(game=self.game, state=self.state)
+        self.assertIsNone(time_up_player(session, self.at(59)))
+        self.assertEqual(time_up_player(session, self.at(60)), self.alice)
+        self.state.settle_clock(self.game, self.at(30), running=False)
+        self.assertIsNone(time_up_player(session, self.at(3600)))
+
+
+class ChessClockViewTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='secret123')
+        self.bob = User.objects.create_user(username='bob', password='secret123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        started = timezone.now() - timedelta(seconds=10)
+        self.game, _ = make_game(self.alice, self.bob, clock_started_at=started, last_turn_time=started)
+        self.limit = Game.TIME_LIMITS['easy']
+
+    def test_guess_settles_the_movers_clock(self):
+        self.client.post(f'/api/game/{self.game.game_id}/guess/', {'letter': 'P', 'position': 0})
+        state = GameState.objects.get(game=self.game)
+        self.assertAlmostEqual(state.player1_time, self.limit - 10, delta=1)
+        self.assertEqual((state.player2_time, state.current_player), (self.limit, self.bob))
+        self.assertLess(timezone.now() - state.clock_started_at, timedelta(seconds=1))
+
+    def test_pause_settles_and_stops_the_clock(self):
+        self.assertEqual(self.client.post(f'/api/game/{self.game.game_id}/pause/').status_code, 200)
+        state = GameState.objects.get(game=self.game)
+        self.assertAlmostEqual(state.player1_time, self.limit - 10, delta=1)
+        self.assertIsNone(state.clock_started_at)
+        self.assertIsNotNone(state.paused_at)
+
+    def test_rest_move_after_the_clock_ran_out_ends_the_game(self):
+        # ساعت alice ده ثانیه پیش شروع شده و فقط پنج ثانیه وقت داشت؛ تایمر WebSocket برای این بازی اجرا نمی‌شود
+        GameState.objects.filter(game=self.game).update(player1_time=5)
+        outsider = User.objects.create_user(username='carol', password='secret123')
+        self.client.force_authenticate(outsider)
+        self.assertEqual(self.client.post(f'/api/game/{self.game.game_id}/hint/').status_code, 403)
+
+        self.client.force_authenticate(self.alice)
+        response = self.client.post(f'/api/game/{self.game.game_id}/guess/', {'letter': 'P', 'position': 0})
+        self.assertEqual((response.data['status'], response.data['reason']), ('game ended', 'player_time_up'))
+        self.assertEqual(response.data['game']['winner'], self.bob.username)
+
+        game, state = Game.objects.get(pk=self.game.pk), GameState.objects.get(game=self.game)
+        self.assertEqual((game.status, game.winner), ('finished', self.bob))
+        self.assertEqual((state.masked_word, state.player1_score, state.clock_started_at), ('______', 0, None))
+        self.assertLessEqual(state.player1_time, 0)
+        self.assertFalse(GameEvent.objects.exists())
+        self.assertEqual(set(GameHistory.objects.values_list('player', 'result')),
+                         {(self.alice.pk, 'lost'), (self.bob.pk, 'won')})
+        self.assertEqual(self.client.post(f'/api/game/{self.game.game_id}/hint/').status_code, 404)
+
+    def test_opponent_request_ends_a_game_whose_clock_ran_out(self):
+        GameState.objects.filter(game=self.game).update(player1_time=5)
+        self.client.force_authenticate(self.bob)
+        response = self.client.post(f'/api/game/{self.game.game_id}/reveal-letter/')
+        self.assertEqual(response.data['reason'], 'player_time_up')
+        self.assertEqual(Game.objects.get(pk=self.game.pk).winner, self.bob)
+        self.assertEqual(User.objects.get(pk=self.bob.pk).coins, self.bob.coins)
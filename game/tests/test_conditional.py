@@ -0,0 +1,88 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.db.models import F
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from game.models import GameHistory, User
+
+from .base import make_game
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='secret123')
+        self.bob = User.objects.create_user(username='bob', password='secret123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def get(self, url, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(url, **headers)
+
+    def test_game_state_etag_follows_state_version(self):
+        game, _ = make_game(self.alice, self.bob, clock_started_at=None)
+        url = f'/api/game/{game.game_id}/state/'
+        first = self.get(url)
+        etag = first['ETag']
+        self.assertIn('no-cache', first['Cache-Control'])
+        self.assertEqual(self.get(url, etag).status_code, 304)
+        self.assertEqual(self.get(url, etag.removeprefix('W/')).status_code, 304)
+
+        self.client.post(f'/api/game/{game.game_id}/guess/', {'letter': 'P', 'position': 0})
+        response = self.get(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['word'], 'P _ _ _ _ _')
+
+    def test_ticking_clock_does_not_change_the_etag(self):
+        # ساعت بازیکن فعلی در حال کم شدن است؛ ETag تا حرکت بعدی ثابت می‌ماند و بدنه ثانیه‌های تازه را دارد
+        game, _ = make_game(self.alice, self.bob)
+        url = f'/api/game/{game.game_id}/state/'
+        first = self.get(url)
+        later = timezone.now() + timedelta(seconds=5)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            self.assertEqual(self.get(url, first['ETag']).status_code, 304)
+            fresh = self.get(url)
+        self.assertEqual(fresh['ETag'], first['ETag'])
+        self.assertLess(fresh.data['player1_time'], first.data['player1_time'])
+        # بدنه با ساعت عوض می‌شود، پس ETag نمی‌تواند قوی باشد
+        self.assertTrue(first['ETag'].startswith('W/'))
+
+    def test_state_without_a_running_clock_has_a_strong_etag(self):
+        game, _ = make_game(self.alice, self.bob, clock_started_at=None)
+        etag = self.get(f'/api/game/{game.game_id}/state/')['ETag']
+        self.assertFalse(etag.startswith('W/'))
+
+    def test_history_etag_follows_the_rows_of_the_page(self):
+        game, _ = make_game(self.alice, self.bob, status='finished')
+        GameHistory.objects.create(game=game, player=self.alice, opponent=self.bob, level='easy', result='won')
+        url = '/api/game-history/?limit=1'
+        etag = self.get(url)['ETag']
+        self.assertEqual(self.get(url, etag).status_code, 304)
+
+        GameHistory.objects.create(game=game, player=self.alice, opponent=self.bob, level='easy', result='lose')
+        response = self.get(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_outsider_is_not_told_the_state_is_unchanged(self):
+        game, _ = make_game(self.bob, clock_started_at=None)
+        self.assertEqual(self.get(f'/api/game/{game.game_id}/state/', '*').status_code, 403)
+
+    def test_profile_etag_changes_with_coins(self):
+        etag = self.get('/api/profile/')['ETag']
+        self.assertEqual(self.get('/api/profile/', etag).status_code, 304)
+        User.objects.filter(pk=self.alice.pk).update(coins=F('coins') + 1)
+        self.assertEqual(self.get('/api/profile/', etag).status_code, 200)
+
+    def test_lobby_etag_changes_when_a_game_is_joined(self):
+        game, _ = make_game(self.bob, status='pending')
+        etag = self.get('/api/pending-games/')['ETag']
+        self.assertEqual(self.get('/api/pending-games/', etag).status_code, 304)
+        self.assertNotEqual(self.get('/api/pending-games/?limit=1', etag).status_code, 304)
+
+        self.client.post(f'/api/join-game/{game.game_id}/')
+        self.assertEqual(self.get('/api/pending-games/', etag).status_code, 200)
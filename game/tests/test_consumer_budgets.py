@@ -0,0 +1,161 @@
+import time
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.db import connections
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from game.models import Game, GameState
+from game.routing import websocket_urlpatterns
+from game.sessions import game_sessions
+
+from .base import BudgetAssertionsMixin, make_game, seed_data
+from .budgets import CONSUMER_BUDGETS
+
+application = URLRouter(websocket_urlpatterns)
+
+
+# thread نویسنده اتصال جدای خودش را دارد و داده تراکنش باز TestCase را نمی‌بیند
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+                   GAME_TURN_TIMEOUT=30, DB_WRITER_QUEUE=False)
+class ConsumerBudgetTests(BudgetAssertionsMixin, TestCase):
+    budgets = CONSUMER_BUDGETS
+    title = 'GameConsumer'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.veteran, cls.opponent = seed_data()
+
+    def setUp(self):
+        # کوئری‌های consumer از طریق sync_to_async روی همین thread و همین اتصال اجرا می‌شوند؛
+        # خود آبجکت اتصال نگه داشته می‌شود چون connection روی thread مربوط به event loop اتصال دیگری است
+        self.db = connections['default']
+        self.db.force_debug_cursor = True
+
+    def tearDown(self):
+        self.db.force_debug_cursor = False
+
+    async def measure_async(self, name, coroutine):
+        # CaptureQueriesContext روی event loop قابل استفاده نیست، پس لاگ کوئری‌های اتصال مستقیم خوانده می‌شود
+        self.db.queries_log.clear()
+        start = time.perf_counter()
+        result = await coroutine
+        # نوشتن‌های write-behind هم جزو هزینه اکشن حساب می‌شوند
+        await game_sessions.flush()
+        elapsed = (time.perf_counter() - start) * 1000
+        captured = list(self.db.queries_log)
+        self.check_budget(name, len(captured), elapsed, captured)
+        return result
+
+    async def connect(self, game, user, measure=False):
+        communicator = WebsocketCommunicator(application, f'/ws/game/{game.game_id}/')
+        communicator.scope['user'] = user
+        if measure:
+            connected, _ = await self.measure_async('connect', communicator.connect())
+        else:
+            connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        await communicator.receive_json_from()
+        return communicator
+
+    async def act(self, name, sender, message, receivers):
+        # اکشن فرستاده می‌شود و اندازه‌گیری تا رسیدن همه پیام‌های مورد انتظار ادامه دارد
+        async def run():
+            await sender.send_json_to(message)
+            return [await communicator.receive_json_from(timeout=5) for communicator in receivers]
+        return await self.measure_async(name, run())
+
+    def play(self, game, scenario, players=None):
+        players = players or (self.veteran, self.opponent)
+
+        async def run():
+            communicators = [await self.connect(game, user) for user in players]
+            try:
+                return await scenario(*communicators)
+            finally:
+                for communicator in communicators:
+                    await communicator.disconnect()
+        return async_to_sync(run)()
+
+    def test_connect(self):
+        game, _ = make_game(self.veteran, self.opponent)
+
+        async def run():
+            communicator = await self.connect(game, self.veteran, measure=True)
+            await communicator.disconnect()
+        async_to_sync(run)()
+
+    def test_join_game(self):
+        game, _ = make_game(self.veteran, status='pending')
+
+        async def scenario(first, second):
+            messages = await self.act('join_game', second, {'action': 'join_game'}, [first, second])
+            self.assertEqual(messages[0]['event'], 'player_joined')
+        self.play(game, scenario)
+        self.assertEqual(Game.objects.get(pk=game.pk).player2, self.opponent)
+
+    def test_guess_letter(self):
+        game, _ = make_game(self.veteran, self.opponent)
+
+        async def scenario(first, second):
+            messages = await self.act('guess_letter', first, {'action': 'guess_letter', 'letter': 'P', 'position': 0},
+                                      [first, second])
+            self.assertEqual(messages[1]['event'], 'letter_guessed')
+        self.play(game, scenario)
+        self.assertEqual(GameState.objects.get(game=game).masked_word, 'P_____')
+
+    def test_guess_word(self):
+        game, _ = make_game(self.veteran, self.opponent)
+
+        async def scenario(first, second):
+            messages = await self.act('guess_word', first, {'action': 'guess_word', 'word': 'planet'}, [first, second])
+            self.assertEqual(messages[1]['event'], 'game_ended')
+        self.play(game, scenario)
+        self.assertEqual(Game.objects.get(pk=game.pk).winner, self.veteran)
+
+    def test_request_hint(self):
+        game, _ = make_game(self.veteran, self.opponent)
+
+        async def scenario(first, second):
+            messages = await self.act('request_hint', first, {'action': 'request_hint'}, [first, first, second])
+            self.assertEqual(messages[0]['type'], 'hint_provided')
+        self.play(game, scenario)
+
+    def test_reveal_letter(self):
+        game, _ = make_game(self.veteran, self.opponent)
+
+        async def scenario(first, second):
+            messages = await self.act('reveal_letter', first, {'action': 'reveal_letter'}, [first, first, second])
+            self.assertEqual(messages[0]['type'], 'letter_revealed')
+        self.play(game, scenario)
+
+    def test_pause_game(self):
+        game, _ = make_game(self.veteran, self.opponent)
+
+        async def scenario(first, second):
+            messages = await self.act('pause_game', first, {'action': 'pause_game'}, [first, second])
+            self.assertEqual(messages[1]['event'], 'game_paused')
+        self.play(game, scenario)
+        self.assertEqual(Game.objects.get(pk=game.pk).status, 'paused')
+
+    def test_resume_game(self):
+        game, _ = make_game(self.veteran, self.opponent, status='paused',
+                            paused_at=timezone.now() - timedelta(minutes=5))
+
+        async def scenario(first, second):
+            messages = await self.act('resume_game', first, {'action': 'resume_game'}, [first, second])
+            self.assertEqual(messages[1]['event'], 'game_resumed')
+        self.play(game, scenario)
+        self.assertEqual(Game.objects.get(pk=game.pk).status, 'active')
+
+    def test_check_timeout(self):
+        game, _ = make_game(self.veteran, self.opponent, last_turn_time=timezone.now() - timedelta(seconds=31))
+
+        async def scenario(first, second):
+            messages = await self.act('check_timeout', second, {'action': 'check_timeout'}, [first, second])
+            self.assertEqual(messages[1]['event'], 'turn_timeout_occurred')
+        self.play(game, scenario)
+        self.assertEqual(GameState.objects.get(game=game).current_player, self.opponent)
@@ -0,0 +1,74 @@
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test import TestCase, override_settings
+
+from game.models import User
+from game.routing import websocket_urlpatterns
+
+from .base import make_game
+
+application = URLRouter(websocket_urlpatterns)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+                   GAME_TURN_TIMEOUT=30, DB_WRITER_QUEUE=False)
+class DeltaProtocolTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='secret123')
+        self.bob = User.objects.create_user(username='bob', password='secret123')
+        self.game, _ = make_game(self.alice, self.bob)
+
+    async def connect(self, user):
+        communicator = WebsocketCommunicator(application, f'/ws/game/{self.game.game_id}/?protocol=delta')
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator, await communicator.receive_json_from()
+
+    async def guess(self, sender, receivers, letter, position):
+        await sender.send_json_to({'action': 'guess_letter', 'letter': letter, 'position': position})
+        return [await communicator.receive_json_from(timeout=5) for communicator in receivers]
+
+    def test_seq_gap_is_repaired_with_a_full_snapshot(self):
+        async def run():
+            alice, joined = await self.connect(self.alice)
+            bob, _ = await self.connect(self.bob)
+            try:
+                # اولین پیام هر اتصال snapshot کامل است و seq مبنای deltaهای بعدی است
+                self.assertIn('game', joined)
+                self.assertIn('state', joined)
+                seq = joined['seq']
+
+                to_alice, to_bob = await self.guess(alice, [alice, bob], 'P', 0)
+                self.assertEqual(to_alice, to_bob)
+                self.assertEqual((to_bob['mode'], to_bob['event'], to_bob['seq']),
+                                 ('delta', 'letter_guessed', seq + 1))
+                self.assertEqual(to_bob['state']['word'], 'P _ _ _ _ _')
+                self.assertEqual(to_bob['guesses'], [{'letter': 'P', 'position': 0, 'correct': True,
+                                                      'player_id': self.alice.id}])
+                self.assertNotIn('game', to_bob)  # وضعیت بازی عوض نشده و فرستاده نمی‌شود
+
+                # پیام seq + 2 به bob نمی‌رسد (مثلاً قطع کوتاه) و پیام بعدی شکاف را نشان می‌دهد
+                await self.guess(bob, [alice, bob], 'Z', 1)
+                _, after_gap = await self.guess(alice, [alice, bob], 'L', 1)
+                self.assertEqual(after_gap['seq'], seq + 3)
+                # delta فقط حدس تازه را دارد، پس bob بدون resync حدس Z را از دست داده است
+                self.assertEqual([guess['letter'] for guess in after_gap['guesses']], ['L'])
+
+                await bob.send_json_to({'action': 'sync'})
+                snapshot = await bob.receive_json_from(timeout=5)
+                self.assertEqual((snapshot['event'], snapshot['seq']), ('snapshot', seq + 3))
+                self.assertNotIn('mode', snapshot)
+                self.assertEqual(snapshot['state']['word'], 'P L _ _ _ _')
+                self.assertEqual(snapshot['state']['current_player'], self.bob.username)
+                self.assertEqual(len(snapshot['state']['guessed_letters']), 3)
+                self.assertTrue(await alice.receive_nothing())  # sync فقط برای درخواست‌کننده است
+
+                # بعد از resync دوباره delta با seq پشت سر هم
+                _, next_delta = await self.guess(bob, [alice, bob], 'A', 2)
+                self.assertEqual((next_delta['mode'], next_delta['seq']), ('delta', seq + 4))
+            finally:
+                await alice.disconnect()
+                await bob.disconnect()
+        async_to_sync(run)()
@@ -0,0 +1,44 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from game.currency import Ledger, spend_coins
+from game.models import LedgerEntry, User
+
+from .base import make_game
+
+
+class CurrencyTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='secret123', coins=1)
+        self.bob = User.objects.create_user(username='bob', password='secret123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def test_stale_copies_cannot_spend_the_same_coin_twice(self):
+        # دو تب با کپی‌های جداگانه از کاربر که هر دو هنوز یک سکه می‌بینند
+        first, second = User.objects.get(pk=self.alice.pk), User.objects.get(pk=self.alice.pk)
+        self.assertTrue(spend_coins(first, 1))
+        self.assertFalse(spend_coins(second, 1))
+        self.assertEqual(User.objects.get(pk=self.alice.pk).coins, 0)
+
+    def test_ledger_writes_all_entries_with_one_insert(self):
+        game, _ = make_game(self.alice, self.bob)
+        ledger = Ledger(game)
+        ledger.add_coins(self.alice, 2, LedgerEntry.REASON_CORRECT_GUESS)
+        ledger.add_xp(self.bob, 50, LedgerEntry.REASON_WIN)
+        with self.assertNumQueries(1):
+            ledger.write()
+        self.assertEqual(
+            list(LedgerEntry.objects.order_by('id').values_list('user_id', 'currency', 'delta', 'reason')),
+            [(self.alice.pk, 'coins', 2, 'correct_guess'), (self.bob.pk, 'xp', 50, 'win')])
+        self.assertEqual(User.objects.values_list('coins', 'xp').get(pk=self.alice.pk), (3, 0))
+
+    def test_hint_is_charged_once_and_recorded(self):
+        game, _ = make_game(self.alice, self.bob, hints_used={str(self.alice.id): [1]})
+        self.assertEqual(self.client.post(f'/api/game/{game.game_id}/hint/').status_code, 200)
+        response = self.client.post(f'/api/game/{game.game_id}/hint/')
+        self.assertEqual(response.status_code, 400)
+
+        self.assertEqual(User.objects.get(pk=self.alice.pk).coins, 0)
+        self.assertEqual(list(LedgerEntry.objects.values_list('delta', 'reason', 'game_id')),
+                         [(-1, 'hint', game.pk)])
@@ -0,0 +1,103 @@
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from game import engine
+from game.engine import EngineState, MoveError
+from game.matchmaking import create_matched_game
+from game.models import GameState, User, Word
+from game.word_pool import word_pool
+
+from .base import make_game
+
+ALICE, BOB = 1, 2
+
+
+def board(word='AB', **fields):
+    return EngineState(word, ALICE, BOB, ALICE, **fields)
+
+
+class GameEngineTests(SimpleTestCase):
+    def test_letter_scoring_turns_and_end_by_score(self):
+        state = board()
+        result = engine.guess_letter(state, ALICE, 'a', '0')
+        self.assertEqual((result.correct, result.score_delta, result.coins, result.outcome), (True, 20, 1, None))
+        self.assertEqual((state.masked, state.current), ('A_', BOB))
+
+        result = engine.guess_letter(state, BOB, 'Z', 1)
+        self.assertEqual((result.correct, result.score_delta, result.coins), (False, -20, 0))
+        result = engine.guess_letter(state, ALICE, 'B', 1)
+        self.assertEqual(result.outcome, engine.Outcome(ALICE, engine.WON, engine.LOST, engine.WIN_XP))
+        self.assertEqual((state.score1, state.score2, state.finished), (40, -20, True))
+
+    def test_equal_scores_are_a_draw(self):
+        state = board(masked='A_', score1=20, score2=40)
+        outcome = engine.guess_letter(state, ALICE, 'B', 1).outcome
+        self.assertEqual(outcome, engine.Outcome(None, engine.DRAW, engine.DRAW, 0))
+
+    def test_word_guess_scores(self):
+        state = board()
+        self.assertEqual(engine.guess_word(state, ALICE, 'ab').outcome.winner, ALICE)
+        self.assertEqual((state.score1, state.score2), (100, 0))
+
+        state = board()
+        self.assertEqual(engine.guess_word(state, ALICE, 'BA').outcome.winner, BOB)
+        self.assertEqual((state.score1, state.score2), (0, 50))
+
+    def test_rejected_moves_leave_state_untouched(self):
+        state = board()
+        for player, letter, position, code in ((BOB, 'A', 0, MoveError.NOT_YOUR_TURN),
+                                               (3, 'A', 0, MoveError.NOT_PLAYER),
+                                               (ALICE, '', 0, MoveError.MISSING_MOVE),
+                                               (ALICE, 'A', 'x', MoveError.BAD_POSITION),
+                                               (ALICE, 'A', 2, MoveError.INVALID_POSITION),
+                                               (ALICE, '1', 0, MoveError.INVALID_LETTER)):
+            with self.assertRaises(MoveError) as raised:
+                engine.guess_letter(state, player, letter, position)
+            self.assertEqual(raised.exception.code, code)
+        self.assertEqual((state.masked, state.score1, state.current), ('__', 0, ALICE))
+
+    def test_hints_are_numbered_from_one_without_touching_the_input(self):
+        hints = {str(ALICE): []}
+        state = board(hints=hints)
+        self.assertEqual([engine.take_hint(state, ALICE).number for _ in range(3)], [1, 2, 3])
+        with self.assertRaises(MoveError):
+            engine.take_hint(state, ALICE)
+        self.assertEqual((hints, state.hints[str(ALICE)]), ({str(ALICE): []}, [1, 2, 3]))
+
+    def test_reveal_skips_solved_and_already_revealed_positions(self):
+        state = board('PLANET', masked='P_____', revealed={str(ALICE): [1, 2]})
+        self.assertEqual(engine.reveal_candidates(state, ALICE), [3, 4, 5])
+        result = engine.reveal_letter(state, ALICE, choose=min)
+        self.assertEqual(result, engine.RevealResult(3, 'N', engine.REVEAL_COST))
+        self.assertEqual(state.revealed[str(ALICE)], [1, 2, 3])
+
+    def test_time_up_ignores_scores(self):
+        state = board(score1=100)
+        self.assertEqual(engine.time_up(state, ALICE).winner, BOB)
+
+
+class EngineAdapterTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='secret123', coins=5)
+        self.bob = User.objects.create_user(username='bob', password='secret123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def test_rest_hint_and_reveal_follow_engine_rules(self):
+        game, _ = make_game(self.alice, self.bob, hints_used={str(self.alice.id): []}, masked_word='P_____',
+                            solved_count=1)
+        self.assertEqual(self.client.post(f'/api/game/{game.game_id}/hint/').data, {'hint': 'h1'})
+        response = self.client.post(f'/api/game/{game.game_id}/reveal-letter/')
+
+        state = GameState.objects.get(game=game)
+        self.assertEqual(state.hints_used[str(self.alice.id)], [1])
+        # مثل مسیر WebSocket، خانه‌های نمایش‌داده‌شده با اندیس ذخیره می‌شوند
+        self.assertEqual(state.revealed_letters[str(self.alice.id)], [response.data['position']])
+        self.assertNotEqual(response.data['position'], 0)
+
+    def test_matchmade_players_start_from_the_first_hint(self):
+        Word.objects.create(text='planet', level='easy', hint1='h1', hint2='h2', hint3='h3')
+        word_pool.invalidate()
+        self.addCleanup(word_pool.invalidate)
+        game = create_matched_game('easy', self.alice.id, self.bob.id)
+        self.assertEqual(self.client.post(f'/api/game/{game.game_id}/hint/').data, {'hint': 'h1'})
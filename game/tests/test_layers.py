@@ -0,0 +1,198 @@
+import asyncio
+import socket
+import time
+import unittest
+from urllib.parse import urlsplit
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from game.layers import HashRing, ShardedRedisChannelLayer
+
+
+class FakeRedis:
+    # فقط دستوراتی که group_add/group_discard/group_send لایه استفاده می‌کنند؛ هر فراخوانی ثبت می‌شود
+    def __init__(self):
+        self.groups = {}
+        self.calls = []
+
+    async def zadd(self, key, mapping):
+        self.calls.append('zadd')
+        self.groups.setdefault(key, {}).update(mapping)
+
+    async def expire(self, key, seconds):
+        self.calls.append('expire')
+
+    async def zrem(self, key, member):
+        self.calls.append('zrem')
+        self.groups.get(key, {}).pop(member, None)
+
+    async def zremrangebyscore(self, key, min, max):
+        self.calls.append('zremrangebyscore')
+
+    async def zrange(self, key, start, end):
+        self.calls.append('zrange')
+        return [member.encode() for member in self.groups.get(key, {})]
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    async def eval(self, script, numkeys, *args):
+        self.calls.append(('eval', list(args[:numkeys])))
+        return 0
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+
+    def zremrangebyscore(self, key, min, max):
+        pass
+
+    async def execute(self):
+        self.redis.calls.append('pipeline')
+
+
+def make_layer(hosts=1):
+    layer = ShardedRedisChannelLayer(hosts=[f'redis://shard{index}:6379/0' for index in range(hosts)])
+    shards = [FakeRedis() for _ in range(hosts)]
+    layer.connection = lambda index: shards[index]
+    return layer, shards
+
+
+class HashRingTests(SimpleTestCase):
+    def test_groups_spread_and_mostly_stay_when_a_shard_is_added(self):
+        groups = [f'game_{index}' for index in range(2000)]
+        three = HashRing(['a', 'b', 'c'])
+        four = HashRing(['a', 'b', 'c', 'd'])
+        counts = [0, 0, 0]
+        for group in groups:
+            counts[three.node(group)] += 1
+        self.assertTrue(all(count > 400 for count in counts), counts)
+        moved = sum(1 for group in groups if three.node(group) != four.node(group))
+        # فقط حدود یک چهارم گروه‌ها باید به سرور جدید منتقل شوند، نه همه‌شان
+        self.assertLess(moved, len(groups) * 0.35)
+
+
+class ShardedLayerTests(SimpleTestCase):
+    def test_local_channel_send_and_receive_hash_to_same_shard(self):
+        layer, _ = make_layer(hosts=5)
+        channel = async_to_sync(layer.new_channel)()
+        self.assertEqual(layer.consistent_hash(channel), layer.consistent_hash(layer.non_local_name(channel)))
+
+    def test_group_send_between_local_channels_skips_redis_delivery(self):
+        layer, (redis,) = make_layer()
+
+        async def run():
+            first, second = await layer.new_channel(), await layer.new_channel()
+            await layer.group_add('game_1', first)
+            await layer.group_add('game_1', second)
+            redis.calls.clear()
+            await layer.group_send('game_1', {'type': 'game_update', 'n': 1})
+            return [await layer.receive(first), await layer.receive(second)]
+
+        messages = async_to_sync(run)()
+        self.assertEqual(messages, [{'type': 'game_update', 'n': 1}] * 2)
+        self.assertEqual(layer.local_deliveries, 2)
+        self.assertFalse([call for call in redis.calls if call[0] == 'eval'])
+
+    def test_group_send_forwards_only_remote_members(self):
+        layer, (redis,) = make_layer()
+        other, _ = make_layer()
+
+        async def run():
+            local, remote = await layer.new_channel(), await other.new_channel()
+            await layer.group_add('game_1', local)
+            await layer.group_add('game_1', remote)
+            redis.calls.clear()
+            await layer.group_send('game_1', {'type': 'game_update'})
+            return remote
+
+        remote = async_to_sync(run)()
+        evals = [call for call in redis.calls if call[0] == 'eval']
+        self.assertEqual(evals, [('eval', [layer.prefix + other.non_local_name(remote)])])
+        self.assertEqual(layer.local_deliveries, 1)
+
+    def test_send_to_receiving_local_channel_bypasses_redis(self):
+        layer, (redis,) = make_layer()
+
+        async def run():
+            channel = await layer.new_channel()
+            layer.receivers[channel] = time.monotonic()
+            await layer.send(channel, {'type': 'match_found'})
+            return await layer.receive(channel)
+
+        self.assertEqual(async_to_sync(run)(), {'type': 'match_found'})
+        self.assertEqual(redis.calls, [])
+
+    def test_channel_with_receive_in_flight_is_never_pruned(self):
+        layer, _ = make_layer()
+
+        async def run():
+            waiting, closed = await layer.new_channel(), await layer.new_channel()
+            receive = asyncio.ensure_future(layer.receive(waiting))
+            await asyncio.sleep(0)
+            # هر دو کانال قدیمی‌تر از expiry به نظر می‌رسند ولی فقط یکی receive در جریان دارد
+            layer.receivers[waiting] = layer.receivers[closed] = time.monotonic() - layer.expiry - 1
+            layer._last_prune = 0
+            await layer.new_channel()
+            pruned = waiting not in layer.receivers, closed not in layer.receivers
+            await layer.send(waiting, {'type': 'match_found'})
+            return pruned, await asyncio.wait_for(receive, 1)
+
+        pruned, message = async_to_sync(run)()
+        self.assertEqual(pruned, (False, True))
+        self.assertEqual(message, {'type': 'match_found'})
+        self.assertEqual(layer.local_deliveries, 1)
+        self.assertFalse(layer.inflight)
+
+    def test_local_group_membership_of_dead_consumer_expires(self):
+        layer, _ = make_layer()
+
+        async def run():
+            crashed, stale, alive = await layer.new_channel(), await layer.new_channel(), await layer.new_channel()
+            for channel in (crashed, stale, alive):
+                await layer.group_add('game_1', channel)
+            # consumer اول بدون group_discard بسته شده و عضویت دومی از group_expiry گذشته است
+            layer.receivers[crashed] = time.monotonic() - layer.expiry - 1
+            layer.local_groups['game_1'][stale] = time.monotonic() - layer.group_expiry - 1
+            layer._last_prune = 0
+            await layer.new_channel()
+            members = set(layer.local_groups['game_1'])
+            layer.local_groups['game_1'][alive] = time.monotonic() - layer.group_expiry - 1
+            await layer.group_send('game_1', {'type': 'game_update'})
+            return members, alive
+
+        members, alive = async_to_sync(run)()
+        self.assertEqual(members, {alive})
+        self.assertNotIn('game_1', layer.local_groups)
+        self.assertEqual(layer.local_deliveries, 0)
+
+
+def local_redis_available():
+    url = urlsplit(settings.CHANNEL_REDIS_LOCAL_URL)
+    try:
+        socket.create_connection((url.hostname, url.port or 6379), timeout=0.2).close()
+        return True
+    except OSError:
+        return False
+
+
+@unittest.skipUnless(local_redis_available(), 'Redis محلی تست (CHANNEL_REDIS_LOCAL_URL) در دسترس نیست')
+class LocalRedisLayerTests(SimpleTestCase):
+    def test_group_send_reaches_channel_of_another_worker(self):
+        config = {'hosts': [settings.CHANNEL_REDIS_LOCAL_URL], 'prefix': 'guess-test'}
+        worker1, worker2 = ShardedRedisChannelLayer(**config), ShardedRedisChannelLayer(**config)
+
+        async def run():
+            local, remote = await worker1.new_channel(), await worker2.new_channel()
+            await worker1.group_add('game_layer_test', local)
+            await worker1.group_add('game_layer_test', remote)
+            await worker1.group_send('game_layer_test', {'type': 'game_update'})
+            received = [await worker1.receive(local), await asyncio.wait_for(worker2.receive(remote), 5)]
+            await worker1.flush()
+            await worker2.flush()
+            return received
+
+        self.assertEqual(async_to_sync(run)(), [{'type': 'game_update'}] * 2)
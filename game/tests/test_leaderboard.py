@@ -0,0 +1,127 @@
+import os
+import tempfile
+import threading
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from game.leaderboard import (GLOBAL, Leaderboard, LeaderboardLoading, RankedSet, band_board, leaderboard,
+                              level_board)
+from game.models import User
+
+from .base import make_game
+
+
+class RankedSetTests(SimpleTestCase):
+    def test_rank_top_and_around(self):
+        board = RankedSet({1: 100, 2: 300, 3: 200, 4: 200})
+        self.assertEqual(board.top(2), [(1, 2, 300), (2, 3, 200)])
+        self.assertEqual([board.rank(user_id) for user_id in (1, 2, 3, 4)], [4, 1, 2, 3])
+        self.assertEqual([user_id for _, user_id, _ in board.around(3, 1)], [2, 3, 4])
+        self.assertEqual(board.around(5, 1), [])
+
+    def test_updates_keep_order(self):
+        board = RankedSet({1: 100, 2: 300})
+        board.add(1, 250)
+        self.assertEqual(board.rank(1), 1)
+        board.discard(2)
+        self.assertEqual(len(board), 1)
+        self.assertIsNone(board.rank(2))
+
+
+@override_settings(LEADERBOARD_BACKGROUND_LOAD=False)
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        leaderboard.snapshot_path = os.path.join(self.temp_dir.name, 'leaderboard.json')
+        leaderboard.invalidate()
+        self.alice = User.objects.create_user(username='alice', password='secret123', xp=390)
+        self.bob = User.objects.create_user(username='bob', password='secret123', xp=420)
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def tearDown(self):
+        leaderboard.invalidate()
+        self.temp_dir.cleanup()
+
+    def test_win_updates_global_band_and_level_boards(self):
+        self.assertEqual(leaderboard.rank(GLOBAL, self.alice), (2, 2))
+        game, _ = make_game(self.alice, self.bob)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/game/{game.game_id}/guess-word/', {'guess': 'planet'})
+
+        self.assertEqual(leaderboard.rank(GLOBAL, self.alice), (1, 2))
+        # با ۴۴۰ XP کاربر از سطح ۱ به سطح ۲ رفته است
+        self.assertEqual(leaderboard.rank(band_board(1), self.alice)[0], None)
+        self.assertEqual(leaderboard.top(band_board(2), 5)[0], {'rank': 1, 'username': 'alice', 'xp': 440})
+        self.assertEqual(leaderboard.top(level_board('easy'), 5), [{'rank': 1, 'username': 'alice', 'xp': 50}])
+
+    def test_endpoints(self):
+        response = self.client.get('/api/leaderboard/', {'limit': 1})
+        self.assertEqual(response.data['results'], [{'rank': 1, 'username': 'bob', 'xp': 420}])
+        response = self.client.get('/api/leaderboard/me/', {'radius': 1})
+        self.assertEqual((response.data['rank'], response.data['total']), (2, 2))
+        self.assertEqual([row['username'] for row in response.data['around']], ['bob', 'alice'])
+        self.assertEqual(self.client.get('/api/leaderboard/', {'scope': 'nope'}).status_code, 400)
+
+    def test_rebuild_command_snapshot_is_loaded_and_replayed(self):
+        call_command('rebuild_leaderboard', stdout=open(os.devnull, 'w'))
+        game, _ = make_game(self.bob, self.alice, current=self.alice)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/game/{game.game_id}/guess-word/', {'guess': 'planet'})
+
+        # پروسسی که snapshot را می‌خواند باید برد ثبت‌شده بعد از آن را هم ببیند
+        fresh = Leaderboard(snapshot_path=leaderboard.snapshot_path)
+        self.assertEqual(fresh.top(GLOBAL, 1), [{'rank': 1, 'username': 'alice', 'xp': 440}])
+        self.assertEqual(fresh.top(level_board('easy'), 1), [{'rank': 1, 'username': 'alice', 'xp': 50}])
+
+    def test_rebuild_in_another_process_reaches_running_boards(self):
+        # نمونه جدا مثل سروری که از قبل در حال اجراست؛ دستور rebuild فقط از راه دیتابیس به آن می‌رسد
+        running = Leaderboard(snapshot_path=leaderboard.snapshot_path, version_check_interval=0)
+        self.assertEqual(running.top(GLOBAL, 1)[0]['username'], 'bob')
+        User.objects.filter(pk=self.alice.pk).update(xp=900)
+
+        call_command('rebuild_leaderboard', stdout=open(os.devnull, 'w'))
+        self.assertEqual(running.top(GLOBAL, 1), [{'rank': 1, 'username': 'alice', 'xp': 900}])
+
+    def test_award_for_user_missing_from_board_starts_from_user_xp(self):
+        leaderboard.top(GLOBAL, 1)
+        leaderboard.remove(self.alice.pk)  # مثل کاربری که بعد از بار شدن جدول این پروسس ساخته شده
+        User.objects.filter(pk=self.alice.pk).update(xp=440)
+        leaderboard.award(self.alice.pk, 'alice', 50, 'easy')
+        self.assertEqual(leaderboard.top(GLOBAL, 1), [{'rank': 1, 'username': 'alice', 'xp': 440}])
+        self.assertEqual(leaderboard.top(band_board(2), 5)[0]['username'], 'alice')
+
+    def test_processes_do_not_write_snapshots(self):
+        leaderboard.top(GLOBAL, 1)
+        leaderboard.award(self.bob.pk, 'bob', 50, 'easy')
+        self.assertIsNone(leaderboard.read_snapshot())
+
+    def test_endpoint_answers_503_while_loading(self):
+        with mock.patch.object(leaderboard, 'top', side_effect=LeaderboardLoading):
+            response = self.client.get('/api/leaderboard/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+
+
+class BackgroundLoadTests(SimpleTestCase):
+    def test_first_read_loads_off_the_request_lock(self):
+        board = Leaderboard(snapshot_path=os.devnull, version_check_interval=0, load_timeout=0)
+        release = threading.Event()
+
+        def slow_load():
+            release.wait(5)
+            return {GLOBAL: RankedSet({1: 100})}, {1: 'alice'}
+
+        with mock.patch.object(board, '_shared_version', return_value=1), \
+                mock.patch.object(board, '_load', side_effect=slow_load):
+            with self.assertRaises(LeaderboardLoading):
+                board.top(GLOBAL, 1)
+            # قفل جدول در طول بارگذاری آزاد است
+            self.assertTrue(board._lock.acquire(timeout=1))
+            board._lock.release()
+            release.set()
+            self.assertTrue(board._loaded.wait(5))
+            self.assertEqual(board.top(GLOBAL, 1), [{'rank': 1, 'username': 'alice', 'xp': 100}])
@@ -0,0 +1,128 @@
+import asyncio
+import io
+import json
+import logging
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from game import timers
+from game.log import BackgroundHandler, StructuredFormatter, bind, get_logger, log_context
+from game.models import User, Word
+from game.sessions import SessionRegistry
+from game.word_pool import word_pool
+
+
+class Collect(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class EventLoggerTests(SimpleTestCase):
+    def setUp(self):
+        self.logger = logging.getLogger('game.tests.events')
+        self.handler = Collect()
+        self.logger.addHandler(self.handler)
+        self.logger.propagate = False
+        self.addCleanup(self.logger.removeHandler, self.handler)
+        self.addCleanup(setattr, self.logger, 'propagate', True)
+        self.addCleanup(self.logger.setLevel, logging.NOTSET)
+        self.log = get_logger('game.tests.events')
+
+    def test_disabled_debug_creates_no_record(self):
+        self.logger.setLevel(logging.INFO)
+        self.log.debug('noisy', value=1)
+        self.log.info('kept', value=2)
+        self.assertEqual([record.getMessage() for record in self.handler.records], ['kept'])
+
+    @override_settings(LOG_SAMPLE_RATES={'ws.message': 0.0, 'half': 1.0})
+    def test_sampled_events(self):
+        self.logger.setLevel(logging.DEBUG)
+        for _ in range(20):
+            self.log.debug('ws.message')
+        self.log.debug('half')
+        self.assertEqual([record.getMessage() for record in self.handler.records], ['half'])
+        self.assertEqual(self.handler.records[0].event_fields, {'sample_rate': 1.0})
+
+    def test_background_handler_writes_json_with_context(self):
+        stream = io.StringIO()
+        handler = BackgroundHandler(stream=stream)
+        handler.setFormatter(StructuredFormatter())
+        self.logger.setLevel(logging.INFO)
+        self.logger.addHandler(handler)
+        try:
+            with bind(game_id='g1', user_id=7):
+                self.log.info('game.created', level='easy')
+        finally:
+            self.logger.removeHandler(handler)
+            handler.close()  # صف تا آخر نوشته می‌شود
+        line = json.loads(stream.getvalue())
+        self.assertEqual((line['severity'], line['event'], line['game_id'], line['user_id'], line['level']),
+                         ('info', 'game.created', 'g1', 7, 'easy'))
+
+
+class RequestContextTests(TestCase):
+    def test_new_game_events_carry_game_and_user(self):
+        user = User.objects.create_user(username='alice', password='secret123')
+        Word.objects.create(text='python', level='easy', hint1='h1', hint2='h2', hint3='h3')
+        word_pool.invalidate()
+        self.addCleanup(word_pool.invalidate)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+
+        with self.assertLogs('game.views', level='DEBUG') as captured:
+            response = client.post('/api/new-game/', {'level': 'easy'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        created = [record for record in captured.records if record.getMessage() == 'game.created'][0]
+        self.assertEqual(created.event_context, {'user_id': user.pk, 'game_id': str(response.data['game_id'])})
+
+
+class BackgroundTaskContextTests(SimpleTestCase):
+    def test_second_games_timer_does_not_inherit_the_first_callers_context(self):
+        wheel = timers.TimerWheel(tick=0.01)
+        seen = {}
+
+        def has_connections(game_id):
+            # on_turn_timeout بدون session محلی اینجا می‌پرسد و برمی‌گردد
+            seen[game_id] = log_context.get()
+            return False
+
+        async def run():
+            # اولین تایمر (که task چرخ را راه می‌اندازد) داخل پیام بازی g1 ساخته می‌شود
+            with bind(game_id='g1', user_id=1):
+                wheel.schedule('g1', 0.01, lambda: timers.on_turn_timeout('g1'))
+            with bind(game_id='g2', user_id=2):
+                wheel.schedule('g2', 0.02, lambda: timers.on_turn_timeout('g2'))
+            await asyncio.sleep(0.1)
+            wheel._task.cancel()
+
+        with mock.patch.object(timers.game_sessions, 'peek', return_value=None), \
+                mock.patch.object(timers.game_sessions, 'has_connections', side_effect=has_connections):
+            async_to_sync(run)()
+        self.assertEqual(seen, {'g1': {'game_id': 'g1'}, 'g2': {'game_id': 'g2'}})
+
+    def test_session_flusher_starts_with_an_empty_context(self):
+        registry = SessionRegistry(flush_interval=0.01)
+        seen = []
+
+        async def flush(*sessions):
+            seen.append(log_context.get())
+            return []
+
+        async def run():
+            with bind(game_id='g1', user_id=1):
+                registry._ensure_flusher()
+            await asyncio.sleep(0.05)
+            registry._flusher.cancel()
+
+        with mock.patch.object(registry, 'flush', side_effect=flush):
+            async_to_sync(run)()
+        self.assertTrue(seen)
+        self.assertEqual(seen, [None] * len(seen))
@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase
+
+from game.matchmaking import LocalMatchmaker
+
+
+def player(user_id, xp):
+    return SimpleNamespace(id=user_id, username=f'user{user_id}', xp=xp)
+
+
+class LocalMatchmakerTests(SimpleTestCase):
+    def setUp(self):
+        self.matchmaker = LocalMatchmaker(xp_window=100, widen_per_second=50, max_xp_window=1000, interval=1.0)
+
+    def test_pairs_closest_xp_and_first_in_queue_plays_first(self):
+        mm = self.matchmaker
+        mm.add('a', player(1, 1000), 'easy')
+        mm.add('b', player(2, 1090), 'easy')
+        late = mm.add('c', player(3, 1040), 'easy')
+        first, second = mm.match(late)
+        self.assertEqual((first.channel_name, second.channel_name), ('a', 'c'))
+        self.assertEqual(list(mm._tickets), ['b'])
+
+    def test_no_match_outside_the_window_until_it_widens(self):
+        mm = self.matchmaker
+        waiting = mm.add('a', player(1, 1000), 'easy')
+        ticket = mm.add('b', player(2, 1240), 'easy')
+        self.assertIsNone(mm.match(ticket, now=waiting.enqueued_at))
+        # بعد از ۳ ثانیه پنجره هر دو نزدیک ۲۵۰ شده است
+        pairs = mm.match_waiting(now=waiting.enqueued_at + 3)
+        self.assertEqual([(a.channel_name, b.channel_name) for a, b in pairs], [('a', 'b')])
+        self.assertEqual(len(mm), 0)
+
+    def test_levels_are_separate_queues(self):
+        mm = self.matchmaker
+        mm.add('a', player(1, 1000), 'easy')
+        ticket = mm.add('b', player(2, 1000), 'hard')
+        self.assertIsNone(mm.match(ticket))
+        self.assertEqual(mm.match_waiting(), [])
+        self.assertEqual(len(mm), 2)
+
+    def test_cancelled_ticket_is_not_matched(self):
+        mm = self.matchmaker
+        mm.add('a', player(1, 1000), 'easy')
+        self.assertTrue(mm.dequeue('a'))
+        self.assertFalse(mm.dequeue('a'))
+        self.assertIsNone(mm.match(mm.add('b', player(2, 1000), 'easy')))
+        self.assertEqual(mm._queues['easy'], [mm._tickets['b'].key])
+
+    def test_same_user_is_never_paired_with_itself(self):
+        mm = self.matchmaker
+        mm.add('tab1', player(1, 1000), 'easy')
+        self.assertIsNone(mm.match(mm.add('tab2', player(1, 1000), 'easy')))
+
+    def test_requeue_on_same_channel_replaces_the_ticket(self):
+        mm = self.matchmaker
+        mm.add('a', player(1, 1000), 'easy')
+        mm.add('a', player(1, 1000), 'medium')
+        self.assertEqual((len(mm), mm._queues['easy']), (1, []))
+        self.assertIsNotNone(mm.match(mm.add('b', player(2, 1000), 'medium')))
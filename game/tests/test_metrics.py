@@ -0,0 +1,107 @@
+import re
+import threading
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from game import metrics
+from game.models import User
+from game.routing import websocket_urlpatterns
+
+from .base import make_game
+
+
+def sample(text, metric, **labels):
+    # مقدار یک سری از خروجی متنی Prometheus؛ اگر سری وجود نداشته باشد صفر
+    label_pattern = ','.join(f'{key}="{value}"' for key, value in labels.items())
+    pattern = re.escape(metric) + (r'\{' + re.escape(label_pattern) + r'\}' if labels else '') + r' (\S+)$'
+    match = re.search(pattern, text, re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+
+class RegistryTests(SimpleTestCase):
+    def test_shards_from_finished_threads_are_merged(self):
+        registry = metrics.Registry()
+        counter = registry.counter('jobs_total', 'Jobs.', ('kind',))
+        histogram = registry.histogram('job_seconds', 'Job time.', buckets=(0.1, 1.0))
+
+        def work():
+            for _ in range(10):
+                counter.inc('a')
+            histogram.observe(0.05)
+            histogram.observe(5)
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counter.inc('b', amount=2)
+
+        text = registry.render()
+        self.assertEqual(sample(text, 'jobs_total', kind='a'), 40)
+        self.assertEqual(sample(text, 'jobs_total', kind='b'), 2)
+        self.assertEqual(sample(text, 'job_seconds_bucket', le='0.1'), 4)
+        self.assertEqual(sample(text, 'job_seconds_bucket', le='1.0'), 4)
+        self.assertEqual(sample(text, 'job_seconds_bucket', le='+Inf'), 8)
+        self.assertEqual(sample(text, 'job_seconds_count'), 8)
+
+    def test_disabled_registry_records_nothing(self):
+        registry = metrics.Registry(enabled=False)
+        registry.counter('jobs_total', 'Jobs.').inc()
+        self.assertNotIn('jobs_total 1', registry.render())
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+                   DB_WRITER_QUEUE=False)
+class EndpointTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='secret123')
+        self.bob = User.objects.create_user(username='bob', password='secret123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def scrape(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        return response.content.decode()
+
+    def test_api_requests_are_counted_with_queries(self):
+        before = self.scrape()
+        self.client.get('/api/profile/')
+        after = self.scrape()
+        self.assertEqual(sample(after, 'guess_http_requests_total', view='profile', method='GET', status='200')
+                         - sample(before, 'guess_http_requests_total', view='profile', method='GET', status='200'), 1)
+        self.assertEqual(sample(after, 'guess_db_queries_sum', source='http', name='profile')
+                         - sample(before, 'guess_db_queries_sum', source='http', name='profile'), 2)
+
+    def test_consumer_actions_group_send_and_connections(self):
+        game, _ = make_game(self.alice, self.bob)
+        before = self.scrape()
+
+        async def run():
+            communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/game/{game.game_id}/')
+            communicator.scope['user'] = self.alice
+            await communicator.connect()
+            await communicator.receive_json_from()
+            connected = await database_sync_to_async(metrics.registry.render)()
+            await communicator.send_json_to({'action': 'guess_letter', 'letter': 'P', 'position': 0})
+            await communicator.receive_json_from()
+            await communicator.disconnect()
+            return connected
+        during = async_to_sync(run)()
+        after = self.scrape()
+
+        self.assertEqual(sample(during, 'guess_ws_connections', consumer='game')
+                         - sample(before, 'guess_ws_connections', consumer='game'), 1)
+        self.assertEqual(sample(after, 'guess_ws_connections', consumer='game'),
+                         sample(before, 'guess_ws_connections', consumer='game'))
+        self.assertEqual(sample(after, 'guess_ws_messages_total', action='guess_letter', outcome='ok')
+                         - sample(before, 'guess_ws_messages_total', action='guess_letter', outcome='ok'), 1)
+        self.assertEqual(sample(after, 'guess_group_send_duration_seconds_count')
+                         - sample(before, 'guess_group_send_duration_seconds_count'), 1)
+        self.assertIn('guess_active_games ', after)
@@ -0,0 +1,75 @@
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+
+class DataMigrationTests(TransactionTestCase):
+    # وضعیت‌هایی با guessed_letters قدیمی در 0002 ساخته و بعد 0003 (masked_word) و 0004 (GameEvent) اجرا می‌شوند
+    before = [('game', '0002_alter_game_game_id_alter_gamehistory_result_and_more')]
+    after_masked_word = [('game', '0003_gamestate_masked_word')]
+    after_events = [('game', '0004_gameevent')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def setUp(self):
+        apps = self.migrate(self.before)
+        self.addCleanup(lambda: self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes()))
+        User = apps.get_model('game', 'User')
+        Word = apps.get_model('game', 'Word')
+        Game = apps.get_model('game', 'Game')
+        GameState = apps.get_model('game', 'GameState')
+
+        self.alice = User.objects.create(username='alice', first_name='a', last_name='a').pk
+        self.bob = User.objects.create(username='bob', first_name='b', last_name='b').pk
+        word = Word.objects.create(text='planet', level='easy', hint1='h1', hint2='h2', hint3='h3')
+
+        def state(guesses):
+            game = Game.objects.create(player1_id=self.alice, player2_id=self.bob, level='easy', status='active')
+            return GameState.objects.create(game=game, word=word, guessed_letters=guesses, player1_time=300,
+                                            player2_time=300).pk
+
+        self.played = state([
+            {'letter': 'p', 'position': 0, 'correct': True, 'player_id': self.alice},
+            {'letter': 'X', 'position': 1, 'correct': False, 'player_id': self.bob},
+            {'letter': 'N', 'position': '3', 'correct': True, 'player_id': self.alice},
+            {'letter': 'E', 'position': 9, 'correct': True, 'player_id': self.bob},  # خارج از کلمه
+            'garbage',
+        ])
+        self.fresh = state([])
+        self.legacy_dict = state({})  # پیش‌فرض قدیمی 0001
+
+    def test_masked_word_backfill(self):
+        GameState = self.migrate(self.after_masked_word).get_model('game', 'GameState')
+        rows = dict(GameState.objects.values_list('pk', 'masked_word'))
+        self.assertEqual(rows, {self.played: 'P__N__', self.fresh: '______', self.legacy_dict: '______'})
+        self.assertEqual(GameState.objects.get(pk=self.played).solved_count, 2)
+
+    def test_guessed_letters_become_events(self):
+        apps = self.migrate(self.after_events)
+        GameState = apps.get_model('game', 'GameState')
+        GameEvent = apps.get_model('game', 'GameEvent')
+        events = list(GameEvent.objects.filter(game__game_state__pk=self.played).order_by('seq').values_list(
+            'seq', 'kind', 'player_id', 'position', 'letter', 'correct'))
+        self.assertEqual(events, [
+            (1, 'guess', self.alice, 0, 'P', True),
+            (2, 'guess', self.bob, 1, 'X', False),
+            (3, 'guess', self.alice, 3, 'N', True),
+            (4, 'guess', self.bob, 9, 'E', True),
+        ])
+        self.assertEqual(dict(GameState.objects.values_list('pk', 'event_seq')),
+                         {self.played: 4, self.fresh: 0, self.legacy_dict: 0})
+        self.assertEqual(GameEvent.objects.count(), 4)
+
+    def test_reverse_rebuilds_guessed_letters_from_events(self):
+        self.migrate(self.after_events)
+        GameState = self.migrate(self.after_masked_word).get_model('game', 'GameState')
+        self.assertEqual(GameState.objects.get(pk=self.played).guessed_letters, [
+            {'letter': 'P', 'position': 0, 'correct': True, 'player_id': self.alice},
+            {'letter': 'X', 'position': 1, 'correct': False, 'player_id': self.bob},
+            {'letter': 'N', 'position': 3, 'correct': True, 'player_id': self.alice},
+            {'letter': 'E', 'position': 9, 'correct': True, 'player_id': self.bob},
+        ])
+        self.assertEqual(GameState.objects.get(pk=self.fresh).guessed_letters, [])
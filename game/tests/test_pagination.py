@@ -0,0 +1,73 @@
+import json
+from datetime import datetime, timezone as dt_timezone
+from urllib.parse import urlsplit
+
+from django.test import SimpleTestCase, TestCase
+from rest_framework import serializers
+from rest_framework.test import APIClient
+
+from game.models import GameHistory, User
+from game.pagination import KeysetPagination
+
+from .base import make_game
+
+
+class CursorTests(SimpleTestCase):
+    def test_cursor_round_trip(self):
+        value = datetime(2025, 3, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc)
+        cursor = KeysetPagination.encode_cursor(value, 42)
+        self.assertNotIn('=', cursor)
+        self.assertEqual(KeysetPagination.decode_cursor(cursor), (value, 42))
+
+    def test_malformed_cursor_is_a_validation_error(self):
+        for cursor in ('!!!', 'bm90LWEtY3Vyc29y', KeysetPagination.encode_cursor(datetime(2025, 1, 1), 1)[:-3]):
+            with self.assertRaises(serializers.ValidationError):
+                KeysetPagination.decode_cursor(cursor)
+
+
+class GameHistoryPaginationTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='secret123')
+        self.bob = User.objects.create_user(username='bob', password='secret123')
+        self.games = []
+        for _ in range(5):
+            game, _ = make_game(self.alice, self.bob, status='finished')
+            GameHistory.objects.create(game=game, player=self.alice, opponent=self.bob, level='easy', result='won')
+            self.games.append(game.pk)
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def get(self, url):
+        response = self.client.get(url)
+        body = json.loads(response.content) if response.status_code == 200 else response.data
+        return response, body
+
+    def walk(self, url):
+        pages = []
+        while url:
+            response, body = self.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([row['game'] for row in body['results']])
+            url = body['next'] and urlsplit(body['next'])._replace(scheme='', netloc='').geturl()
+        return pages
+
+    def test_next_links_walk_every_row_once(self):
+        self.assertEqual(self.walk('/api/game-history/?limit=2'),
+                         [self.games[4:2:-1], self.games[2:0:-1], self.games[:1]])
+
+    def test_rows_with_the_same_date_are_ordered_by_id(self):
+        GameHistory.objects.update(date=datetime(2025, 1, 1, tzinfo=dt_timezone.utc))
+        pages = self.walk('/api/game-history/?limit=3')
+        self.assertEqual(pages, [self.games[4:1:-1], self.games[1::-1]])
+
+    def test_last_page_has_no_next_link(self):
+        response, body = self.get('/api/game-history/?limit=5')
+        self.assertEqual((len(body['results']), body['next']), (5, None))
+        # پاسخ معمولی با Content-Length است، نه generator همگامی که ASGI پیش از ارسال در حافظه جمع می‌کرد
+        self.assertFalse(response.streaming)
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+
+    def test_malformed_cursor_returns_400(self):
+        response, body = self.get('/api/game-history/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cursor', body)
@@ -0,0 +1,48 @@
+import os
+
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from game.models import PlayerStats, User
+
+from .base import make_game
+
+
+class PlayerStatsTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='secret123')
+        self.bob = User.objects.create_user(username='bob', password='secret123')
+        self.client = APIClient()
+
+    def guess_word(self, player, opponent, guess, **state_fields):
+        game, _ = make_game(player, opponent, **state_fields)
+        self.client.force_authenticate(player)
+        self.client.post(f'/api/game/{game.game_id}/guess-word/', {'guess': guess})
+
+    def stats(self, user):
+        return PlayerStats.objects.filter(user=user, level='easy').values(
+            'wins', 'losses', 'draws', 'total_score', 'best_score', 'current_streak', 'best_streak').get()
+
+    def test_end_game_updates_stats_and_streaks(self):
+        self.guess_word(self.alice, self.bob, 'planet', player1_score=40, player2_score=-20)
+        self.guess_word(self.alice, self.bob, 'planet', player1_score=20)
+        self.guess_word(self.alice, self.bob, 'wrong')
+
+        # کلمه درست +۱۰۰ برای حدس‌زننده و کلمه غلط +۵۰ برای حریف (engine.guess_word)
+        self.assertEqual(self.stats(self.alice), {'wins': 2, 'losses': 1, 'draws': 0, 'total_score': 260,
+                                                  'best_score': 140, 'current_streak': 0, 'best_streak': 2})
+        self.assertEqual(self.stats(self.bob), {'wins': 1, 'losses': 2, 'draws': 0, 'total_score': 30,
+                                                'best_score': 50, 'current_streak': 1, 'best_streak': 1})
+
+        response = self.client.get('/api/profile/')
+        self.assertEqual(response.data['stats'][0]['wins'], 2)
+
+    def test_backfill_rebuilds_the_same_rows(self):
+        self.guess_word(self.alice, self.bob, 'planet', player1_score=40, player2_score=-20)
+        self.guess_word(self.bob, self.alice, 'wrong', player2_score=60)
+        expected = [self.stats(self.alice), self.stats(self.bob)]
+
+        PlayerStats.objects.update(wins=0, losses=0, total_score=0, best_score=None)
+        call_command('backfill_player_stats', batch_size=1, stdout=open(os.devnull, 'w'))
+        self.assertEqual([self.stats(self.alice), self.stats(self.bob)], expected)
@@ -0,0 +1,186 @@
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import InMemoryChannelLayer
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from game import actions, engine, sessions
+from game.models import Game, GameEvent, GameState, LedgerEntry, User
+from game.protocol import game_group_name
+from game.sessions import GameSession, game_sessions, load_session_state, merge_value, write_changes
+
+from .base import make_game
+
+
+class MergeValueTests(SimpleTestCase):
+    def test_one_sided_changes_win(self):
+        self.assertEqual(merge_value('player1_score', 0, 20, 0), 20)
+        self.assertEqual(merge_value('player1_score', 0, 0, 40), 40)
+
+    def test_both_sides_changed(self):
+        self.assertEqual(merge_value('player1_score', 10, 30, 0), 20)
+        self.assertEqual(merge_value('event_seq', 3, 4, 5), 6)
+        self.assertEqual(merge_value('masked_word', '____', 'P___', '__A_'), 'P_A_')
+        self.assertEqual(merge_value('revealed_letters', {'1': []}, {'1': [2]}, {'1': [0], '2': [3]}),
+                         {'1': [0, 2], '2': [3]})
+        # نوبت و ساعت: تغییر یک‌طرفه برنده است و اگر هر دو عوض کرده باشند (حرکت ردشده) مقدار دیتابیس می‌ماند
+        self.assertEqual(merge_value('current_player_id', 1, 2, 1), 2)
+        self.assertEqual(merge_value('player1_time', 60.0, 50.0, 55.0), 55.0)
+
+
+@override_settings(DB_WRITER_QUEUE=False)
+class SessionReconcileTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='secret123', coins=5)
+        self.bob = User.objects.create_user(username='bob', password='secret123')
+        self.game, self.state = make_game(self.alice, self.bob)
+        self.game_id = str(self.game.game_id)
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def reveal(self, session, choose=min):
+        # همان کاری که GameConsumer.handle_reveal_letter بعد از خرج سکه روی session انجام می‌دهد
+        engine_state = session.engine_state()
+        result = engine.reveal_letter(engine_state, self.alice.id, choose=choose)
+        session.add_ledger(self.alice, LedgerEntry.CURRENCY_COINS, -result.cost, LedgerEntry.REASON_REVEAL)
+        session.add_event(GameEvent.KIND_REVEAL, self.alice, result.position, result.letter)
+        session.apply_engine(engine_state)
+        return result
+
+    def in_session(self, scenario):
+        async def run():
+            session = await game_sessions.acquire(self.game_id)
+            try:
+                return await scenario(session)
+            finally:
+                await game_sessions.release(self.game_id)
+        return async_to_sync(run)()
+
+    def test_rest_save_keeps_pending_websocket_reveal(self):
+        async def scenario(session):
+            result = self.reveal(session)
+            # درخواست REST قبل از flush، وضعیت همین بازی را ذخیره می‌کند
+            response = await sync_to_async(self.client.post)(f'/api/game/{self.game_id}/hint/')
+            self.assertEqual(response.status_code, 200)
+            self.assertIs(game_sessions.peek(self.game_id), session)
+            self.assertEqual(await game_sessions.flush(session), [])
+            return session, result
+
+        session, result = self.in_session(scenario)
+        key = str(self.alice.id)
+        state = GameState.objects.get(pk=self.state.pk)
+        self.assertEqual(state.revealed_letters[key], [result.position])
+        self.assertEqual(state.hints_used[key], [1])
+        self.assertEqual(list(GameEvent.objects.order_by('seq').values_list('seq', 'kind')),
+                         [(1, GameEvent.KIND_HINT), (2, GameEvent.KIND_REVEAL)])
+        self.assertEqual(state.event_seq, 2)
+        self.assertTrue(LedgerEntry.objects.filter(reason=LedgerEntry.REASON_REVEAL, delta=-1).exists())
+        # session هم نسخه ادغام‌شده را دارد و flush بعدی بدون تعارض انجام می‌شود
+        self.assertEqual((session.state.hints_used[key], session.state.version), ([1], state.version))
+        self.assertFalse(session.stale)
+        self.assertTrue(session.take_resync())
+
+    def test_clean_session_is_refreshed_after_rest_move(self):
+        async def scenario(session):
+            await sync_to_async(self.client.post)(f'/api/game/{self.game_id}/guess/', {'letter': 'P', 'position': 0})
+            await game_sessions.flush()
+            return session
+
+        session = self.in_session(scenario)
+        self.assertEqual(session.state.masked_word, 'P_____')
+        self.assertEqual(session.state.solved_count, 1)
+        self.assertEqual(session.state.current_player, self.bob)
+        self.assertEqual(session.state.guesses(), [{'letter': 'P', 'position': 0, 'correct': True,
+                                                    'player_id': self.alice.id}])
+
+    def test_failed_write_restores_changes_and_stale_flag(self):
+        async def scenario(session):
+            self.reveal(session)
+            session.stale = True
+            with mock.patch.object(sessions, 'write_changes', side_effect=RuntimeError('db down')):
+                with self.assertRaises(RuntimeError):
+                    await game_sessions.flush(session)
+            self.assertTrue(session.is_dirty and session.stale)
+            self.assertEqual(session.state.version, 0)
+            await game_sessions.flush(session)
+            return session
+
+        session = self.in_session(scenario)
+        state = GameState.objects.get(pk=self.state.pk)
+        self.assertEqual((state.event_seq, state.version, session.state.version), (1, 1, 1))
+        self.assertFalse(session.is_dirty or session.stale)
+
+    def test_changes_made_during_the_write_are_merged_on_refresh(self):
+        session = GameSession(load_session_state(self.game_id))
+        self.reveal(session, choose=min)
+        changes = session.take_changes()
+        # حین نوشتن: REST یک راهنمایی ثبت می‌کند و بازیکن در WebSocket حرف دیگری را نمایش می‌دهد
+        self.client.post(f'/api/game/{self.game_id}/hint/')
+        self.reveal(session, choose=max)
+
+        refreshed = write_changes([changes])
+        session.refresh(refreshed[self.game.pk])
+        key = str(self.alice.id)
+        self.assertEqual(session.state.revealed_letters[key], [0, 5])
+        self.assertEqual(session.state.hints_used[key], [1])
+        self.assertEqual([event.seq for event in session.pending_events], [3])
+
+        self.assertEqual(write_changes([session.take_changes()]), {})
+        state = GameState.objects.get(pk=self.state.pk)
+        self.assertEqual((state.revealed_letters[key], state.hints_used[key], state.event_seq),
+                         ([0, 5], [1], 3))
+        self.assertEqual(list(GameEvent.objects.order_by('seq').values_list('seq', flat=True)), [1, 2, 3])
+
+    def test_rest_pause_racing_a_websocket_move_is_not_overwritten(self):
+        layer = InMemoryChannelLayer()
+
+        async def scenario(session):
+            channel = await layer.new_channel()
+            await layer.group_add(game_group_name(self.game_id), channel)
+            # حدس WebSocket روی session اعمال شده (مثل GameConsumer.handle_guess_letter) ولی هنوز نوشته نشده
+            engine_state = session.engine_state()
+            result = engine.guess_letter(engine_state, self.alice.id, 'P', 0)
+            session.add_event(GameEvent.KIND_GUESS, self.alice, result.position, result.letter, result.correct)
+            session.add_coins(self.alice, result.coins, LedgerEntry.REASON_CORRECT_GUESS)
+            session.mark_state(*session.state.settle_clock(session.game))
+            session.apply_engine(engine_state)
+            session.state.last_turn_time = timezone.now()
+            session.mark_state('last_turn_time')
+            self.reveal(session)
+            # bob از مسیر REST بازی را متوقف می‌کند
+            response = await sync_to_async(self.bob_client().post)(f'/api/game/{self.game_id}/pause/')
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(await actions.flush_move(session, channel_layer=layer))
+            return session, await layer.receive(channel)
+
+        with mock.patch.object(game_sessions, 'request_flush'), \
+                mock.patch.object(game_sessions, 'flush_interval', 3600):
+            session, message = self.in_session(scenario)
+
+        game = Game.objects.get(pk=self.game.pk)
+        state = GameState.objects.get(pk=self.state.pk)
+        self.assertEqual(game.status, 'paused')
+        self.assertIsNone(state.clock_started_at)
+        self.assertIsNotNone(state.paused_at)
+        self.assertEqual((state.current_player, state.masked_word, state.player1_score),
+                         (self.alice, '______', 0))
+        # حدس و پاداشش نوشته نشد؛ نمایش حرف که سکه‌اش خرج شده بود ماند
+        self.assertEqual(list(GameEvent.objects.values_list('seq', 'kind')), [(1, GameEvent.KIND_REVEAL)])
+        self.assertEqual(state.event_seq, 1)
+        self.assertEqual(state.revealed_letters[str(self.alice.id)], [1])
+        self.assertFalse(LedgerEntry.objects.filter(reason=LedgerEntry.REASON_CORRECT_GUESS).exists())
+        self.assertEqual(User.objects.get(pk=self.alice.pk).coins, 5)
+
+        # session و بازیکنان وضعیت متوقف دیتابیس را دارند
+        self.assertEqual((session.game.status, session.state.clock_started_at), ('paused', None))
+        self.assertEqual((session.state.masked_word, session.state.current_player), ('______', self.alice))
+        self.assertFalse(session.is_dirty)
+        self.assertEqual(message['event'], 'snapshot')
+        self.assertEqual(message['delta']['game']['status'], 'paused')
+
+    def bob_client(self):
+        client = APIClient()
+        client.force_authenticate(self.bob)
+        return client
@@ -0,0 +1,71 @@
+import asyncio
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+
+from game.timers import TimerWheel
+
+
+class TimerWheelTests(SimpleTestCase):
+    def run_wheel(self, scenario, tick=0.01, slots=512):
+        wheel = TimerWheel(tick=tick, slots=slots)
+        fired = []
+
+        def record(key):
+            async def callback():
+                fired.append((key, wheel._ticks))
+            return callback
+
+        async def run():
+            try:
+                await scenario(wheel, record)
+            finally:
+                wheel._task.cancel()
+        async_to_sync(run)()
+        return wheel, fired
+
+    def test_timer_fires_once_after_its_delay(self):
+        async def scenario(wheel, record):
+            wheel.schedule('g1', 0.03, record('g1'))
+            self.assertEqual(len(wheel), 1)
+            await asyncio.sleep(0.1)
+
+        wheel, fired = self.run_wheel(scenario)
+        self.assertEqual(fired, [('g1', 3)])
+        self.assertEqual(len(wheel), 0)
+
+    def test_cancel_and_reschedule(self):
+        async def scenario(wheel, record):
+            wheel.schedule('cancelled', 0.02, record('cancelled'))
+            wheel.cancel('cancelled')
+            wheel.cancel('unknown')  # لغو تایمری که وجود ندارد بی‌اثر است
+            wheel.schedule('moved', 0.02, record('first'))
+            wheel.schedule('moved', 0.05, record('second'))  # زمان‌بندی دوباره همان کلید جایگزین قبلی است
+            self.assertEqual(len(wheel), 1)
+            await asyncio.sleep(0.12)
+
+        _, fired = self.run_wheel(scenario)
+        self.assertEqual(fired, [('second', 5)])
+
+    def test_timers_survive_wheel_rotations(self):
+        # با ۴ خانه، سررسید tick دهم در همان خانه tick دوم و ششم است و نباید آن‌جا اجرا شود
+        async def scenario(wheel, record):
+            wheel.schedule('early', 0.02, record('early'))
+            wheel.schedule('late', 0.1, record('late'))
+            await asyncio.sleep(0.2)
+
+        _, fired = self.run_wheel(scenario, slots=4)
+        self.assertEqual(fired, [('early', 2), ('late', 10)])
+
+    def test_failing_callback_does_not_stop_the_wheel(self):
+        async def fail():
+            raise RuntimeError('boom')
+
+        async def scenario(wheel, record):
+            wheel.schedule('broken', 0.01, fail)
+            wheel.schedule('ok', 0.03, record('ok'))
+            await asyncio.sleep(0.1)
+
+        with self.assertLogs('game.timers', level='ERROR'):
+            _, fired = self.run_wheel(scenario)
+        self.assertEqual(fired, [('ok', 3)])
@@ -0,0 +1,105 @@
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import InMemoryChannelLayer
+from django.db import transaction
+from django.db.models import F
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from game import actions, engine, views
+from game.bundles import load_game_bundle
+from game.models import Game, GameEvent, GameHistory, GameState, LedgerEntry, StaleGameState, User
+from game.protocol import game_group_name
+from game.sessions import GameSession, game_sessions, load_session_state, write_changes
+
+from .base import make_game
+
+
+class GameStateVersionTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='secret123')
+        self.bob = User.objects.create_user(username='bob', password='secret123')
+        self.game, self.state = make_game(self.alice, self.bob)
+
+    def test_stale_save_is_rejected(self):
+        first = GameState.objects.get(pk=self.state.pk)
+        second = GameState.objects.get(pk=self.state.pk)
+        first.player1_score = 20
+        first.save(update_fields=['player1_score'])
+        second.player2_score = 20
+        with self.assertRaises(StaleGameState), transaction.atomic():
+            second.save(update_fields=['player2_score'])
+        self.assertEqual(second.version, 0)
+        fresh = GameState.objects.get(pk=self.state.pk)
+        self.assertEqual((fresh.player1_score, fresh.player2_score, fresh.version), (20, 0, 1))
+
+    def test_concurrent_turn_change_rejects_guess(self):
+        def load_then_opponent_moves(game_id, status=None):
+            bundle = load_game_bundle(game_id, status)
+            if load.call_count == 1:
+                # حریف بین خواندن و نوشتن این درخواست نوبت را گرفته است
+                GameState.objects.filter(pk=self.state.pk).update(version=F('version') + 1, current_player=self.bob)
+            return bundle
+
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        with mock.patch.object(views, 'load_game_bundle', side_effect=load_then_opponent_moves) as load:
+            response = client.post(f'/api/game/{self.game.game_id}/guess/', {'letter': 'P', 'position': 0})
+        self.assertEqual(response.status_code, 400)  # تلاش دوم روی وضعیت تازه: نوبت شما نیست
+        self.assertEqual(load.call_count, 2)
+        self.assertFalse(GameEvent.objects.exists())
+
+    def test_session_flush_merges_conflicting_state(self):
+        session = GameSession(load_session_state(self.game.game_id))
+        session.state.player1_score = 100
+        session.mark_state('player1_score')
+        GameState.objects.filter(pk=self.state.pk).update(version=F('version') + 1, player2_score=40)
+
+        refreshed = write_changes([session.take_changes()])
+        self.assertEqual(list(refreshed), [self.game.pk])
+        fresh = GameState.objects.get(pk=self.state.pk)
+        self.assertEqual((fresh.player1_score, fresh.player2_score, fresh.version), (100, 40, 2))
+        self.assertEqual(refreshed[self.game.pk]['version'], 2)
+
+
+@override_settings(DB_WRITER_QUEUE=False)
+class EndGameConflictTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='secret123')
+        self.bob = User.objects.create_user(username='bob', password='secret123')
+        self.game, self.state = make_game(self.alice, self.bob)
+
+    def finish_elsewhere(self):
+        GameState.objects.filter(pk=self.state.pk).update(version=F('version') + 1)
+        Game.objects.filter(pk=self.game.pk).update(status='finished', winner=self.bob)
+
+    def test_result_lost_to_a_conflict_is_not_awarded_or_announced(self):
+        layer = InMemoryChannelLayer()
+        game_id = str(self.game.game_id)
+
+        async def run():
+            channel = await layer.new_channel()
+            await layer.group_add(game_group_name(game_id), channel)
+            session = await game_sessions.acquire(game_id)
+            try:
+                # درخواست REST بین بارگذاری session و پایان بازی، بازی را با برد bob تمام کرده است
+                await sync_to_async(self.finish_elsewhere)()
+                outcome = engine.time_up(session.engine_state(), self.bob.id)
+                with mock.patch.object(actions.leaderboard, 'award') as award:
+                    ended = await actions.end_game(session, outcome, reason='player_time_up', channel_layer=layer)
+                message = await layer.receive(channel)
+                fresh = game_sessions.peek(game_id)
+                return ended, award.called, message, fresh
+            finally:
+                await game_sessions.release(game_id)
+
+        ended, awarded, message, fresh = async_to_sync(run)()
+        self.assertFalse(ended)
+        self.assertFalse(awarded)
+        self.assertEqual(message['event'], 'snapshot')
+        self.assertEqual(message['delta']['game']['winner'], self.bob.username)
+        self.assertEqual((fresh.game.status, fresh.game.winner_id), ('finished', self.bob.id))
+        self.assertFalse(GameHistory.objects.exists())
+        self.assertFalse(LedgerEntry.objects.filter(reason=LedgerEntry.REASON_WIN).exists())
+        self.assertEqual(User.objects.get(pk=self.alice.pk).xp, 0)
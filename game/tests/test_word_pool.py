@@ -0,0 +1,62 @@
+from django.test import TestCase
+
+from game.models import SharedVersion, Word
+from game.word_pool import VERSION_NAME, WordPool, word_pool
+
+
+def words(*texts, level='easy'):
+    return Word.objects.bulk_create(Word(text=text, level=level, hint1='h1', hint2='h2', hint3='h3')
+                                    for text in texts)
+
+
+class WordPoolTests(TestCase):
+    def test_bulk_changes_are_seen_after_a_version_bump(self):
+        # bulk_create و update سیگنال ندارند، مثل تغییری از پروسس دیگر؛ مسیرهای import نسخه را زیاد می‌کنند
+        pool = WordPool(version_check_interval=0)
+        first, second = words('planet', 'rocket')
+        self.assertEqual(sorted(pool.ids('easy')), [first.pk, second.pk])
+
+        third, = words('comet')
+        Word.objects.filter(pk=first.pk).update(level='hard')
+        self.assertEqual(sorted(pool.ids('easy')), [first.pk, second.pk])
+        SharedVersion.bump(VERSION_NAME)
+        self.assertEqual(sorted(pool.ids('easy')), [second.pk, third.pk])
+        self.assertEqual(list(pool.ids('hard')), [first.pk])
+
+    def test_version_check_is_one_primary_key_lookup(self):
+        pool = WordPool(version_check_interval=0)
+        words('planet')
+        pool.ids('easy')
+        with self.assertNumQueries(1) as captured:
+            self.assertEqual(pool.random_word('easy')[1], 'planet')
+        self.assertNotIn('GROUP BY', captured.captured_queries[0]['sql'])
+
+    def test_version_is_checked_at_most_once_per_interval(self):
+        pool = WordPool(version_check_interval=60)
+        words('planet')
+        pool.ids('easy')
+        with self.assertNumQueries(0):
+            pool.ids('easy')
+
+    def test_deleted_word_is_not_picked_after_the_next_check(self):
+        pool = WordPool(version_check_interval=0)
+        first, second = words('planet', 'rocket')
+        pool.ids('easy')
+        Word.objects.filter(pk=first.pk).delete()
+        self.assertEqual({pool.random_word('easy') for _ in range(10)}, {(second.pk, 'rocket')})
+
+    def test_texts_are_picked_without_queries(self):
+        pool = WordPool(version_check_interval=60)
+        picked = {(word.pk, word.text) for word in words('planet', 'rocket', 'comet')}
+        pool.ids('easy')
+        with self.assertNumQueries(0):
+            self.assertLessEqual({pool.random_word('easy') for _ in range(30)}, picked)
+        self.assertIsNone(pool.random_word('hard'))
+
+    def test_local_saves_invalidate_immediately(self):
+        self.addCleanup(word_pool.invalidate)
+        word_pool.version_check_interval, interval = 60, word_pool.version_check_interval
+        self.addCleanup(setattr, word_pool, 'version_check_interval', interval)
+        self.assertEqual(list(word_pool.ids('medium')), [])
+        word = Word.objects.create(text='galaxy', level='medium', hint1='h1', hint2='h2', hint3='h3')
+        self.assertEqual(list(word_pool.ids('medium')), [word.pk])
@@ -0,0 +1,66 @@
+import contextvars
+import threading
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from game.writer import DBWriter
+
+marker = contextvars.ContextVar('marker', default=None)
+
+
+class WriterQueueTests(SimpleTestCase):
+    databases = {'default'}
+
+    def test_jobs_run_in_order_on_one_thread_with_caller_context(self):
+        writer = DBWriter()
+        seen = []
+
+        def job(index):
+            seen.append((index, threading.current_thread().name, marker.get()))
+            return index * 2
+
+        async def run():
+            marker.set('request-1')
+            return [await writer.run(job, index) for index in range(3)]
+
+        self.assertEqual(async_to_sync(run)(), [0, 2, 4])
+        self.assertEqual(seen, [(index, 'db-writer', 'request-1') for index in range(3)])
+
+    def test_connection_is_kept_between_jobs(self):
+        writer = DBWriter()
+
+        def job():
+            connection.ensure_connection()
+            return id(connection.connection)
+
+        async def run():
+            return [await writer.run(job) for _ in range(2)]
+
+        first, second = async_to_sync(run)()
+        self.assertEqual(first, second)
+
+    def test_exceptions_reach_the_caller(self):
+        def fail():
+            raise ValueError('boom')
+
+        async def run():
+            await DBWriter().run(fail)
+
+        with self.assertRaisesMessage(ValueError, 'boom'):
+            async_to_sync(run)()
+
+
+class SqliteProfileTests(TestCase):
+    def test_connection_pragmas(self):
+        if settings.SQLITE_PROFILE != 'concurrent':
+            self.skipTest('SQLITE_PROFILE=concurrent فعال نیست')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            synchronous = cursor.fetchone()[0]
+            cursor.execute('PRAGMA busy_timeout')
+            busy_timeout = cursor.fetchone()[0]
+        self.assertEqual((synchronous, busy_timeout), (1, 5000))  # 1 یعنی NORMAL
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
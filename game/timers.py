@@ -0,0 +1,104 @@
+import asyncio
+import contextvars
+import math
+
+from django.conf import settings
+from django.utils import timezone
+
+from .actions import check_timeouts, turn_timeout_seconds
+from .log import bind, get_logger
+from .sessions import game_sessions
+
+log = get_logger(__name__)
+
+
+# چرخ زمان‌سنج hash شده: هر تایمر در خانه‌ای از چرخ بر اساس tick سررسیدش قرار می‌گیرد.
+# زمان‌بندی، لغو و جابه‌جایی O(1) هستند و فقط یک task برای کل پروسس اجرا می‌شود،
+# نه یک task برای هر بازی.
+class TimerWheel:
+    def __init__(self, tick=None, slots=512):
+        if tick is None:
+            tick = getattr(settings, 'GAME_TIMER_TICK', 0.5)
+        self.tick = tick
+        self._slots = [{} for _ in range(slots)]
+        self._timers = {}  # key -> خانه‌ای از چرخ که تایمر در آن است
+        self._ticks = 0
+        self._started_at = None
+        self._task = None
+
+    def __len__(self):
+        return len(self._timers)
+
+    def schedule(self, key, delay, callback):
+        # callback یک تابع async بدون آرگومان است
+        self.cancel(key)
+        self._ensure_running()
+        deadline = self._ticks + max(1, math.ceil(delay / self.tick))
+        index = deadline % len(self._slots)
+        self._slots[index][key] = (deadline, callback)
+        self._timers[key] = index
+
+    def cancel(self, key):
+        index = self._timers.pop(key, None)
+        if index is not None:
+            self._slots[index].pop(key, None)
+
+    def _ensure_running(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._started_at = loop.time() - self._ticks * self.tick
+            # context خالی: این task مال کل پروسس است و نباید game_id/user_id پیامی که اولین تایمر را ساخته
+            # به لاگ‌های تایمرهای بازی‌های دیگر ببرد
+            self._task = loop.create_task(self._run(), context=contextvars.Context())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # زمان tick بعدی از لحظه شروع حساب می‌شود تا تأخیرها روی هم جمع نشوند
+            await asyncio.sleep(max(0.0, self._started_at + (self._ticks + 1) * self.tick - loop.time()))
+            self._ticks += 1
+            slot = self._slots[self._ticks % len(self._slots)]
+            due = [key for key, (deadline, _) in slot.items() if deadline <= self._ticks]
+            for key in due:
+                _, callback = slot.pop(key)
+                self._timers.pop(key, None)
+                loop.create_task(self._fire(key, callback))
+
+    @staticmethod
+    async def _fire(key, callback):
+        try:
+            await callback()
+        except Exception:
+            log.exception('timer.failed', timer=key)
+
+
+turn_timers = TimerWheel()
+
+
+def schedule_turn_timer(session):
+    # بعد از هر اکشن صدا زده می‌شود؛ اگر بازی فعال است تایمر روی زودترین سررسید تنظیم می‌شود:
+    # پایان نوبت فعلی یا تمام شدن کل زمان بازیکن فعلی
+    game, state = session.game, session.state
+    key = str(game.game_id)
+    if game.status != 'active' or not state.current_player or not state.last_turn_time:
+        turn_timers.cancel(key)
+        return
+    now = timezone.now()
+    remaining = min(
+        turn_timeout_seconds() - (now - state.last_turn_time).total_seconds(),
+        state.remaining_time(game, state.current_player, now),
+    )
+    turn_timers.schedule(key, remaining, lambda: on_turn_timeout(key))
+
+
+async def on_turn_timeout(game_id):
+    # اگر هیچ اتصالی برای بازی در این پروسس نمانده باشد تایمر نادیده گرفته می‌شود
+    with bind(game_id=game_id):
+        session = game_sessions.peek(game_id)
+        if session is None:
+            if not game_sessions.has_connections(game_id):
+                return
+            session = await game_sessions.get(game_id)
+        async with session.lock:
+            await check_timeouts(session)
+            schedule_turn_timer(session)
@@ -2,7 +2,7 @@ from django.urls import path
 from .views import (
     LoginView, SignupView, ProfileView, GameHistoryView, NewGameView, JoinGameView,
     GameStateView, GuessView, HintView, RevealLetterView, PauseGameView, ResumeGameView,
-    GuessWordView, PendingGamesView, PausedGamesView
+    GuessWordView, PendingGamesView, PausedGamesView, LeaderboardView, MyRankView, AuthCacheStatsView
 )
 
 urlpatterns = [
@@ -21,4 +21,7 @@ urlpatterns = [
     path('game/<uuid:game_id>/guess-word/', GuessWordView.as_view(), name='guess_word'),
     path('pending-games/', PendingGamesView.as_view(), name='pending_games'),
     path('paused-games/', PausedGamesView.as_view(), name='paused_games'),
+    path('leaderboard/', LeaderboardView.as_view(), name='leaderboard'),
+    path('leaderboard/me/', MyRankView.as_view(), name='leaderboard_me'),
+    path('auth-cache-stats/', AuthCacheStatsView.as_view(), name='auth_cache_stats'),
 ]
\ No newline at end of file
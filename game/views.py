@@ -1,19 +1,44 @@
-import re
+import functools
 from sqlite3 import IntegrityError
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, serializers
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.authtoken.models import Token
+from django.conf import settings
 from django.contrib.auth import authenticate
 from django.db import transaction
 from django.utils import timezone
-from . import models
-from .models import User, Word, Game, GameState, GameHistory
+from django.db.models import Q
+from .models import Game, GameState, GameHistory, GameEvent, LedgerEntry, PlayerStats, StaleGameState, User
+from . import conditional, engine
+from .authentication import token_cache
+from .bundles import load_game_bundle
+from .currency import Ledger
+from .log import bind_fields, get_logger
+from .leaderboard import GLOBAL, LeaderboardLoading, band_board, leaderboard, level_board
+from .pagination import KeysetPagination
+from .word_pool import word_pool
 from .serializers import LoginSerializer, SignupSerializer, UserSerializer, GameSerializer, GameStateSerializer, \
-    GameHistorySerializer
+    GameHistorySerializer, PlayerStatsSerializer
 import random
-from datetime import timedelta
+
+log = get_logger(__name__)
+
+
+def retry_on_conflict(method):
+    # GameState با شرط نسخه ذخیره می‌شود (GameState.save). اگر درخواست یا پیام دیگری زودتر آن را تغییر
+    # داده باشد تراکنش این اکشن برمی‌گردد و اکشن روی وضعیت تازه دوباره اجرا می‌شود؛ پس مثلاً از دو حدس
+    # هم‌زمان فقط یکی از بررسی نوبت رد می‌شود. بعد از چند تلاش ناموفق 409 برمی‌گردد.
+    @functools.wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        for _ in range(getattr(settings, 'GAME_STATE_CAS_ATTEMPTS', 3)):
+            try:
+                return method(self, request, *args, **kwargs)
+            except StaleGameState:
+                continue
+        return Response({'error': 'وضعیت بازی هم‌زمان تغییر کرد، دوباره تلاش کنید.'}, status=status.HTTP_409_CONFLICT)
+    return wrapper
 
 
 class LoginView(APIView):
@@ -52,8 +77,22 @@ class ProfileView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        serializer = UserSerializer(request.user)
-        return Response(serializer.data)
+        # آمار از جدول PlayerStats با یک کوئری روی ایندکس (user, level) خوانده می‌شود. کاربر احراز‌شده از کش
+        # توکن می‌آید و سکه و XP آن ممکن است در پروسس دیگری تغییر کرده باشد، پس ردیف کاربر هم تازه خوانده
+        # می‌شود تا ETag (و 304) کهنه نباشد
+        user = User.objects.get(pk=request.user.pk)
+        stats = list(PlayerStats.objects.filter(user=user).order_by('level'))
+        etag = conditional.profile_etag(user, stats, UserSerializer.Meta.fields, PlayerStatsSerializer.Meta.fields)
+        if conditional.matches(request, etag):
+            return conditional.not_modified(etag)
+        serializer = UserSerializer(user)
+        return conditional.with_etag(
+            Response({**serializer.data, 'stats': PlayerStatsSerializer(stats, many=True).data}), etag)
+
+
+def history_rows(histories):
+    return histories.select_related('player', 'opponent').only(
+        'game_id', 'level', 'result', 'date', 'player__username', 'opponent__username')
 
 
 class GameHistoryView(APIView):
@@ -61,72 +100,61 @@ class GameHistoryView(APIView):
 
     def get(self, request):
         histories = GameHistory.objects.filter(player=request.user)
-        serializer = GameHistorySerializer(histories, many=True)
-        return Response(serializer.data)
+        return conditional.page_response(request, 'game_history', KeysetPagination('date'), histories,
+                                         GameHistorySerializer, detail=history_rows)
 
 class NewGameView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
-        print("DEBUG: Entering NewGameView post method...")
         level = request.data.get('level')
-        print(f"DEBUG: Received level from request.data: {level}")
+        log.debug('game.create_requested', level=level)
 
         defined_levels = [choice[0] for choice in Game.LEVEL_CHOICES]
         if not level or level not in defined_levels:
-            print(f"DEBUG: Invalid level received: {level}. Valid levels are: {defined_levels}")
+            log.debug('game.invalid_level', level=level)
             raise serializers.ValidationError(
                 {'level': [f'فیلد "level" ضروری است و باید یکی از مقادیر {defined_levels} باشد.']}
             )
-        print(f"DEBUG: Level validation passed: {level}")
 
         try:
             with transaction.atomic():
                 game = Game.objects.create(player1=request.user, level=level, status='pending')
-                print(f"DEBUG: Game object created: game.id={game.id}, game.game_id (UUID)={game.game_id}")
+                bind_fields(game_id=str(game.game_id))
 
-                time_limit_dict = {'easy': 300, 'medium': 240, 'hard': 180}
-                time_limit = time_limit_dict[game.level]
+                time_limit = Game.TIME_LIMITS[game.level]
 
-                print(f"DEBUG: Attempting to select Word with level={game.level} (without is_active filter)")
-                word = Word.objects.filter(level=game.level).order_by('?').first()
-
-                print(f"DEBUG: Selected Word: {word}, Word ID: {word.id if word else 'None'}")
-                if not word:
-                    print(f"DEBUG: No word found for level {game.level}")
+                picked = word_pool.random_word(game.level)
+                if not picked:
+                    log.warning('game.no_word_for_level', level=game.level)
                     raise serializers.ValidationError(
                         {'level': [f'کلمه‌ای برای سطح "{game.level}" یافت نشد.']}
                     )
+                word_id, word_text = picked
 
                 player1_id_str = str(request.user.id)
-                print(
-                    f"DEBUG: Attempting to create GameState with game.id={game.id}, word.id={word.id}, user.id={request.user.id}")
-
                 GameState.objects.create(
                     game=game,
-                    word=word,
+                    word_id=word_id,
                     current_player=request.user,
                     player1_time=time_limit,
                     player2_time=time_limit,
                     revealed_letters={player1_id_str: []},
-                    hints_used={player1_id_str: []}
+                    hints_used={player1_id_str: []},
+                    masked_word=GameState.MASK_CHAR * len(word_text),
                 )
-                print(f"DEBUG: GameState created successfully for game.id={game.id}")
+                log.debug('game.created', level=game.level, word_id=word_id)
 
                 return Response({'game_id': game.game_id, 'status': game.status}, status=status.HTTP_201_CREATED)
 
         except serializers.ValidationError as e_val:
-            print(f"DEBUG: ValidationError in NewGameView for user {request.user.username}: {e_val.detail}")
             return Response(e_val.detail, status=status.HTTP_400_BAD_REQUEST)
-        except IntegrityError as ie_gs:
-            print(f"DEBUG: IntegrityError during Game/GameState creation: {str(ie_gs)}")
-            print(
-                f"DEBUG: Values at potential GameState creation: game.pk={getattr(game, 'pk', 'N/A')}, word.pk={getattr(word, 'pk', 'N/A')}, current_player.pk={request.user.pk}")
+        except IntegrityError:
+            log.exception('game.create_integrity_error', level=level)
             return Response({'error': 'خطای پایگاه داده هنگام ایجاد بازی رخ داد.'},
                             status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        except Exception as e_main:
-            print(
-                f"DEBUG: Unexpected error in NewGameView for user {request.user.username}: {type(e_main).__name__} - {str(e_main)}")
+        except Exception:
+            log.exception('game.create_failed', level=level)
             return Response({'error': 'خطای داخلی سرور هنگام پردازش درخواست شما رخ داد.'},
                             status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -135,9 +163,10 @@ class NewGameView(APIView):
 class JoinGameView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @retry_on_conflict
     def post(self, request, game_id):
         try:
-            game = Game.objects.get(game_id=game_id, status='pending')
+            game, state, _ = load_game_bundle(game_id, status='pending')
             if game.player1 == request.user:
                 return Response({'error': 'نمی‌توانید به بازی خودتان بپیوندید'}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -145,11 +174,10 @@ class JoinGameView(APIView):
             with transaction.atomic():
                 game.player2 = request.user
                 game.status = 'active'
-                game.save()
+                game.save(update_fields=['player2', 'status'])
 
-                state = GameState.objects.get(game=game)
                 state.current_player = random.choice([game.player1, game.player2])
-                state.last_turn_time = timezone.now()
+                state.last_turn_time = state.clock_started_at = timezone.now()
 
 
                 if not isinstance(state.revealed_letters, dict):
@@ -158,9 +186,10 @@ class JoinGameView(APIView):
 
                 if not isinstance(state.hints_used, dict):
                     state.hints_used = {}
-                state.hints_used[player2_id_str] = [1]
+                state.hints_used[player2_id_str] = []
 
-                state.save()
+                state.save(update_fields=['current_player', 'last_turn_time', 'clock_started_at', 'revealed_letters',
+                                          'hints_used'])
                 serializer = GameSerializer(game)
                 return Response(serializer.data)
         except Game.DoesNotExist:
@@ -172,186 +201,181 @@ class GameStateView(APIView):
 
     def get(self, request, game_id):
         try:
-            game = Game.objects.get(game_id=game_id)
+            if conditional.is_conditional(request):
+                # اول فقط نسخه خوانده می‌شود؛ اگر کلاینت همین نسخه را دارد بارگذاری کامل لازم نیست
+                state = conditional.load_state_version(game_id)
+                if request.user.pk in (state.game.player1_id, state.game.player2_id):
+                    etag = conditional.game_state_etag(state)
+                    if conditional.matches(request, etag):
+                        return conditional.not_modified(etag)
+            game, state, _ = load_game_bundle(game_id)
             if request.user not in [game.player1, game.player2]:
                 return Response({'error': 'عدم دسترسی'}, status=status.HTTP_403_FORBIDDEN)
-            state = GameState.objects.get(game=game)
             serializer = GameStateSerializer(state)
-            return Response(serializer.data)
-        except Game.DoesNotExist:
+            return conditional.with_etag(Response(serializer.data), conditional.game_state_etag(state))
+        except (Game.DoesNotExist, GameState.DoesNotExist):
             return Response({'error': 'بازی یافت نشد'}, status=status.HTTP_404_NOT_FOUND)
 
 
+def move_error_response(error):
+    code = status.HTTP_403_FORBIDDEN if error.code == engine.MoveError.NOT_PLAYER else status.HTTP_400_BAD_REQUEST
+    return Response({'error': error.message}, status=code)
+
+
+def finish_game(game, state, outcome, ledger, reason=None):
+    # نوشتن نتیجه GameEngine در مسیر REST (همتای actions.end_game برای session)؛ داخل تراکنش اکشن و بعد از
+    # ذخیره امتیازهای نهایی صدا زده می‌شود. تاریخچه، آمار و دفتر حساب هر کدام با یک INSERT نوشته می‌شوند.
+    game.status = 'finished'
+    game.winner = game.player(outcome.winner)
+    if game.winner:
+        ledger.add_xp(game.winner, outcome.xp, LedgerEntry.REASON_WIN)
+    ledger.write()
+    GameHistory.objects.bulk_create([
+        GameHistory(game=game, player=game.player1, opponent=game.player2, level=game.level, result=outcome.result1),
+        GameHistory(game=game, player=game.player2, opponent=game.player1, level=game.level, result=outcome.result2),
+    ])
+    PlayerStats.record_results([
+        {'player_id': game.player1_id, 'level': game.level, 'result': outcome.result1, 'score': state.player1_score},
+        {'player_id': game.player2_id, 'level': game.level, 'result': outcome.result2, 'score': state.player2_score},
+    ])
+    game.save(update_fields=['status', 'winner'])
+    winner = game.winner
+    if winner:
+        # جدول رده‌بندی فقط بعد از ثبت قطعی XP برنده به‌روز می‌شود
+        transaction.on_commit(lambda: leaderboard.award(winner.id, winner.username, outcome.xp, game.level))
+    serializer = GameSerializer(game)
+    data = {'status': 'game ended', 'game': serializer.data}
+    if reason:
+        data['reason'] = reason
+    return Response(data)
+
+
+def end_if_time_up(game, state, engine_state, user):
+    # ساعت فقط با حرکت بعدی یا تایمر WebSocket بررسی می‌شود، پس بازی‌ای که فقط از REST بازی می‌شود اینجا
+    # تمام می‌شود: اگر ساعت بازیکن فعلی به صفر رسیده باشد هیچ حرکتی اعمال نمی‌شود و نتیجه engine.time_up
+    # ذخیره و برگردانده می‌شود. خروجی None یعنی وقت باقی است.
+    engine.check_player(engine_state, user.id)
+    now = timezone.now()
+    loser = state.time_up_player(game, now)
+    if loser is None:
+        return None
+    outcome = engine.time_up(engine_state, loser.id)
+    with transaction.atomic():
+        state.save(update_fields=state.settle_clock(game, now, running=False) + state.apply_engine(game, engine_state))
+        return finish_game(game, state, outcome, Ledger(game), reason='player_time_up')
+
+
 class GuessView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @retry_on_conflict
     def post(self, request, game_id):
         try:
-            game = Game.objects.get(game_id=game_id, status='active')
-            if request.user not in [game.player1, game.player2]:
-                return Response({'error': 'شما اجازه دسترسی به این بازی را ندارید.'},
-                                status=status.HTTP_403_FORBIDDEN)
-            state = GameState.objects.get(game=game)
-            if state.current_player != request.user:
-                return Response({'error': 'الان نوبت شما نیست.'}, status=status.HTTP_400_BAD_REQUEST)
-
-            letter = request.data.get('letter', '').upper()
-            position = request.data.get('position')
-            if not letter or position is None:
-                return Response({'error': 'لطفاً یک حرف و موقعیت آن را وارد کنید.'},
-                                status=status.HTTP_400_BAD_REQUEST)
-
-            word_obj = state.word
-            word_text = word_obj.text.upper()
-            if not re.match(r'^[A-Z]$', letter):
-                return Response({'error': 'حرف باید یک کاراکتر از A تا Z باشد.'}, status=status.HTTP_400_BAD_REQUEST)  #
-
-            try:
-                position = int(position)
-            except ValueError:
-                return Response({'error': 'موقعیت باید یک عدد صحیح باشد.'}, status=status.HTTP_400_BAD_REQUEST)
-
-            if not (0 <= position < len(word_text)):
-                return Response({'error': 'موقعیت واردشده معتبر نیست.'}, status=status.HTTP_400_BAD_REQUEST)  #
+            game, state, word = load_game_bundle(game_id, status='active')
+            engine_state = state.engine_state(game, word.text)
+            time_up = end_if_time_up(game, state, engine_state, request.user)
+            if time_up:
+                return time_up
+            result = engine.guess_letter(engine_state, request.user.id, request.data.get('letter'),
+                                         request.data.get('position'))
 
             with transaction.atomic():
-                if not isinstance(state.guessed_letters, list):
-                    state.guessed_letters = []
-
-                guess = {'letter': letter, 'correct': letter == word_text[position], 'position': position}
-                state.guessed_letters.append(guess)
-
-                current_player_score_field = 'player1_score' if request.user == game.player1 else 'player2_score'
-
-                if guess['correct']:
-                    setattr(state, current_player_score_field, getattr(state, current_player_score_field) + 20)
-                    request.user.coins += 1
-                    request.user.save()
-                else:
-                    setattr(state, current_player_score_field, getattr(state, current_player_score_field) - 20)
-
-                state.current_player = game.player2 if request.user == game.player1 else game.player1
-                state.last_turn_time = timezone.now()
-                state.save()
-                correct_positions = {g['position'] for g in state.guessed_letters if g['correct']}
-                if len(correct_positions) == len(word_text):
-                    return self.end_game(game, state)
+                ledger = Ledger(game)
+                state.add_event(GameEvent.KIND_GUESS, request.user, result.position, result.letter,
+                                result.correct).save()
+                if result.coins:
+                    ledger.add_coins(request.user, result.coins, LedgerEntry.REASON_CORRECT_GUESS)
+
+                # ساعت بازیکن قبلی پیش از اعمال نوبت جدید تسویه می‌شود
+                now = timezone.now()
+                changed_fields = ['event_seq', 'last_turn_time']
+                changed_fields += state.settle_clock(game, now, running=result.outcome is None)
+                changed_fields += state.apply_engine(game, engine_state)
+                state.last_turn_time = now
+                state.save(update_fields=changed_fields)
+                if result.outcome:
+                    return finish_game(game, state, result.outcome, ledger)  # سکه این حدس و XP برد با یک INSERT
+                ledger.write()
 
                 serializer = GameStateSerializer(state)
                 return Response(serializer.data)
         except Game.DoesNotExist:
             return Response({'error': 'این بازی وجود ندارد.'}, status=status.HTTP_404_NOT_FOUND)
-        except GameState.DoesNotExist:
-            return Response({'error': 'وضعیت بازی یافت نشد.'}, status=status.HTTP_404_NOT_FOUND)
-        except Word.DoesNotExist:
-            return Response({'error': 'کلمه بازی یافت نشد.'}, status=status.HTTP_404_NOT_FOUND)
-
-    def end_game(self, game, state):  #
-        game.status = 'finished'
-        with transaction.atomic():
-            player1_final_score = state.player1_score
-            player2_final_score = state.player2_score
-            winner_determined = False
-            if player1_final_score > player2_final_score:
-                game.winner = game.player1
-                game.player1.xp += 50
-                game.player1.save()
-                GameHistory.objects.create(game=game, player=game.player1, opponent=game.player2, level=game.level,result='won')
-                GameHistory.objects.create(game=game, player=game.player2, opponent=game.player1, level=game.level,result='lost')
-                winner_determined = True
-            elif player2_final_score > player1_final_score:
-                game.winner = game.player2
-                game.player2.xp += 50
-                game.player2.save()
-                GameHistory.objects.create(game=game, player=game.player2, opponent=game.player1, level=game.level,result='won')
-                GameHistory.objects.create(game=game, player=game.player1, opponent=game.player2, level=game.level,result='lost')
-                winner_determined = True
-
-            if not winner_determined:
-                GameHistory.objects.create(game=game, player=game.player1, opponent=game.player2, level=game.level,result='draw')
-                GameHistory.objects.create(game=game, player=game.player2, opponent=game.player1, level=game.level,result='draw')
-            game.save()
-        serializer = GameSerializer(game)
-        return Response({'status': 'game ended', 'game': serializer.data})
+        except engine.MoveError as e:
+            return move_error_response(e)
 
 
 class HintView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @retry_on_conflict
     def post(self, request, game_id):
         try:
-            game = Game.objects.get(game_id=game_id, status='active')
-            if request.user not in [game.player1, game.player2]:
-                return Response({'error': 'شما اجازه دسترسی به این بازی را ندارید.'}, status=status.HTTP_403_FORBIDDEN)
-            if request.user.coins < 1:
-                return Response({'error': 'شما سکه کافی برای گرفتن نکته ندارید.'}, status=status.HTTP_400_BAD_REQUEST)
-
-            state = GameState.objects.get(game=game)
-            user_hints = state.hints_used.get(str(request.user.id), [1])
-            if len(user_hints) >= 3:
-                return Response({'error': 'شما نمی‌توانید نکته دیگری بگیرید.'}, status=status.HTTP_400_BAD_REQUEST)
+            game, state, word = load_game_bundle(game_id, status='active')
+            engine_state = state.engine_state(game, word.text)
+            time_up = end_if_time_up(game, state, engine_state, request.user)
+            if time_up:
+                return time_up
+            result = engine.take_hint(engine_state, request.user.id)
 
             with transaction.atomic():
-                next_hint = max(user_hints) + 1
-                user_hints.append(next_hint)
-                state.hints_used[str(request.user.id)] = user_hints
-                request.user.coins -= 1
-                request.user.save()
-                state.last_turn_time = timezone.now()
-                state.save()
-                hint_text = getattr(state.word, f'hint{next_hint}')
-                return Response({'hint': hint_text})
+                # موجودی با UPDATE شرطی کم می‌شود، پس دو درخواست هم‌زمان نمی‌توانند یک سکه را دو بار خرج کنند
+                ledger = Ledger(game)
+                if not ledger.spend_coins(request.user, result.cost, LedgerEntry.REASON_HINT):
+                    return Response({'error': 'شما سکه کافی برای گرفتن نکته ندارید.'},
+                                    status=status.HTTP_400_BAD_REQUEST)
+                state.add_event(GameEvent.KIND_HINT, request.user).save()
+                ledger.write()
+                state.save(update_fields=['event_seq'] + state.apply_engine(game, engine_state))
+                return Response({'hint': getattr(word, f'hint{result.number}')})
         except Game.DoesNotExist:
             return Response({'error': 'این بازی وجود ندارد.'}, status=status.HTTP_404_NOT_FOUND)
+        except engine.MoveError as e:
+            return move_error_response(e)
 
 class RevealLetterView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @retry_on_conflict
     def post(self, request, game_id):
         try:
-            game = Game.objects.get(game_id=game_id, status='active')
-            if request.user not in [game.player1, game.player2]:
-                return Response({'error': 'شما اجازه دسترسی به این بازی را ندارید.'}, status=status.HTTP_403_FORBIDDEN)
-            if request.user.coins < 1:
-                return Response({'error': 'شما سکه کافی برای نمایش حرف ندارید.'}, status=status.HTTP_400_BAD_REQUEST)
-
-            state = GameState.objects.get(game=game)
-            word = state.word.text.upper()
-            unrevealed = [i for i in range(len(word)) if
-                          word[i] not in state.revealed_letters.get(str(request.user.id), [])]
-            if not unrevealed:
-                return Response({'error': 'هیچ حرفی برای نمایش باقی نمانده است.'}, status=status.HTTP_400_BAD_REQUEST)
+            game, state, word = load_game_bundle(game_id, status='active')
+            engine_state = state.engine_state(game, word.text)
+            time_up = end_if_time_up(game, state, engine_state, request.user)
+            if time_up:
+                return time_up
+            result = engine.reveal_letter(engine_state, request.user.id)
 
             with transaction.atomic():
-                position = random.choice(unrevealed)
-                letter = word[position]
-                user_revealed = state.revealed_letters.get(str(request.user.id), [])
-                user_revealed.append(letter)
-                state.revealed_letters[str(request.user.id)] = user_revealed
-                request.user.coins -= 1
-                request.user.save()
-                state.last_turn_time = timezone.now()
-                state.save()
-                return Response({'letter': letter, 'position': position})
+                ledger = Ledger(game)
+                if not ledger.spend_coins(request.user, result.cost, LedgerEntry.REASON_REVEAL):
+                    return Response({'error': 'شما سکه کافی برای نمایش حرف ندارید.'},
+                                    status=status.HTTP_400_BAD_REQUEST)
+                state.add_event(GameEvent.KIND_REVEAL, request.user, result.position, result.letter).save()
+                ledger.write()
+                state.save(update_fields=['event_seq'] + state.apply_engine(game, engine_state))
+                return Response({'letter': result.letter, 'position': result.position})
         except Game.DoesNotExist:
             return Response({'error': 'این بازی وجود ندارد.'}, status=status.HTTP_404_NOT_FOUND)
+        except engine.MoveError as e:
+            return move_error_response(e)
 
 class PauseGameView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @retry_on_conflict
     def post(self, request, game_id):
         try:
-            game = Game.objects.get(game_id=game_id, status='active')
+            game, state, _ = load_game_bundle(game_id, status='active')
             if request.user not in [game.player1, game.player2]:
                 return Response({'error': 'شما اجازه دسترسی به این بازی را ندارید'}, status=status.HTTP_403_FORBIDDEN)
             if not game.player2:
                 return Response({'error': 'بازی هنوز بازیکن دوم ندارد و نمی‌توان آن را متوقف کرد'}, status=status.HTTP_400_BAD_REQUEST)
-            state = GameState.objects.get(game=game)
             with transaction.atomic():
                 game.status = 'paused'
                 state.paused_at = timezone.now()
-                game.save()
-                state.save()
+                game.save(update_fields=['status'])
+                state.save(update_fields=['paused_at'] + state.settle_clock(game, state.paused_at, running=False))
                 serializer = GameSerializer(game)
                 return Response({'status': 'paused', 'game': serializer.data})
         except Game.DoesNotExist:
@@ -361,25 +385,25 @@ class PauseGameView(APIView):
 class ResumeGameView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @retry_on_conflict
     def post(self, request, game_id):
         try:
-            game = Game.objects.get(game_id=game_id, status='paused')
+            game, state, _ = load_game_bundle(game_id, status='paused')
             if request.user not in [game.player1, game.player2]:
                 return Response({'error': 'شما اجازه دسترسی به این بازی را ندارید'}, status=status.HTTP_403_FORBIDDEN)
             if not game.player2:
                 with transaction.atomic():
                     game.status = 'pending'  # برگرداندن به حالت pending
-                    game.save()
+                    game.save(update_fields=['status'])
                     return Response({'status': 'returned_to_pending', 'message': 'بازی به حالت انتظار برگشت چون بازیکن دوم وجود ندارد'})
             if (timezone.now() - game.created_at).days > 7:
                 return Response({'error': 'بازی منقضی شده است'}, status=status.HTTP_400_BAD_REQUEST)
             with transaction.atomic():
                 game.status = 'active'
-                state = GameState.objects.get(game=game)
                 state.paused_at = None
-                state.last_turn_time = timezone.now()
-                game.save()
-                state.save()
+                state.last_turn_time = state.clock_started_at = timezone.now()
+                game.save(update_fields=['status'])
+                state.save(update_fields=['paused_at', 'last_turn_time', 'clock_started_at'])
                 serializer = GameSerializer(game)
                 return Response({'status': 'resumed', 'game': serializer.data})
         except Game.DoesNotExist:
@@ -388,40 +412,29 @@ class ResumeGameView(APIView):
 class GuessWordView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @retry_on_conflict
     def post(self, request, game_id):
         try:
-            game = Game.objects.get(game_id=game_id, status='active')
-            if request.user not in [game.player1, game.player2]:
-                return Response({'error': 'عدم دسترسی'}, status=status.HTTP_403_FORBIDDEN)
-            state = GameState.objects.get(game=game)
-            if state.current_player != request.user:
-                return Response({'error': 'نوبت شما نیست'}, status=status.HTTP_400_BAD_REQUEST)
-
-            guess = request.data.get('guess', '').upper()
-            word = state.word.text.upper()
+            game, state, word = load_game_bundle(game_id, status='active')
+            engine_state = state.engine_state(game, word.text)
+            time_up = end_if_time_up(game, state, engine_state, request.user)
+            if time_up:
+                return time_up
+            result = engine.guess_word(engine_state, request.user.id, request.data.get('guess'))
             with transaction.atomic():
-                if guess == word:
-                    game.winner = request.user
-                    request.user.xp += 50
-                    request.user.save()
-                    GameHistory.objects.create(game=game, player=game.player1, opponent=game.player2, level=game.level,
-                                               result='won' if game.player1 == request.user else 'lost')
-                    GameHistory.objects.create(game=game, player=game.player2, opponent=game.player1, level=game.level,
-                                               result='won' if game.player2 == request.user else 'lost')
-                else:
-                    game.winner = game.player2 if request.user == game.player1 else game.player1
-                    game.winner.xp += 50
-                    game.winner.save()
-                    GameHistory.objects.create(game=game, player=game.player1, opponent=game.player2, level=game.level,
-                                               result='won' if game.player1 == game.winner else 'lost')
-                    GameHistory.objects.create(game=game, player=game.player2, opponent=game.player1, level=game.level,
-                                               result='won' if game.player2 == game.winner else 'lost')
-                game.status = 'finished'
-                game.save()
-                serializer = GameSerializer(game)
-                return Response({'status': 'game ended', 'game': serializer.data})
+                changed_fields = state.settle_clock(game, running=False) + state.apply_engine(game, engine_state)
+                state.save(update_fields=changed_fields)
+                return finish_game(game, state, result.outcome, Ledger(game))
         except Game.DoesNotExist:
             return Response({'error': 'بازی یافت نشد'}, status=status.HTTP_404_NOT_FOUND)
+        except engine.MoveError as e:
+            return move_error_response(e)
+
+
+def lobby_games(games):
+    # نام بازیکنان در همان کوئری صفحه خوانده می‌شود، نه یک کوئری برای هر ردیف
+    return games.select_related('player1', 'player2', 'winner').only(
+        'game_id', 'level', 'status', 'created_at', 'player1__username', 'player2__username', 'winner__username')
 
 
 class PendingGamesView(APIView):
@@ -429,8 +442,8 @@ class PendingGamesView(APIView):
 
     def get(self, request):
         games = Game.objects.filter(status='pending').exclude(player1=request.user)
-        serializer = GameSerializer(games, many=True)
-        return Response(serializer.data)
+        return conditional.page_response(request, 'pending_games', KeysetPagination('created_at'), games,
+                                         GameSerializer, detail=lobby_games)
 
 
 class PausedGamesView(APIView):
@@ -438,6 +451,61 @@ class PausedGamesView(APIView):
 
     def get(self, request):
         games = Game.objects.filter(status='paused', player2__isnull=False).filter(
-            models.Q(player1=request.user) | models.Q(player2=request.user))
-        serializer = GameSerializer(games, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+            Q(player1=request.user) | Q(player2=request.user))
+        return KeysetPagination('created_at').response(request, lobby_games(games), GameSerializer)
+
+
+class LeaderboardView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def handle_exception(self, exc):
+        if isinstance(exc, LeaderboardLoading):
+            # جدول این پروسس هنوز در thread بارگذاری ساخته می‌شود؛ درخواست به جای ماندن پشت آن کمی بعد تکرار می‌شود
+            return Response({'error': 'جدول رده‌بندی در حال آماده شدن است، کمی بعد دوباره تلاش کنید.'},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '5'})
+        return super().handle_exception(exc)
+
+    @staticmethod
+    def board_name(request):
+        # scope می‌تواند global، band (سطح خود کاربر یا ?band=N) یا یکی از سطوح بازی باشد
+        scope = request.query_params.get('scope', GLOBAL)
+        if scope == GLOBAL:
+            return GLOBAL
+        if scope == 'band':
+            band = request.query_params.get('band', request.user.level)
+            try:
+                return band_board(int(band))
+            except ValueError:
+                raise serializers.ValidationError({'band': 'سطح کاربر باید یک عدد صحیح باشد.'})
+        if scope in dict(Game.LEVEL_CHOICES):
+            return level_board(scope)
+        raise serializers.ValidationError({'scope': 'جدول رده‌بندی درخواستی وجود ندارد.'})
+
+    @staticmethod
+    def int_param(request, name, default, maximum):
+        try:
+            value = int(request.query_params.get(name, default))
+        except ValueError:
+            value = default
+        return max(0, min(value, maximum))
+
+    def get(self, request):
+        name = self.board_name(request)
+        limit = self.int_param(request, 'limit', 10, 100)
+        return Response({'board': name, 'results': leaderboard.top(name, limit)})
+
+
+class MyRankView(LeaderboardView):
+    def get(self, request):
+        name = self.board_name(request)
+        radius = self.int_param(request, 'radius', 5, 50)
+        rank, total = leaderboard.rank(name, request.user)
+        return Response({'board': name, 'rank': rank, 'total': total,
+                         'around': leaderboard.around(name, request.user, radius)})
+
+
+class AuthCacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(token_cache.stats())
@@ -0,0 +1,105 @@
+import random
+import threading
+import time
+from array import array
+
+from django.conf import settings
+
+from .models import SharedVersion, Word
+
+# نام شمارنده نسخه در SharedVersion؛ هر تغییر در جدول Word آن را زیاد می‌کند تا پروسس‌های دیگر استخر را دوباره بسازند
+VERSION_NAME = 'word_pool'
+
+
+class LevelPool:
+    # شناسه‌ها در array و متن همه کلمات در یک رشته پشت سر هم با آفست شروع هر کلمه؛
+    # انتخاب کلمه بدون کوئری است و حافظه آن برای میلیون‌ها کلمه چند ده مگابایت نمی‌شود
+    __slots__ = ('ids', 'offsets', 'texts')
+
+    def __init__(self, rows):
+        self.ids = array('q')
+        self.offsets = array('q', [0])
+        parts = []
+        end = 0
+        for word_id, text in rows:
+            self.ids.append(word_id)
+            parts.append(text)
+            end += len(text)
+            self.offsets.append(end)
+        self.texts = ''.join(parts)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def pick(self):
+        index = random.randrange(len(self.ids))
+        return self.ids[index], self.texts[self.offsets[index]:self.offsets[index + 1]]
+
+
+# استخر کلمات هر سطح که در هر پروسس به صورت تنبل بارگذاری می‌شود
+class WordPool:
+    def __init__(self, version_check_interval=None):
+        if version_check_interval is None:
+            version_check_interval = getattr(settings, 'WORD_POOL_VERSION_CHECK_INTERVAL', 5)
+        self.version_check_interval = version_check_interval
+        self._lock = threading.Lock()
+        self._pools = {}  # level -> LevelPool
+        self._version = None
+        self._checked_at = 0.0
+
+    def _shared_version(self):
+        # یک lookup روی کلید اصلی؛ کش پیش‌فرض Django در هر پروسس جداست و نسخه باید از دیتابیس بیاید
+        return SharedVersion.current(VERSION_NAME)
+
+    def _sync_version(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.version_check_interval:
+            return
+        version = self._shared_version()
+        with self._lock:
+            self._checked_at = now
+            if version != self._version:
+                self._pools.clear()
+                self._version = version
+
+    def _load(self, level):
+        rows = Word.objects.filter(level=level).values_list('id', 'text').iterator(chunk_size=10000)
+        pool = LevelPool(rows)
+        with self._lock:
+            self._pools[level] = pool
+        return pool
+
+    def pool(self, level):
+        self._sync_version()
+        pool = self._pools.get(level)
+        if pool is None:
+            pool = self._load(level)
+        return pool
+
+    def ids(self, level):
+        return self.pool(level).ids
+
+    def random_word(self, level):
+        # انتخاب یکنواخت در O(1) و بدون کوئری؛ خروجی (شناسه، متن کلمه) است یا None اگر کلمه‌ای برای این سطح نباشد
+        pool = self.pool(level)
+        if not pool:
+            return None
+        return pool.pick()
+
+    def invalidate(self, level=None):
+        with self._lock:
+            if level is None:
+                self._pools.clear()
+            else:
+                self._pools.pop(level, None)
+
+    def bump_version(self):
+        # هر مسیری که Word را تغییر می‌دهد (سیگنال‌های Word، import دسته‌ای با bulk_create یا update) این را
+        # صدا می‌زند؛ همین پروسس فوراً و پروسس‌های دیگر حداکثر بعد از version_check_interval ثانیه
+        # استخر را دوباره می‌سازند
+        SharedVersion.bump(VERSION_NAME)
+        self.invalidate()
+        self._checked_at = 0.0
+
+
+word_pool = WordPool()
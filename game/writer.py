@@ -0,0 +1,61 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import queue
+import threading
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+# SQLite در هر لحظه فقط یک نویسنده دارد. وقتی نوشتن‌های کوتاه consumer از threadهای مختلف می‌آیند،
+# روی قفل فایل با هم رقابت می‌کنند و منتظر busy_timeout می‌مانند. با DB_WRITER_QUEUE همه این نوشتن‌ها
+# به ترتیب در یک thread اختصاصی با یک اتصال ثابت اجرا می‌شوند و رقابتی روی قفل نمی‌ماند.
+
+
+class DBWriter:
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.jobs = 0
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            future, context, function, args = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            # اتصال این thread بین کارها باز می‌ماند (PRAGMAها یک بار اجرا می‌شوند)؛ فقط بعد از خطا،
+            # که ممکن است اتصال خراب شده باشد، بسته می‌شود تا کار بعدی اتصال تازه بگیرد
+            try:
+                result = context.run(function, *args)
+            except BaseException as e:
+                close_old_connections()
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            finally:
+                self.jobs += 1
+
+    async def run(self, function, *args):
+        # context (مثلاً شمارش کوئری metrics و فیلدهای لاگ) همراه کار به thread نویسنده می‌رود
+        self._ensure_thread()
+        future = concurrent.futures.Future()
+        self._queue.put((future, contextvars.copy_context(), function, args))
+        return await asyncio.wrap_future(future)
+
+
+db_writer = DBWriter()
+
+
+async def run_write(function, *args):
+    # مسیر نوشتن‌های کد async؛ بدون DB_WRITER_QUEUE همان database_sync_to_async همیشگی است
+    if getattr(settings, 'DB_WRITER_QUEUE', False):
+        return await db_writer.run(function, *args)
+    return await database_sync_to_async(function)(*args)